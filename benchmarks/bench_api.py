@@ -0,0 +1,186 @@
+"""
+Load test of the async HTTP API with a scripted LLM and a SQLite fixture.
+
+Starts src/api.py in-process on a free local port and sends SQL questions
+from concurrent clients. Reports, per concurrency level, throughput, p50/p99
+latency and response statuses; concurrency 1 is the Streamlit app's model of
+one question in flight at a time. Two further runs check backpressure (a
+burst against a small queue is partly turned away with 503) and
+cancellation (a client that disconnects mid-answer stops its agent run).
+
+Usage:
+    python benchmarks/bench_api.py [--requests 64] [--concurrency 1,4,16]
+        [--llm-latency 0.05] [--rows 10000] [--output report.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+import types
+
+from bench_e2e import git_commit, isolate_environment, offline_hub_pull
+
+QUESTIONS = [
+    "How many orders are there per status? (request {})",
+    "What is the revenue by month? (request {})",
+    "How many orders came from each country? (request {})",
+    "Which product sold the most units? (request {})",
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def serve(service):
+    """Run the API for a service on a free port; yields its query URL."""
+    from aiohttp import web
+    import api
+
+    runner = web.AppRunner(api.create_app(service), handler_cancellation=True)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+async def load(url, database, questions, concurrency):
+    """Send every question, at most `concurrency` at a time; returns (seconds, [(status, seconds)])."""
+    import aiohttp
+
+    gate = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+
+    async def one(session, question):
+        async with gate:
+            start = time.perf_counter()
+            async with session.post(f"{url}/v1/query", json={"database": database, "question": question}) as response:
+                await response.read()
+                return response.status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        results = await asyncio.gather(*(one(session, question) for question in questions))
+    return time.perf_counter() - start, results
+
+
+def summarize(seconds, results):
+    latencies = sorted(latency for status, latency in results if status == 200)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report = {"requests": len(results), "seconds": round(seconds, 3),
+              "throughput_rps": round(len(latencies) / seconds, 2), "statuses": statuses}
+    if latencies:
+        report["p50_ms"] = round(1000 * latencies[len(latencies) // 2], 1)
+        report["p99_ms"] = round(1000 * latencies[int(0.99 * (len(latencies) - 1))], 1)
+    return report
+
+
+async def cancellation_run(url, database, llm, llm_latency):
+    """Disconnect during the second LLM call and count the calls the request still made."""
+    import aiohttp
+
+    calls = llm.calls
+    timeout = aiohttp.ClientTimeout(total=1.5 * llm_latency)
+    with contextlib.suppress(asyncio.TimeoutError):
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await session.post(f"{url}/v1/query", json={"database": database, "question": "How many orders per status? (cancelled)"})
+    # Give the worker time to notice and return
+    await asyncio.sleep(6 * llm_latency + 0.5)
+    return llm.calls - calls
+
+
+async def run_all(args, db_config, llm):
+    import api
+
+    server_config = {key: value for key, value in db_config.items() if key != "DATABASE"}
+    database = db_config["DATABASE"]
+    results = {}
+
+    service = api.Service(server_config, [database])
+    async with serve(service) as url:
+        # Warm-up builds the agent template, schema snapshot and table index
+        await load(url, database, [QUESTIONS[0].format("warm-up")], 1)
+        for concurrency in args.concurrency:
+            questions = [QUESTIONS[i % len(QUESTIONS)].format(f"c{concurrency}-{i}") for i in range(args.requests)]
+            results[f"concurrency_{concurrency}"] = summarize(*await load(url, database, questions, concurrency))
+        idle_stats = service.stats()
+
+    small = api.Service(server_config, [database], max_concurrent=2, max_queued=4)
+    async with serve(small) as url:
+        questions = [QUESTIONS[i % len(QUESTIONS)].format(f"burst-{i}") for i in range(args.requests)]
+        results["backpressure_burst"] = dict(
+            summarize(*await load(url, database, questions, args.requests)),
+            max_concurrent=2, max_queued=4,
+        )
+
+    cancel_service = api.Service(server_config, [database])
+    async with serve(cancel_service) as url:
+        llm_calls = await cancellation_run(url, database, llm, args.llm_latency)
+        results["cancellation"] = {
+            "llm_calls_cancelled_request": llm_calls,
+            "llm_calls_uncancelled": 4,
+            **{key: cancel_service.stats()[key] for key in ("cancelled", "running", "completed")},
+        }
+    results["service_stats"] = idle_stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client concurrency levels")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--rows", type=int, default=10000, help="orders in the fixture")
+    parser.add_argument("--tables", type=int, default=20, help="filler tables in the fixture")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Agent traces go to stderr so stdout carries only the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from fake_llm import scripted_chat_openai
+    from fixtures import SQL_RULES, create_fixture
+    import llm_agent
+
+    db_path = create_fixture(os.path.join(workdir, "fixture.db"), rows=args.rows, extra_tables=args.tables)
+    db_config = {"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost", "PORT": "", "DATABASE": db_path}
+    llm_agent.ChatOpenAI = scripted_chat_openai(SQL_RULES, latency=args.llm_latency)
+    llm_agent.hub = types.SimpleNamespace(pull=offline_hub_pull)
+    llm = llm_agent.get_llm(llm_agent.LLM_MODEL_NAME, llm_agent.SQL_AGENT_MODE)
+
+    results = asyncio.run(run_all(args, db_config, llm))
+    return {
+        "benchmark": "api_load",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "llm_latency": args.llm_latency,
+                   "rows": args.rows, "tables": args.tables + 4},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Size and build time of planned charts as query results grow.
+
+Builds charts from the SQLite fixture at growing order counts, for a time
+series, a time series split by status, a bar chart over many categories and
+a histogram. Each chart is built three ways:
+
+- raw: every fetched row goes into the figure (the previous behaviour);
+- downsample: the fetched rows are capped in pandas (LTTB, top categories,
+  pre-binned histograms) by chart_planner.build_figure;
+- pushdown: chart_aggregation.aggregate_for_chart first re-queries the
+  database with the aggregation, then build_figure caps what is left.
+
+Reported per chart: points in the figure, figure JSON size, the x range
+plotted for line charts (past RESULT_MAX_ROWS rows only pushdown covers the
+whole table), and seconds to fetch, aggregate and build (the fetch of the
+agent's query is included in every mode, as in the app).
+
+Usage:
+    python benchmarks/bench_chart_points.py [--rows 1000,10000,100000]
+        [--max-points 2000] [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from bench_e2e import git_commit, isolate_environment
+
+CHARTS = {
+    "time_series": ("SELECT created_at AS order_time, total FROM orders ORDER BY created_at",
+                    "Plot the order totals over time"),
+    "time_series_by_status": ("SELECT created_at AS order_time, status, total FROM orders",
+                              "Line chart of order totals over time by status"),
+    "categories": ("SELECT c.email, o.total FROM orders o JOIN customers c ON c.id = o.customer_id",
+                   "Bar chart of order totals by customer email"),
+    "histogram": ("SELECT total FROM orders", "Histogram of order totals"),
+}
+
+
+def figure_points(figure):
+    return sum(
+        max(len(getattr(trace, name, None) if getattr(trace, name, None) is not None else [])
+            for name in ("x", "y", "values"))
+        for trace in figure.data
+    )
+
+
+def build(engine, sql, prompt, mode, max_points):
+    from chart_aggregation import aggregate_for_chart
+    from chart_planner import build_figure, plan_chart
+    from result_set import fetch_result
+
+    start = time.perf_counter()
+    result = fetch_result(engine, sql)
+    spec = plan_chart(result.frame, prompt)
+    frame = result.frame
+    if mode == "pushdown":
+        spec, frame = aggregate_for_chart(engine, result, spec, max_points)
+    figure = build_figure(spec, frame, max_points if mode != "raw" else float("inf"))
+    payload = figure.to_json()
+    report = {
+        "result_rows": result.row_count,
+        "chart": spec.kind,
+        "points": figure_points(figure),
+        "json_kb": round(len(payload) / 1024, 1),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    if spec.kind == "line":
+        xs = [str(x)[:10] for trace in figure.data for x in trace.x]
+        report["x_range"] = [min(xs), max(xs)]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000", help="comma-separated order counts")
+    parser.add_argument("--max-points", type=int, default=2000, help="point cap per chart")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    args.rows = [int(rows) for rows in args.rows.split(",")]
+    output = os.path.abspath(args.output) if args.output else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from fixtures import create_fixture
+    from chart_aggregation import chart_aggregation_stats
+    from db_pool import get_engine
+
+    results = {}
+    for rows in args.rows:
+        db_path = create_fixture(os.path.join(workdir, f"fixture_{rows}.db"), rows=rows, extra_tables=0)
+        engine = get_engine({"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost",
+                             "PORT": "", "DATABASE": db_path})
+        results[f"rows_{rows}"] = {
+            name: {mode: build(engine, sql, prompt, mode, args.max_points)
+                   for mode in ("raw", "downsample", "pushdown")}
+            for name, (sql, prompt) in CHARTS.items()
+        }
+    results["chart_aggregation_stats"] = chart_aggregation_stats()
+    return {
+        "benchmark": "chart_points",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"rows": args.rows, "max_points": args.max_points},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Offline end-to-end benchmark with a scripted LLM and a SQLite fixture.
+
+Needs no OpenAI key and no MySQL server: ChatOpenAI in src/llm_agent.py is
+replaced by benchmarks/fake_llm.ScriptedChatModel and the agents run against a
+generated SQLite database. Caches and chat history go to a throwaway HOME, so
+every run starts cold.
+
+Timed steps:
+    initialize_sql_agent, initialize_python_agent, start_new_conversation
+    (chat reset), display_text_with_images,
+    and, through Streamlit's AppTest, the first script run, an idle rerun and
+    full chat turns for the SQL path, the planned-chart plot path, the
+    LLM-written plot path and a schema question answered without the LLM. generate_response is reported as a chat turn minus
+    an idle rerun with the same history.
+
+Prints one JSON report (also written to --output when given), tagged with the
+git commit so results can be compared across commits.
+
+Usage:
+    python benchmarks/bench_e2e.py [--rows 10000] [--tables 20] [--repeat 5]
+        [--llm-latency 0] [--replay responses.json] [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+APP_PATH = os.path.join(SRC_DIR, "app.py")
+
+ANSWER_TEXT = "\n".join(
+    f"- Order {i}: status shipped, total {i * 3.5:.2f}, see https://example.com/image{i}.jpg"
+    for i in range(40)
+)
+
+
+def summarize(timings):
+    return {
+        "runs": len(timings),
+        "first": round(timings[0], 5),
+        "min": round(min(timings), 5),
+        "median": round(statistics.median(timings), 5),
+        "max": round(max(timings), 5),
+    }
+
+
+def timed(fn, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def isolate_environment():
+    """Point HOME and the working directory at a temp dir with a dummy OpenAI secret."""
+    workdir = tempfile.mkdtemp(prefix="text-to-sql-bench-")
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write('[openai]\nOPENAI_API_KEY = "sk-offline-benchmark"\n')
+    os.environ["HOME"] = workdir
+    os.environ["OPENAI_API_KEY"] = "sk-offline-benchmark"
+    os.makedirs(os.path.join(workdir, "run"))
+    os.chdir(os.path.join(workdir, "run"))
+    sys.path.insert(0, SRC_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    return workdir
+
+
+def offline_hub_pull(name):
+    # Forces llm_agent onto its vendored prompt copies
+    raise ConnectionError(f"offline benchmark, not pulling {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="orders in the fixture")
+    parser.add_argument("--tables", type=int, default=20, help="filler tables in the fixture")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake LLM call")
+    parser.add_argument("--replay", help="JSON list of recorded LLM responses to return in order")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Agent traces and app prints go to stderr so stdout carries only the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from fake_llm import scripted_chat_openai
+    from fixtures import SQL_RULES, create_fixture
+
+    fixture_start = time.perf_counter()
+    db_path = create_fixture(os.path.join(workdir, "fixture.db"), rows=args.rows, extra_tables=args.tables)
+    fixture_seconds = time.perf_counter() - fixture_start
+
+    import llm_agent
+    from helper import display_text_with_images
+    from streamlit.testing.v1 import AppTest
+
+    llm_agent.ChatOpenAI = scripted_chat_openai(SQL_RULES, args.replay, args.llm_latency)
+    llm_agent.hub = types.SimpleNamespace(pull=offline_hub_pull)
+    # The app reads every connection field; SQLite only uses DRIVER and DATABASE
+    db_config = {"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost", "PORT": "", "DATABASE": db_path}
+
+    results = {}
+    results["initialize_sql_agent"] = summarize(
+        timed(lambda i: llm_agent.initialize_sql_agent(db_config, session_id=f"bench-{i}"), args.repeat)
+    )
+    results["initialize_python_agent"] = summarize(
+        timed(lambda i: llm_agent.initialize_python_agent(), args.repeat)
+    )
+    agent = llm_agent.initialize_sql_agent(db_config, session_id="bench-reset")
+    results["start_new_conversation"] = summarize(
+        timed(lambda i: llm_agent.start_new_conversation(agent, f"bench-reset-{i}"), args.repeat)
+    )
+    results["display_text_with_images"] = summarize(
+        timed(lambda i: display_text_with_images(ANSWER_TEXT), args.repeat)
+    )
+
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    at.secrets["openai"] = {"OPENAI_API_KEY": "sk-offline-benchmark"}
+    # Connected with no database chosen yet: the first run selects the fixture
+    # in the sidebar, which builds the agents the way a user's click does
+    at.session_state["db_config"] = dict(db_config, DATABASE="")
+    at.session_state["db_connected"] = True
+    at.session_state["databases"] = [db_path]
+    at.session_state["session_id"] = "bench-app"
+
+    errors = []
+
+    def run(fn):
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+        if at.exception:
+            errors.append(str(at.exception[0].value))
+        return seconds
+
+    results["app_first_run"] = summarize([run(at.run)])
+    idle = [run(at.run) for _ in range(args.repeat)]
+    results["app_rerun"] = summarize(idle)
+
+    turns = {
+        "sql": "How many orders are there per status? ({})",
+        "plot": "Plot the revenue by month ({})",
+        "plot_llm_code": "Plot a heatmap of orders by status ({})",
+        "schema": "What columns does the orders table have? ({})",
+    }
+    for path, question in turns.items():
+        turn = [run(lambda: at.chat_input[0].set_value(question.format(i)).run()) for i in range(args.repeat)]
+        history_rerun = [run(at.run) for _ in range(args.repeat)]
+        results[f"chat_turn_{path}"] = summarize(turn)
+        results[f"app_rerun_after_{path}"] = summarize(history_rerun)
+        results[f"generate_response_{path}"] = {
+            "estimated_median": round(statistics.median(turn) - statistics.median(history_rerun), 5)
+        }
+    cached = [run(lambda: at.chat_input[0].set_value(turns["sql"].format(0)).run()) for _ in range(args.repeat)]
+    results["chat_turn_sql_cached"] = summarize(cached)
+
+    roles = [message["role"] for message in at.session_state["messages"]]
+    from query_cache import query_cache_stats
+    return {
+        "benchmark": "e2e_offline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "rows": args.rows,
+            "tables": args.tables + 4,
+            "repeat": args.repeat,
+            "llm_latency": args.llm_latency,
+            "replay": args.replay,
+            "fixture_seconds": round(fixture_seconds, 3),
+        },
+        "results": results,
+        "messages": {role: roles.count(role) for role in sorted(set(roles))},
+        "query_cache": query_cache_stats(),
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+LLM calls and latency saved by verified few-shot examples.
+
+Runs the ReAct SQL agent from src/llm_agent.py with the scripted LLM against
+the SQLite fixture. A cold pass answers the seed questions and stores each
+question with the SQL it ran, the way "Mark as correct" does in the app.
+Paraphrases of the seed questions are then answered twice: once with no
+examples in scope and once with examples retrieved from the seeded store.
+Unrelated questions check that retrieval stays quiet when nothing matches.
+
+The scripted model runs the query as soon as the prompt carries examples,
+which is how a real model is expected to use them; the LLM call counts are
+therefore a best case, while retrieval hit rate and latency are measured.
+
+Usage:
+    python benchmarks/bench_examples.py [--rows 2000] [--llm-latency 0.05]
+        [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import types
+
+from bench_e2e import git_commit, isolate_environment, offline_hub_pull
+
+SEED_QUESTIONS = [
+    "How many orders are there per status?",
+    "What is the revenue by month?",
+    "How many orders came from each country?",
+    "Which product sold the most units?",
+    "How many orders are there in total?",
+]
+
+PARAPHRASES = [
+    "Count the orders per status",
+    "How many orders does each status have?",
+    "Show revenue per month",
+    "Monthly revenue please",
+    "Number of orders by country",
+    "Which country do the orders come from?",
+    "Top product by units sold",
+    "What is the total number of orders?",
+]
+
+UNRELATED = [
+    "What is the average price of a product in each category?",
+    "Which customers signed up last week?",
+]
+
+
+def answer(agent, question, examples):
+    """Answer one question in a fresh conversation; returns (seconds, llm calls, sql)."""
+    import llm_agent
+    from example_store import example_scope
+    from result_set import collect_results
+
+    llm = llm_agent.get_llm(llm_agent.LLM_MODEL_NAME, "react")
+    agent = llm_agent.start_new_conversation(agent, f"bench-{time.perf_counter_ns()}")
+    calls = llm.calls
+    start = time.perf_counter()
+    with example_scope(examples), collect_results() as results:
+        agent.run(question)
+    return time.perf_counter() - start, llm.calls - calls, results[-1].sql if results else None
+
+
+def replay(agent, store, database, questions, use_examples):
+    runs = []
+    for question in questions:
+        examples = store.search(database, question) if use_examples else []
+        seconds, calls, sql = answer(agent, question, examples)
+        runs.append({"question": question, "examples": len(examples), "llm_calls": calls,
+                     "seconds": seconds, "sql": sql})
+    return runs
+
+
+def summarize(runs):
+    return {
+        "questions": len(runs),
+        "with_examples": sum(1 for run in runs if run["examples"]),
+        "avg_llm_calls": round(statistics.mean(run["llm_calls"] for run in runs), 3),
+        "median_seconds": round(statistics.median(run["seconds"] for run in runs), 5),
+        "total_seconds": round(sum(run["seconds"] for run in runs), 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000, help="orders in the fixture")
+    parser.add_argument("--tables", type=int, default=20, help="filler tables in the fixture")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Agent traces go to stderr so stdout carries only the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from fake_llm import scripted_chat_openai
+    from fixtures import SQL_RULES, create_fixture
+    import llm_agent
+    from example_store import database_key, get_example_store
+
+    db_path = create_fixture(os.path.join(workdir, "fixture.db"), rows=args.rows, extra_tables=args.tables)
+    db_config = {"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost", "PORT": "", "DATABASE": db_path}
+    llm_agent.ChatOpenAI = scripted_chat_openai(SQL_RULES, latency=args.llm_latency)
+    llm_agent.hub = types.SimpleNamespace(pull=offline_hub_pull)
+    agent = llm_agent.initialize_sql_agent(db_config, session_id="bench-examples")
+
+    store = get_example_store()
+    database = database_key(db_config)
+    # Cold pass: the seed answers are the ones a user marks as correct
+    cold = replay(agent, store, database, SEED_QUESTIONS, use_examples=False)
+    for run in cold:
+        store.add(database, run["question"], run["sql"])
+
+    baseline = replay(agent, store, database, PARAPHRASES, use_examples=False)
+    with_examples = replay(agent, store, database, PARAPHRASES, use_examples=True)
+    unrelated = replay(agent, store, database, UNRELATED, use_examples=True)
+
+    retrieval = []
+    for _ in range(200):
+        for question in PARAPHRASES + UNRELATED:
+            start = time.perf_counter()
+            store.search(database, question)
+            retrieval.append(time.perf_counter() - start)
+    retrieval.sort()
+
+    return {
+        "benchmark": "example_store",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"rows": args.rows, "tables": args.tables + 4, "llm_latency": args.llm_latency},
+        "cold_seed_pass": summarize(cold),
+        "paraphrases_without_examples": summarize(baseline),
+        "paraphrases_with_examples": summarize(with_examples),
+        # Same query as without examples: retrieval did not steer the agent elsewhere
+        "same_sql_as_baseline": sum(a["sql"] == b["sql"] for a, b in zip(baseline, with_examples)),
+        "unrelated_with_examples": sum(1 for run in unrelated if run["examples"]),
+        "retrieval_latency": {
+            "median_ms": round(1000 * statistics.median(retrieval), 4),
+            "p99_ms": round(1000 * retrieval[int(0.99 * (len(retrieval) - 1))], 4),
+        },
+        "misses": [run["question"] for run in with_examples if not run["examples"]],
+        "example_store": store.stats(),
+    }
+
+
+if __name__ == "__main__":
+    main()
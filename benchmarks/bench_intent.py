@@ -0,0 +1,198 @@
+"""
+Routing accuracy and latency of the local intent router.
+
+Classifies a labeled test set (phrasings that are not in the router's
+training examples) with src/intent_router.route_intent and with the keyword
+routing the app used before, and reports accuracy, a confusion matrix, how
+many requests skip the LLM, and per-request routing latency. Schema answers
+are timed against the SQLite fixture's snapshot.
+
+Usage:
+    python benchmarks/bench_intent.py [--repeat 200] [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+from bench_e2e import git_commit, isolate_environment
+
+# (request, expected intent)
+TEST_SET = [
+    ("hello!", "chitchat"),
+    ("hi there, good evening", "chitchat"),
+    ("hey", "chitchat"),
+    ("thanks!", "chitchat"),
+    ("thank you so much", "chitchat"),
+    ("goodbye", "chitchat"),
+    ("what can you do for me?", "chitchat"),
+    ("what are you able to help with", "chitchat"),
+    ("who made you", "chitchat"),
+    ("how should I use you", "chitchat"),
+    ("great, cheers", "chitchat"),
+    ("can you help?", "chitchat"),
+    ("list the tables", "schema"),
+    ("what tables exist in this database", "schema"),
+    ("show all tables", "schema"),
+    ("which tables are available?", "schema"),
+    ("how many tables does the database have", "schema"),
+    ("what columns are in the orders table", "schema"),
+    ("describe the users table", "schema"),
+    ("columns of order_items", "schema"),
+    ("what is the schema of products", "schema"),
+    ("which table stores the status column", "schema"),
+    ("how is order_items related to orders", "schema"),
+    ("what's the primary key of users", "schema"),
+    ("show me the structure of the orders table", "schema"),
+    ("what fields does the users table have", "schema"),
+    ("how many orders were placed in 2023", "sql"),
+    ("show me the orders that were shipped", "sql"),
+    ("show the 5 most recent users", "sql"),
+    ("what is the total revenue per month", "sql"),
+    ("average order total by status", "sql"),
+    ("top 3 products by quantity sold", "sql"),
+    ("which customers returned the most orders", "sql"),
+    ("how many users are from france", "sql"),
+    ("list the orders above 100 dollars", "sql"),
+    ("what percentage of orders are cancelled", "sql"),
+    ("find orders placed by user 7", "sql"),
+    ("count the number of distinct products sold", "sql"),
+    ("what is the median order value", "sql"),
+    ("which month had the lowest revenue", "sql"),
+    ("give me the users who never ordered", "sql"),
+    ("show me total sales for each category", "sql"),
+    # Data questions that share words with small talk or schema questions
+    ("can you help me find the top customers", "sql"),
+    ("what are the orders from last week", "sql"),
+    ("show me the orders", "sql"),
+    ("show the users", "sql"),
+    ("how many columns are null in orders", "sql"),
+    ("great, now show revenue by month", "sql"),
+    ("thanks, and how many users signed up today?", "sql"),
+    ("which fields are empty for user 7", "sql"),
+    ("plot orders per month", "viz"),
+    ("show revenue by status as a bar chart", "viz"),
+    ("pie chart of orders by status", "viz"),
+    ("visualize the top 10 products", "viz"),
+    ("graph the daily number of orders", "viz"),
+    ("can you draw a histogram of order totals", "viz"),
+    ("plot it", "viz"),
+    ("make a chart of signups by week", "viz"),
+    ("scatter plot of quantity against total", "viz"),
+    ("visualise returns over time", "viz"),
+]
+
+LEGACY_PLOT_KEYWORDS = ["plot", "graph", "chart", "diagram", "visualize", "visualisation", "show"]
+LEGACY_GREETINGS = ['hello', 'hi', 'hey', 'help', 'what can you do']
+# LLM calls made by each path: ReAct SQL agent (at least 2) and SQL agent plus python agent
+LLM_CALLS = {"chitchat": 0, "schema": 0, "sql": 2, "viz": 3}
+
+
+def legacy_route(question):
+    """Keyword routing of app.py before the intent router."""
+    if any(keyword in question.lower() for keyword in LEGACY_PLOT_KEYWORDS):
+        return "viz"
+    if question.lower() in LEGACY_GREETINGS:
+        return "chitchat"
+    return "sql"
+
+
+def evaluate(route):
+    confusion = {expected: {} for _, expected in TEST_SET}
+    misrouted = []
+    for question, expected in TEST_SET:
+        predicted = route(question)
+        confusion[expected][predicted] = confusion[expected].get(predicted, 0) + 1
+        if predicted != expected:
+            misrouted.append({"question": question, "expected": expected, "predicted": predicted})
+    correct = len(TEST_SET) - len(misrouted)
+    per_intent = {}
+    for intent, row in confusion.items():
+        total = sum(row.values())
+        predicted_total = sum(r.get(intent, 0) for r in confusion.values())
+        per_intent[intent] = {
+            "recall": round(row.get(intent, 0) / total, 3),
+            "precision": round(row.get(intent, 0) / predicted_total, 3) if predicted_total else None,
+        }
+    llm_calls = sum(LLM_CALLS[route(question)] for question, _ in TEST_SET)
+    return {
+        "accuracy": round(correct / len(TEST_SET), 3),
+        "per_intent": per_intent,
+        "confusion": confusion,
+        "llm_calls": llm_calls,
+        "misrouted": misrouted,
+    }
+
+
+def latency(fn, inputs, repeat):
+    timings = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            fn(value)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "median_ms": round(1000 * statistics.median(timings), 4),
+        "p99_ms": round(1000 * timings[int(0.99 * (len(timings) - 1))], 4),
+        "max_ms": round(1000 * timings[-1], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the test set for latency")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from fixtures import create_fixture
+    import intent_router
+    from schema_snapshot import get_schema_snapshot
+
+    start = time.perf_counter()
+    intent_router.get_classifier()
+    train_seconds = time.perf_counter() - start
+
+    router = evaluate(lambda question: intent_router.route_intent(question)[0])
+    legacy = evaluate(legacy_route)
+    questions = [question for question, _ in TEST_SET]
+
+    db_path = create_fixture(os.path.join(workdir, "fixture.db"), rows=1000, extra_tables=20)
+    db_config = {"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost", "PORT": "", "DATABASE": db_path}
+    snapshot = get_schema_snapshot(db_config)
+    schema_questions = [question for question, expected in TEST_SET if expected == "schema"]
+
+    return {
+        "benchmark": "intent_router",
+        "commit": git_commit(),
+        "test_set": len(TEST_SET),
+        "training_examples": len(intent_router.TRAINING_EXAMPLES),
+        "train_seconds": round(train_seconds, 5),
+        "router": router,
+        "legacy_keywords": legacy,
+        "route_latency": latency(intent_router.route_intent, questions, args.repeat),
+        "schema_answer_latency": latency(
+            lambda question: intent_router.answer_schema_question(snapshot, question),
+            schema_questions, max(1, args.repeat // 10),
+        ),
+        "router_stats": intent_router.router_stats(),
+    }
+
+
+if __name__ == "__main__":
+    main()
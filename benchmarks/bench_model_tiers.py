@@ -0,0 +1,181 @@
+"""
+Latency and escalations of routing SQL questions between a fast and a large model.
+
+Runs the SQL agent from src/llm_agent.py with the scripted LLM against the
+SQLite fixture. The scripted fast model answers most questions like the large
+one but writes a query with a wrong column for one question and a
+case-sensitive filter that matches nothing for another; both must be
+escalated. Questions are scoped to the tables the table index selects for
+them, as in the app. Three runs:
+
+- large_only: MODEL_TIERING off, every question on LLM_MODEL_NAME;
+- tiered: easy questions on LLM_FAST_MODEL_NAME, escalated on failure;
+- tiered_fast_failing: the fast model gets every query wrong, so its success
+  rate drops and easy questions are held back on the large model apart from
+  periodic probes.
+
+Reported per run: seconds, LLM calls per model, answers that differ from
+large_only, the route and tier of each question, and model_tier_stats.
+
+Usage:
+    python benchmarks/bench_model_tiers.py [--rows 2000] [--repeat 3]
+        [--fast-latency 0.05] [--large-latency 0.2] [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import types
+
+from bench_e2e import git_commit, isolate_environment, offline_hub_pull
+
+QUESTIONS = {
+    "per_status": "How many orders are there per status?",
+    "order_count": "What is the total number of orders?",
+    "top_products": "Which product sold the most units?",
+    "orders": "How many orders do we have?",
+    "status_counts": "Show order counts by status",
+    "best_sellers": "What are the best selling products?",
+    "shipped": "List the orders that were shipped",
+    "returned": "How many orders were returned?",
+    "by_country": "How many orders came from each country?",
+    "long": "For the executive summary I am writing this week, could you tell me how many orders "
+            "we have in each status, so I can compare fulfilment stages across the whole history?",
+}
+
+LARGE_RULES = [
+    ("shipped", "SELECT id, total FROM orders WHERE LOWER(status) LIKE 'shipped'"),
+    ("returned", "SELECT COUNT(*) AS orders FROM orders WHERE LOWER(status) LIKE 'returned'"),
+]
+
+FAST_RULES = [
+    ("shipped", "SELECT id, total FROM orders WHERE status = 'Shipped'"),
+    ("returned", "SELECT COUNT(*) AS orders FROM orders WHERE state = 'returned'"),
+]
+
+FAILING_RULES = [("", "SELECT COUNT(*) AS orders FROM orders WHERE state = 'unknown'")]
+
+
+def model_calls():
+    import llm_agent
+    calls = {}
+    for (model_name, _), llm in llm_agent._llms.items():
+        calls[model_name] = calls.get(model_name, 0) + llm.calls
+    return calls
+
+
+def ask(agent, db_config, question):
+    """Answer one question in a fresh conversation, scoped like the app scopes it."""
+    import llm_agent
+    from result_set import collect_results
+    from schema_snapshot import table_scope
+    from table_index import get_table_index
+    from tracing import trace_request
+
+    agent = llm_agent.start_new_conversation(agent, f"bench-{time.perf_counter_ns()}")
+    tables = get_table_index(db_config).select_tables(question)
+    start = time.perf_counter()
+    with trace_request("sql") as trace, table_scope(tables), collect_results() as results:
+        agent.run(question)
+    seconds = time.perf_counter() - start
+    attempts = [span["attributes"] for span in trace.spans if span["name"] == "model_tier"]
+    answer = results[-1].frame.to_dict("list") if results else None
+    return {
+        "seconds": round(seconds, 4),
+        "tables": len(tables) if tables else None,
+        "route": attempts[0]["route"] if attempts else None,
+        "tiers": [attempt["tier"] for attempt in attempts],
+    }, answer
+
+
+def run_mode(db_config, tiering, repeat, reference=None):
+    import llm_agent
+
+    llm_agent.MODEL_TIERING = tiering
+    llm_agent._tier_policy = llm_agent.ModelTierPolicy()
+    agent = llm_agent.initialize_sql_agent(db_config, session_id="bench-model-tiers")
+    calls_before = model_calls()
+    start = time.perf_counter()
+    questions, answers = {}, {}
+    for i in range(repeat):
+        for name, question in QUESTIONS.items():
+            report, answers[name] = ask(agent, db_config, question)
+            questions.setdefault(name, []).append(report)
+    seconds = time.perf_counter() - start
+    calls = {model: count - calls_before.get(model, 0) for model, count in model_calls().items()}
+    report = {
+        "seconds": round(seconds, 4),
+        "llm_calls": {model: count for model, count in calls.items() if count},
+        "questions": questions,
+    }
+    if tiering:
+        report["model_tier_stats"] = llm_agent.model_tier_stats()
+    if reference is not None:
+        report["answers_differing_from_large_only"] = sorted(
+            name for name in QUESTIONS if answers[name] != reference[name]
+        )
+    return report, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000, help="orders in the fixture")
+    parser.add_argument("--tables", type=int, default=20, help="filler tables in the fixture")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the question set per run")
+    parser.add_argument("--fast-latency", type=float, default=0.05, help="seconds per fast model call")
+    parser.add_argument("--large-latency", type=float, default=0.2, help="seconds per large model call")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Agent traces go to stderr so stdout carries only the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from constants import LLM_FAST_MODEL_NAME, LLM_MODEL_NAME
+    from fake_llm import scripted_chat_openai
+    from fixtures import SQL_RULES, create_fixture
+    import llm_agent
+
+    db_path = create_fixture(os.path.join(workdir, "fixture.db"), rows=args.rows, extra_tables=args.tables)
+    db_config = {"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost", "PORT": "", "DATABASE": db_path}
+    llm_agent.ChatOpenAI = scripted_chat_openai(LARGE_RULES + SQL_RULES, latency=args.large_latency, models={
+        LLM_FAST_MODEL_NAME: {"sql_rules": FAST_RULES + SQL_RULES, "latency": args.fast_latency},
+    })
+    llm_agent.hub = types.SimpleNamespace(pull=offline_hub_pull)
+
+    results = {}
+    results["large_only"], reference = run_mode(db_config, False, args.repeat)
+    results["tiered"], _ = run_mode(db_config, True, args.repeat, reference)
+    for (model_name, _), llm in llm_agent._llms.items():
+        if model_name == LLM_FAST_MODEL_NAME:
+            llm.sql_rules = FAILING_RULES
+    results["tiered_fast_failing"], _ = run_mode(db_config, True, args.repeat, reference)
+    return {
+        "benchmark": "model_tiers",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "rows": args.rows,
+            "tables": args.tables + 4,
+            "repeat": args.repeat,
+            "fast_model": LLM_FAST_MODEL_NAME,
+            "large_model": LLM_MODEL_NAME,
+            "fast_latency": args.fast_latency,
+            "large_latency": args.large_latency,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Prompt tokens saved by summarizing large SQL results for the agent.
+
+Runs the ReAct SQL agent from src/llm_agent.py with the scripted LLM against
+the SQLite fixture, for questions whose queries return a handful of rows up
+to the whole orders table. Each question is answered with three renderings
+of the query result in the agent's observation:
+
+- full_rows: every row, as plain SQLDatabase.run returns them;
+- preview: the first RESULT_PREVIEW_ROWS rows (the previous behaviour);
+- summary: rows of small results, a summary of large ones (current).
+
+Reported per question and mode: prompt tokens over all LLM calls of the
+request, the largest single prompt, the final answer's tokens before and
+after clipping to PREV_CONTEXT_MAX_TOKENS for the next turn's context, the
+tokens_saved trace counter and latency. The scripted model copies the
+observation into its final answer, as the agent prompt asks a real model to.
+
+Usage:
+    python benchmarks/bench_observation.py [--rows 10000] [--llm-latency 0.0]
+        [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import types
+
+from bench_e2e import git_commit, isolate_environment, offline_hub_pull
+
+QUESTIONS = {
+    "per_status": "How many orders are there per status?",
+    "by_month": "What is the revenue by month?",
+    "all_customers": "List all customers",
+    "every_order": "List every order with its total",
+}
+
+LIST_RULES = [
+    ("all customers", "SELECT id, first_name, last_name, email, country FROM customers"),
+    ("every order", "SELECT id, customer_id, status, total, created_at FROM orders"),
+]
+
+
+def answer(agent, question):
+    """Answer one question in a fresh conversation inside a request trace."""
+    import llm_agent
+    from result_set import collect_results
+    from tracing import TracingHandler, trace_request
+
+    agent = llm_agent.start_new_conversation(agent, f"bench-{time.perf_counter_ns()}")
+    start = time.perf_counter()
+    with trace_request("sql") as trace, collect_results() as results:
+        response = agent.run(question, callbacks=[TracingHandler()])
+    seconds = time.perf_counter() - start
+    prompts = [span["attributes"].get("prompt_tokens", 0) for span in trace.spans if span["name"] == "llm"]
+    return trace, response, seconds, prompts, results[-1].row_count if results else 0
+
+
+def run_mode(agent, mode):
+    from constants import PREV_CONTEXT_MAX_TOKENS
+    from memory import clip_tokens, count_tokens
+    import result_set
+
+    renderings = {
+        "full_rows": lambda result: result_set._rows_text(result.frame) if not result.frame.empty else "",
+        "preview": result_set.QueryResult.preview_text,
+        "summary": result_set.QueryResult.summary_text,
+    }
+    original = result_set.QueryResult.summary_text
+    render = renderings[mode]
+    result_set.QueryResult.summary_text = lambda self, *args, **kwargs: render(self)
+    try:
+        report = {}
+        for name, question in QUESTIONS.items():
+            trace, response, seconds, prompts, rows = answer(agent, question)
+            report[name] = {
+                "result_rows": rows,
+                "llm_calls": trace.counters["llm_calls"],
+                "prompt_tokens": trace.counters["prompt_tokens"],
+                "max_prompt_tokens": max(prompts, default=0),
+                "answer_tokens": count_tokens(response),
+                "answer_tokens_in_next_context": count_tokens(clip_tokens(response, PREV_CONTEXT_MAX_TOKENS)),
+                "tokens_saved": trace.counters["tokens_saved"],
+                "seconds": round(seconds, 4),
+            }
+        return report
+    finally:
+        result_set.QueryResult.summary_text = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="orders in the fixture")
+    parser.add_argument("--tables", type=int, default=20, help="filler tables in the fixture")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake LLM call")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Agent traces go to stderr so stdout carries only the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    workdir = isolate_environment()
+    from fake_llm import scripted_chat_openai
+    from fixtures import SQL_RULES, create_fixture
+    import llm_agent
+    from result_set import observation_stats
+
+    db_path = create_fixture(os.path.join(workdir, "fixture.db"), rows=args.rows, extra_tables=args.tables)
+    db_config = {"DRIVER": "sqlite", "USER": "", "PASSWORD": "", "HOST": "localhost", "PORT": "", "DATABASE": db_path}
+    llm_agent.ChatOpenAI = scripted_chat_openai(LIST_RULES + SQL_RULES, latency=args.llm_latency)
+    llm_agent.hub = types.SimpleNamespace(pull=offline_hub_pull)
+    agent = llm_agent.initialize_sql_agent(db_config, session_id="bench-observation")
+
+    results = {mode: run_mode(agent, mode) for mode in ("full_rows", "preview", "summary")}
+    results["observation_stats"] = observation_stats()
+    return {
+        "benchmark": "agent_observation",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"rows": args.rows, "tables": args.tables + 4, "llm_latency": args.llm_latency},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    main()
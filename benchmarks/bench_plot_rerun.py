@@ -0,0 +1,78 @@
+"""
+Rerun cost of re-rendering plot messages in the chat history.
+
+Compares the old history loop, which exec'd every stored plot's code on each
+Streamlit rerun, with rendering from the figure cache. Prints one JSON object
+per history length.
+
+Usage:
+    python benchmarks/bench_plot_rerun.py [--plots 1 5 10 20 40] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import streamlit as st  # noqa: E402
+from figure_cache import figure_from_code, load_figure  # noqa: E402
+
+PLOT_CODE = """
+import plotly.express as px
+df = pd.DataFrame({{"month": pd.date_range("2024-01-01", periods=120, freq="D"),
+                   "orders": [({seed} * 7 + i * 13) % 97 for i in range(120)]}})
+fig = px.line(df, x="month", y="orders", title="Orders {seed}")
+fig.show()
+"""
+
+
+def rerun_exec(codes):
+    for code in codes:
+        exec(code)
+
+
+def rerun_cached(figures):
+    for figure in figures:
+        st.plotly_chart(load_figure(figure), theme='streamlit', use_container_width=True)
+
+
+def best_of(fn, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--plots", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for count in args.plots:
+        sources = [PLOT_CODE.format(seed=i) for i in range(count)]
+        # What the history used to hold: code re-run on every rerun
+        codes = [
+            f"import pandas as pd\n{code.replace('fig.show()', '')}"
+            "st.plotly_chart(fig, theme='streamlit', use_container_width=True)"
+            for code in sources
+        ]
+        # What it holds now: the figure serialized once when the plot was made
+        figures = [figure_from_code(code) for code in sources]
+        exec_seconds = best_of(rerun_exec, codes, args.repeat)
+        cached_seconds = best_of(rerun_cached, figures, args.repeat)
+        print(json.dumps({
+            "benchmark": "plot_rerun",
+            "plots": count,
+            "exec_seconds": round(exec_seconds, 4),
+            "cached_seconds": round(cached_seconds, 4),
+            "speedup": round(exec_seconds / cached_seconds, 1) if cached_seconds else None,
+        }))
+
+
+if __name__ == "__main__":
+    main()
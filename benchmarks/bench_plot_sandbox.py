@@ -0,0 +1,157 @@
+"""
+Cost and isolation of running generated plot code in the plot sandbox.
+
+Compares src/plot_sandbox's worker pool with running the same code in-process
+(the old figure_from_code exec):
+
+- pool start-up until every worker has pandas and plotly imported;
+- per-plot latency for typical generated code;
+- how long the app process stalls while generated code runs a long
+  GIL-holding builtin, measured as the longest gap of a 10 ms heartbeat
+  thread;
+- a runaway loop (killed at the timeout), a memory hog (stopped by the
+  address-space cap) and a crashing worker, and whether the next plot
+  still succeeds.
+
+Usage:
+    python benchmarks/bench_plot_sandbox.py [--runs 50] [--spin-items 50000000] [--timeout 3]
+        [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from bench_e2e import git_commit, isolate_environment
+
+PLOT_CODE = """
+df = pd.DataFrame({"month": pd.date_range("2024-01-01", periods=120, freq="D"),
+                   "orders": [(i * 13) % 97 for i in range(120)]})
+fig = px.line(df, x="month", y="orders", title="Orders")
+fig.show()
+"""
+
+# A builtin looping in C holds the GIL: other threads of the process stall
+SPIN_CODE = """
+total = sum(range({items}))
+fig = go.Figure()
+"""
+
+FAULTS = {
+    "runaway_loop": "while True:\n    pass",
+    "memory_hog": "blocks = [bytearray(256 * 1024 * 1024) for _ in range(64)]",
+    "worker_crash": "import os\nos._exit(1)",
+}
+
+
+def in_process(code):
+    namespace = {}
+    exec(f"import pandas as pd\nimport numpy as np\nimport plotly.express as px\n"
+         f"import plotly.graph_objects as go\n{code.replace('fig.show()', '')}", namespace)
+    return namespace["fig"].to_json()
+
+
+def heartbeat_gap(fn):
+    """Run fn while a thread ticks every 10 ms; returns the longest gap between ticks in ms."""
+    gaps = []
+    done = threading.Event()
+
+    def tick():
+        last = time.perf_counter()
+        while not done.is_set():
+            time.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    thread = threading.Thread(target=tick)
+    thread.start()
+    try:
+        fn()
+    finally:
+        done.set()
+        thread.join()
+    return round(1000 * max(gaps), 1)
+
+
+def latency(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"median_ms": round(1000 * statistics.median(timings), 2),
+            "p99_ms": round(1000 * timings[int(0.99 * (len(timings) - 1))], 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50, help="plots per latency measurement")
+    parser.add_argument("--spin-items", type=int, default=50_000_000, help="numbers the spinning code sums")
+    parser.add_argument("--timeout", type=float, default=3.0, help="sandbox timeout in seconds")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(args)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def run_benchmarks(args):
+    isolate_environment()
+    from plot_sandbox import PlotCodeError, PlotSandbox
+
+    start = time.perf_counter()
+    sandbox = PlotSandbox(timeout=args.timeout)
+    while sandbox.stats()["idle_workers"] < 2:
+        time.sleep(0.01)
+    startup = time.perf_counter() - start
+
+    in_process(PLOT_CODE)  # imports pandas and plotly here too before timing
+    spin = SPIN_CODE.format(items=args.spin_items)
+    results = {
+        "pool_startup_seconds": round(startup, 3),
+        "plot_latency": {
+            "in_process": latency(lambda: in_process(PLOT_CODE), args.runs),
+            "sandbox": latency(lambda: sandbox.run(PLOT_CODE), args.runs),
+        },
+        "heartbeat_max_gap_ms_while_spinning": {
+            "in_process": heartbeat_gap(lambda: in_process(spin)),
+            "sandbox": heartbeat_gap(lambda: sandbox.run(spin)),
+        },
+    }
+
+    faults = {}
+    for name, code in FAULTS.items():
+        start = time.perf_counter()
+        try:
+            result = sandbox.run(code)
+            outcome = result["error"] or "no error"
+        except PlotCodeError as e:
+            outcome = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+        recovered = sandbox.run(PLOT_CODE)["figure"] is not None
+        faults[name] = {"outcome": outcome, "seconds": round(seconds, 3), "next_plot_ok": recovered}
+    results["faults"] = faults
+    results["stats"] = sandbox.stats()
+
+    return {
+        "benchmark": "plot_sandbox",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"runs": args.runs, "spin_items": args.spin_items, "timeout": args.timeout},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Cold-start cost of the Streamlit entry point.
+
+Each run starts a fresh interpreter under `-X importtime`, renders src/app.py
+once through Streamlit's AppTest (no database configured, as a new visitor
+sees it), and reports:
+
+- time_to_first_render: seconds for that first script run, app imports included;
+- import_seconds: total import time of the modules the app pulled in, with
+  app_imports (cumulative time of each module the app imported directly) and
+  package_breakdown (self time summed per top-level package), largest first;
+- heavy_modules: which of the agent/DB stacks were loaded by the first page.
+
+Use --ref to measure other commits side by side, e.g. before and after a change:
+
+    python benchmarks/bench_startup.py --ref HEAD~1 --ref WORKTREE --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_START_MARKER = "import time: --- app start ---"
+HEAVY_MODULES = (
+    "langchain", "langchain_community", "langchain_experimental", "langchain_core",
+    "sqlalchemy", "pymysql", "pandas", "plotly", "tiktoken", "unidecode",
+)
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def child(src_dir):
+    """Render the app once in this (fresh) process and print the measurements."""
+    home = tempfile.mkdtemp(prefix="text-to-sql-startup-")
+    os.makedirs(os.path.join(home, "run", ".streamlit"))
+    with open(os.path.join(home, "run", ".streamlit", "secrets.toml"), "w") as f:
+        f.write('[openai]\nOPENAI_API_KEY = "sk-offline-benchmark"\n')
+    os.environ["HOME"] = home
+    os.chdir(os.path.join(home, "run"))
+    sys.path.insert(0, src_dir)
+
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(src_dir, "app.py"), default_timeout=120)
+    at.secrets["openai"] = {"OPENAI_API_KEY": "sk-offline-benchmark"}
+    preloaded = set(sys.modules)
+
+    sys.stderr.write(APP_START_MARKER + "\n")
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    loaded = set(sys.modules) - preloaded
+    print(json.dumps({
+        "time_to_first_render": seconds,
+        "heavy_modules": sorted(m for m in HEAVY_MODULES if m in loaded),
+        "exception": str(at.exception[0].value) if at.exception else None,
+    }))
+    shutil.rmtree(home, ignore_errors=True)
+
+
+def parse_importtime(stderr):
+    """
+    Seconds per import, for imports after the app started.
+
+    Returns:
+        tuple: (cumulative seconds per outermost import,
+                self seconds summed per top-level package)
+    """
+    outermost, packages = {}, {}
+    lines = stderr.splitlines()
+    if APP_START_MARKER in lines:
+        lines = lines[lines.index(APP_START_MARKER) + 1:]
+    for line in lines:
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        package = match.group(4).split(".")[0]
+        packages[package] = packages.get(package, 0) + int(match.group(1)) / 1e6
+        if len(match.group(3)) == 1:
+            outermost[package] = outermost.get(package, 0) + int(match.group(2)) / 1e6
+    return outermost, packages
+
+
+def _ranked(samples, top=15):
+    medians = {name: statistics.median(values) for name, values in samples.items()}
+    return {name: round(seconds, 4) for name, seconds in sorted(medians.items(), key=lambda i: -i[1])[:top]}
+
+
+def source_dir(ref, workdir):
+    if ref == "WORKTREE":
+        return os.path.join(REPO_DIR, "src")
+    target = os.path.join(workdir, re.sub(r"[^A-Za-z0-9_.-]", "_", ref))
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", ref, "src"], cwd=REPO_DIR, check=True, capture_output=True
+    ).stdout
+    with tempfile.TemporaryFile() as f:
+        f.write(archive)
+        f.seek(0)
+        with tarfile.open(fileobj=f) as tar:
+            tar.extractall(target)
+    return os.path.join(target, "src")
+
+
+def measure(ref, runs, workdir):
+    src_dir = source_dir(ref, workdir)
+    renders, totals, app_imports, packages = [], [], {}, {}
+    last = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child", src_dir],
+            capture_output=True, text=True,
+        )
+        reports = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not reports:
+            raise RuntimeError(f"startup run for {ref} failed:\n{proc.stderr[-2000:]}")
+        last = json.loads(reports[-1])
+        renders.append(last["time_to_first_render"])
+        outermost, by_package = parse_importtime(proc.stderr)
+        totals.append(sum(outermost.values()))
+        for name, seconds in outermost.items():
+            app_imports.setdefault(name, []).append(seconds)
+        for name, seconds in by_package.items():
+            packages.setdefault(name, []).append(seconds)
+    return {
+        "ref": ref,
+        "runs": runs,
+        "time_to_first_render": {
+            "median": round(statistics.median(renders), 4),
+            "min": round(min(renders), 4),
+            "max": round(max(renders), 4),
+        },
+        "import_seconds": round(statistics.median(totals), 4),
+        "app_imports": _ranked(app_imports),
+        "package_breakdown": _ranked(packages),
+        "heavy_modules": last["heavy_modules"],
+        "exception": last["exception"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ref", action="append", help="git ref to measure, or WORKTREE (default)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="text-to-sql-startup-src-")
+    try:
+        results = [measure(ref, args.runs, workdir) for ref in (args.ref or ["WORKTREE"])]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({"benchmark": "startup", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
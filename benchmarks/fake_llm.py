@@ -0,0 +1,134 @@
+"""
+Deterministic stand-in for ChatOpenAI used by the offline benchmarks.
+
+ScriptedChatModel reads the prompt it is given and answers the way a
+well-behaved model would at each step of the agents in src/llm_agent.py:
+
+- ReAct SQL agent: list tables, fetch schema, run a query, then give the
+  query output as the final answer. When the prompt carries verified
+  examples, it runs the query straight away.
+- Single-shot SQL agent: return the query directly.
+- Python plotting agent: return a fenced block of plotly code.
+
+Queries come from an ordered list of (keyword, sql) rules matched against the
+question. A replay file (JSON list of strings) can be given instead, in which
+case responses are returned in order regardless of the prompt. Models can be
+given their own rules and latency, e.g. a fast model that gets some queries
+wrong next to a slower one that gets them right.
+"""
+import json
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+PLOT_CODE = """```python
+import plotly.express as px
+df = pd.DataFrame({"status": ["new", "paid", "shipped"], "orders": [12, 30, 18]})
+fig = px.bar(df, x="status", y="orders")
+fig.show()
+```"""
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers from a script instead of calling an API.
+
+    Attributes:
+        sql_rules (list): (keyword, sql) pairs; the first keyword found in the
+            question picks the query, the last rule is the default.
+        replay (list): Recorded responses returned in order instead of the script.
+        latency (float): Seconds slept per call to stand in for network time.
+    """
+
+    sql_rules: List[Any] = []
+    replay: Optional[List[str]] = None
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def _pick_sql(self, question):
+        question = question.lower()
+        for keyword, sql in self.sql_rules:
+            if keyword in question:
+                return sql
+        return self.sql_rules[-1][1]
+
+    def _respond(self, prompt):
+        if self.replay is not None:
+            return self.replay[(self.calls - 1) % len(self.replay)]
+
+        if "write python code" in prompt:
+            return PLOT_CODE
+
+        question = prompt[prompt.rfind("Question:") + len("Question:"):].split("\n", 1)[0].strip()
+        if prompt.rstrip().endswith("SQL query:"):
+            return self._pick_sql(question)
+
+        # ReAct agent: each tool call appears in the scratchpad once it has run
+        steps = prompt[prompt.rfind("Question:"):]
+        if "Example SQL:" in prompt and "Action:" not in steps:
+            return (
+                "Thought: A verified example asks the same thing; I can adapt its query.\n"
+                f"Action: sql_db_query\nAction Input: {self._pick_sql(question)}"
+            )
+        observation = prompt[prompt.rfind("Observation:") + len("Observation:"):].strip()
+        if "Action: sql_db_query\n" in prompt:
+            return f"Thought: I now know the final answer\nFinal Answer: {observation}"
+        if "Action: sql_db_schema\n" in prompt:
+            return (
+                "Thought: I can query the relevant tables.\n"
+                f"Action: sql_db_query\nAction Input: {self._pick_sql(question)}"
+            )
+        if "Action: sql_db_list_tables\n" in prompt:
+            tables = [t.strip() for t in observation.split("\n", 1)[0].split(",") if t.strip()]
+            sql = self._pick_sql(question)
+            wanted = [t for t in tables if re.search(rf"\b{re.escape(t)}\b", sql)] or tables[:1]
+            return (
+                "Thought: I should look at the schema of the relevant tables.\n"
+                f"Action: sql_db_schema\nAction Input: {', '.join(wanted)}"
+            )
+        return "Thought: I should look at the tables in the database.\nAction: sql_db_list_tables\nAction Input: "
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self._respond(prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def scripted_chat_openai(sql_rules, replay_path=None, latency=0.0, models=None):
+    """
+    Build a drop-in replacement for the ChatOpenAI class.
+
+    The returned factory accepts ChatOpenAI's keyword arguments, keeps the
+    callbacks and the model name and ignores the rest, so it can be patched
+    over `llm_agent.ChatOpenAI` without touching the agent code.
+
+    Args:
+        models (dict): Model name -> {"sql_rules": ..., "latency": ...}
+            overriding the defaults for that model.
+    """
+    replay = None
+    if replay_path:
+        with open(replay_path) as f:
+            replay = json.load(f)
+
+    def factory(**kwargs):
+        model = (models or {}).get(kwargs.get("model") or kwargs.get("model_name"), {})
+        return ScriptedChatModel(
+            sql_rules=model.get("sql_rules", sql_rules),
+            replay=replay,
+            latency=model.get("latency", latency),
+            callbacks=kwargs.get("callbacks"),
+        )
+
+    return factory
@@ -0,0 +1,97 @@
+"""
+Generated SQLite fixture database for the offline benchmarks.
+
+The core schema (customers, products, orders, order_items) answers the
+benchmark questions; `extra_tables` filler tables widen the catalog so schema
+reflection and table selection can be measured at different sizes.
+"""
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+STATUSES = ("new", "paid", "shipped", "delivered", "returned")
+COUNTRIES = ("France", "Germany", "India", "Japan", "Spain", "United States")
+
+# Keyword -> query rules for the scripted LLM; the last rule is the default.
+SQL_RULES = [
+    ("status", "SELECT status, COUNT(*) AS orders FROM orders GROUP BY status ORDER BY orders DESC"),
+    ("month", "SELECT strftime('%Y-%m', created_at) AS month, SUM(total) AS revenue "
+              "FROM orders GROUP BY month ORDER BY month"),
+    ("country", "SELECT c.country, COUNT(*) AS orders FROM orders o "
+                "JOIN customers c ON c.id = o.customer_id GROUP BY c.country"),
+    ("product", "SELECT p.name, SUM(i.quantity) AS units FROM order_items i "
+                "JOIN products p ON p.id = i.product_id GROUP BY p.name ORDER BY units DESC LIMIT 10"),
+    ("", "SELECT COUNT(*) AS orders FROM orders"),
+]
+
+
+def create_fixture(path, rows=10000, extra_tables=20, seed=0):
+    """
+    Create (or replace) the fixture database.
+
+    Args:
+        path (str): SQLite file to write.
+        rows (int): Number of orders; customers, products and order items scale with it.
+        extra_tables (int): Number of filler tables added to the schema.
+        seed (int): Random seed, so every run builds the same data.
+    Returns:
+        str: The database path.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    customers = max(rows // 10, 1)
+    products = max(rows // 100, 5)
+    start = datetime(2023, 1, 1)
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, email TEXT, country TEXT
+        );
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY, name TEXT, category TEXT, price NUMERIC
+        );
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id),
+            status TEXT, total NUMERIC, created_at TIMESTAMP
+        );
+        CREATE TABLE order_items (
+            id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders(id),
+            product_id INTEGER REFERENCES products(id), quantity INTEGER
+        );
+    """)
+    conn.executemany(
+        "INSERT INTO customers VALUES (?, ?, ?, ?, ?)",
+        [(i, f"first{i}", f"last{i}", f"user{i}@example.com", rng.choice(COUNTRIES))
+         for i in range(1, customers + 1)],
+    )
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?, ?, ?)",
+        [(i, f"product {i}", f"category {i % 8}", round(rng.uniform(2, 200), 2))
+         for i in range(1, products + 1)],
+    )
+    conn.executemany(
+        "INSERT INTO orders VALUES (?, ?, ?, ?, ?)",
+        [(i, rng.randint(1, customers), rng.choice(STATUSES), round(rng.uniform(5, 500), 2),
+          (start + timedelta(minutes=rng.randint(0, 60 * 24 * 730))).isoformat(sep=" "))
+         for i in range(1, rows + 1)],
+    )
+    conn.executemany(
+        "INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)",
+        [(rng.randint(1, rows), rng.randint(1, products), rng.randint(1, 5)) for _ in range(rows * 2)],
+    )
+    for t in range(extra_tables):
+        conn.execute(
+            f"CREATE TABLE audit_log_{t:03d} (id INTEGER PRIMARY KEY, "
+            f"customer_id INTEGER REFERENCES customers(id), event TEXT, payload TEXT, logged_at TIMESTAMP)"
+        )
+        conn.executemany(
+            f"INSERT INTO audit_log_{t:03d} (customer_id, event, payload, logged_at) VALUES (?, ?, ?, ?)",
+            [(rng.randint(1, customers), f"event{rng.randint(0, 9)}", "{}", start.isoformat(sep=" "))
+             for _ in range(50)],
+        )
+    conn.commit()
+    conn.close()
+    return path
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import unidecode
+from constants import (
+    ANSWER_CACHE_BACKEND,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+
+
+def normalize_prompt(prompt):
+    """
+    Fold a question into the form used for cache lookups.
+
+    Args:
+        prompt (str): The raw user question.
+    Returns:
+        str: The question transliterated to ASCII, lower-cased and with runs of
+            whitespace collapsed to a single space.
+    """
+    folded = unidecode.unidecode(prompt).casefold()
+    return re.sub(r"\s+", " ", folded).strip()
+
+
+def make_cache_key(code_type, prompt, database, fingerprint):
+    """Build the cache key for a question against a given database schema."""
+    raw = "\x1f".join([code_type, database or '', fingerprint or '', normalize_prompt(prompt)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class InMemoryBackend:
+    """LRU store kept in process memory."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, created_at):
+        """Store an entry and return the number of entries evicted to make room."""
+        with self._lock:
+            self._entries[key] = (value, created_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """LRU store persisted in a local SQLite file, shared by every process on the host."""
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE answers SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return json.loads(row[0]), row[1]
+
+    def set(self, key, value, created_at):
+        """Store an entry and return the number of entries evicted to make room."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), created_at, time.time()),
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                "SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._conn.commit()
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+class AnswerCache:
+    """
+    Answer cache with LRU eviction (done by the backend) and TTL expiry.
+
+    Args:
+        backend: An InMemoryBackend, SQLiteBackend or any object with the same
+            get/set/delete interface.
+        ttl_seconds (float): Age after which a cached answer is discarded.
+    """
+
+    def __init__(self, backend, ttl_seconds):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached answer for key, or None on a miss."""
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if time.time() - created_at <= self.ttl_seconds:
+                self.hits += 1
+                return value
+            self.backend.delete(key)
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Store a JSON-serialisable answer under key."""
+        self.evictions += self.backend.set(key, value, time.time())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache configured in constants."""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                if ANSWER_CACHE_BACKEND == "sqlite":
+                    backend = SQLiteBackend(ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_ENTRIES)
+                else:
+                    backend = InMemoryBackend(ANSWER_CACHE_MAX_ENTRIES)
+                _answer_cache = AnswerCache(backend, ANSWER_CACHE_TTL_SECONDS)
+    return _answer_cache
@@ -0,0 +1,445 @@
+"""
+Async HTTP API for the text-to-SQL pipeline.
+
+Answers questions with the same pipeline as the Streamlit app, sharing its
+connection pools, agents and caches across requests. Each database admits a
+bounded number of concurrent questions with a bounded queue in front; a
+request whose client disconnects has its agent run and running queries
+cancelled. The OpenAI key is read from .streamlit/secrets.toml like the app.
+
+Endpoints:
+    POST /v1/query    {"database": ..., "question": ..., "session_id": ..., "mode": "auto"}
+    GET  /v1/health
+    GET  /metrics     Prometheus text format
+
+Usage:
+    TEXT_TO_SQL_DB_PASSWORD=... python src/api.py --db-user reader --db-host localhost
+        [--databases sales,hr] [--host 127.0.0.1] [--port 8080]
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from langchain_core.callbacks import BaseCallbackHandler
+from constants import (
+    API_HOST,
+    API_MAX_CONCURRENT_PER_DATABASE,
+    API_MAX_QUEUED_PER_DATABASE,
+    API_MAX_RESULT_ROWS,
+    API_MAX_SESSIONS,
+    API_PORT,
+    API_QUEUE_TIMEOUT_SECONDS,
+    API_WORKER_THREADS,
+)
+import pipeline
+from figure_cache import figure_from_code
+from helper import display_code_plots
+from history_store import get_history_store
+from intent_router import route_intent, schema_vocabulary
+from llm_agent import initialize_sql_agent
+from pipeline import RequestCancelled
+from plot_sandbox import get_plot_sandbox
+from result_set import collect_results
+from schema_snapshot import get_schema_snapshot
+from sql_guard import cancel_queries, query_owner
+from tracing import prometheus_text, register_stats, span, trace_request
+
+PASSWORD_ENV = "TEXT_TO_SQL_DB_PASSWORD"
+MODES = ("auto", "sql", "python")
+
+
+def _error(status, message, **headers):
+    """An aiohttp HTTP exception with a JSON body."""
+    return status(text=json.dumps({"error": message}), content_type="application/json", headers=headers)
+
+
+class NoPlotCode(Exception):
+    """The python agent answered a plot request without a code block; carries its reply."""
+
+
+class CancellationHandler(BaseCallbackHandler):
+    """Stops an agent run at its next LLM or tool call once the caller has gone."""
+
+    raise_error = True
+
+    def __init__(self, cancelled):
+        self.cancelled = cancelled
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise RequestCancelled("client disconnected")
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._check()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._check()
+
+
+class Session:
+    """
+    One API conversation: the attributes pipeline.generate_response reads
+    from Streamlit's session state in the app.
+
+    The SQL agent is built on first use, in a worker thread. Requests in the
+    same conversation are answered one at a time, holding `lock`.
+    """
+
+    def __init__(self, db_config, session_id):
+        self.db_config = db_config
+        self.session_id = session_id
+        self.sql_agent = None
+        self.python_agent = None
+        self.schema_fingerprint = None
+        self.lock = asyncio.Lock()
+
+    def ensure_agent(self):
+        if self.sql_agent is None:
+            with span("initialize_sql_agent"):
+                self.sql_agent = initialize_sql_agent(self.db_config, session_id=self.session_id)
+            with span("schema_snapshot"):
+                self.schema_fingerprint = get_schema_snapshot(self.db_config).fingerprint
+
+
+class DatabaseLimiter:
+    """
+    Bounded concurrency for one database with a bounded, timed queue in front.
+
+    Args:
+        max_concurrent (int): Questions answered at the same time.
+        max_queued (int): Requests allowed to wait for a slot; more are rejected.
+        queue_timeout (float): Seconds a request may wait before it is rejected.
+    """
+
+    def __init__(self, max_concurrent, max_queued, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.queued_seconds = 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, lock=None):
+        """
+        Hold one of the database's slots.
+
+        Args:
+            lock (asyncio.Lock): Taken before the slot and held with it, e.g.
+                the conversation's lock. Waiting for it counts as queueing:
+                against max_queued and within the same queue_timeout.
+        Yields:
+            float: Seconds spent waiting for the lock and the slot.
+        Raises:
+            HTTPServiceUnavailable: If the queue is full or the wait timed out.
+        """
+        # Counted here rather than read off the semaphore, whose acquire only
+        # runs once wait_for's task is scheduled
+        if self.running + self.waiting >= self.max_concurrent + self.max_queued:
+            self.rejected += 1
+            raise _error(web.HTTPServiceUnavailable, "too many queued requests", **{"Retry-After": "1"})
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._acquire(lock), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            raise _error(web.HTTPServiceUnavailable, "timed out waiting for a free slot", **{"Retry-After": "1"})
+        finally:
+            self.waiting -= 1
+        queued_seconds = time.perf_counter() - start
+        self.queued_seconds += queued_seconds
+        self.running += 1
+        try:
+            yield queued_seconds
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+            if lock is not None:
+                lock.release()
+
+    async def _acquire(self, lock):
+        if lock is None:
+            await self._semaphore.acquire()
+            return
+        # The lock is waited for first, so a conversation's own earlier
+        # request does not keep a database slot idle
+        await lock.acquire()
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            lock.release()
+            raise
+
+
+class Service:
+    """
+    Shared state of the API: database configs, limiters, sessions and workers.
+
+    Args:
+        server_config (dict): Connection config without DATABASE (DRIVER,
+            USER, PASSWORD, HOST, PORT), as built by the app's sidebar.
+        databases (list): Databases that may be queried; None allows any the
+            user can reach. Required for SQLite, where names are file paths.
+        workers (int): Threads running the synchronous pipeline.
+        max_concurrent (int): Concurrent questions per database.
+        max_queued (int): Queued requests per database.
+        queue_timeout (float): Seconds a request may wait for a slot.
+        max_sessions (int): Conversations kept; the least recently used go first.
+    """
+
+    def __init__(self, server_config, databases=None, workers=API_WORKER_THREADS,
+                 max_concurrent=API_MAX_CONCURRENT_PER_DATABASE, max_queued=API_MAX_QUEUED_PER_DATABASE,
+                 queue_timeout=API_QUEUE_TIMEOUT_SECONDS, max_sessions=API_MAX_SESSIONS):
+        self.server_config = server_config
+        self.databases = set(databases) if databases else None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_sessions = max_sessions
+        self._limiters = {}
+        self._sessions = OrderedDict()
+        self._stats = {'requests': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+
+    def db_config(self, database):
+        """Connection config for a database, or None if it may not be queried."""
+        if self.databases is not None and database not in self.databases:
+            return None
+        return dict(self.server_config, DATABASE=database)
+
+    def limiter(self, database):
+        limiter = self._limiters.get(database)
+        if limiter is None:
+            limiter = self._limiters[database] = DatabaseLimiter(
+                self.max_concurrent, self.max_queued, self.queue_timeout
+            )
+        return limiter
+
+    def session(self, db_config, session_id):
+        """The conversation for a session id; a throwaway one when there is none."""
+        if not session_id:
+            return Session(db_config, uuid.uuid4().hex)
+        key = (db_config['DATABASE'], session_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = Session(db_config, session_id)
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                get_history_store().forget(evicted.session_id)
+        self._sessions.move_to_end(key)
+        return session
+
+    def count(self, **increments):
+        for key, value in increments.items():
+            self._stats[key] += value
+
+    async def run(self, fn, request_id):
+        """
+        Run fn(cancelled) on a worker thread in a copy of the current context.
+
+        If the awaiting request is cancelled (its client disconnected), the
+        worker is told to stop and the request's queries are cancelled; the
+        caller keeps its database slot until the worker has returned.
+        """
+        cancelled = threading.Event()
+        context = contextvars.copy_context()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, cancelled)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancelled.set()
+            cancel_queries(request_id)
+            self.count(cancelled=1)
+            with contextlib.suppress(Exception):
+                await future
+            raise
+
+    def stats(self):
+        stats = dict(self._stats)
+        limiters = list(self._limiters.values())
+        for key in ('running', 'waiting', 'rejected', 'queue_timeouts'):
+            stats[key] = sum(getattr(limiter, key) for limiter in limiters)
+        stats['queued_seconds'] = round(sum(limiter.queued_seconds for limiter in limiters), 3)
+        stats['sessions'] = len(self._sessions)
+        return stats
+
+
+def _result_payload(result):
+    frame = result.frame.head(API_MAX_RESULT_ROWS)
+    split = json.loads(frame.to_json(orient="split", index=False, date_format="iso"))
+    return {
+        'columns': split['columns'],
+        'rows': split['data'],
+        'row_count': result.row_count,
+        'truncated': result.truncated or result.row_count > len(frame),
+        'cached': result.cached,
+    }
+
+
+def answer(session, question, mode, request_id, cancelled):
+    """
+    Answer one question the way the app's chat input does; runs on a worker thread.
+
+    Returns:
+        dict: The response body.
+    Raises:
+        NoPlotCode: If a plot request was answered without plot code.
+    """
+    if mode == "auto":
+        intent, confidence = route_intent(question, vocabulary=schema_vocabulary(get_schema_snapshot(session.db_config)))
+    else:
+        intent, confidence = ("viz" if mode == "python" else "sql"), 1.0
+    body = {'intent': intent, 'session_id': session.session_id}
+    kind = {"viz": "python"}.get(intent, intent)
+    with trace_request(kind, session_id=session.session_id, request_id=request_id, confidence=round(confidence, 3)):
+        if intent in ("chitchat", "schema"):
+            with span("answer_locally"):
+                body['answer'] = pipeline.answer_locally(session, intent, question)
+            return body
+
+        session.ensure_agent()
+        callbacks = [CancellationHandler(cancelled)]
+        with query_owner(request_id, cancelled.is_set):
+            if intent == "viz":
+                response = pipeline.generate_response(session, "python", question, callbacks=callbacks, question=question)
+                if not isinstance(response, dict):
+                    body['answer'] = response
+                elif response.get("figure"):
+                    body['figure'] = json.loads(response["figure"])
+                else:
+                    code = display_code_plots(response['output'])
+                    if code is None:
+                        raise NoPlotCode(response['output'])
+                    with span("plot_exec"):
+                        body['figure'] = json.loads(figure_from_code(code))
+                return body
+
+            with collect_results() as results:
+                body['answer'] = pipeline.generate_response(session, "sql", question, callbacks=callbacks, question=question)
+            if results:
+                body['sql'] = results[-1].sql
+                body['result'] = _result_payload(results[-1])
+            return body
+
+
+async def handle_query(request):
+    service = request.app['service']
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise _error(web.HTTPBadRequest, "body must be JSON")
+    if not isinstance(payload, dict):
+        raise _error(web.HTTPBadRequest, "body must be a JSON object")
+    question = payload.get('question')
+    database = payload.get('database')
+    mode = payload.get('mode', "auto")
+    if not isinstance(question, str) or not question.strip():
+        raise _error(web.HTTPBadRequest, "question is required")
+    if not isinstance(database, str) or not database:
+        raise _error(web.HTTPBadRequest, "database is required")
+    if mode not in MODES:
+        raise _error(web.HTTPBadRequest, f"mode must be one of {', '.join(MODES)}")
+    db_config = service.db_config(database)
+    if db_config is None:
+        raise _error(web.HTTPNotFound, f"unknown database: {database}")
+
+    service.count(requests=1)
+    request_id = uuid.uuid4().hex
+    session = service.session(db_config, payload.get('session_id'))
+    # Waiting for the conversation's earlier request counts against the queue too
+    async with service.limiter(database).slot(session.lock) as queued_seconds:
+        try:
+            body = await service.run(
+                lambda cancelled: answer(session, question.strip(), mode, request_id, cancelled), request_id
+            )
+        except NoPlotCode as e:
+            service.count(failed=1)
+            raise _error(web.HTTPUnprocessableEntity, str(e))
+        except Exception as e:
+            service.count(failed=1)
+            raise _error(web.HTTPInternalServerError, f"{type(e).__name__}: {e}")
+    service.count(completed=1)
+    body['queued_seconds'] = round(queued_seconds, 4)
+    return web.json_response(body)
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok", **request.app['service'].stats()})
+
+
+async def handle_metrics(request):
+    return web.Response(text=prometheus_text(), content_type="text/plain", charset="utf-8")
+
+
+async def _shutdown(app):
+    app['service'].executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(service):
+    """
+    Build the aiohttp application for a service.
+
+    Run it with handler_cancellation=True so that a client disconnect
+    cancels its request.
+    """
+    pipeline.register_component_stats()
+    register_stats("api", service.stats)
+    # Plot workers start importing pandas and plotly now, not on the first plot request
+    get_plot_sandbox()
+    app = web.Application()
+    app['service'] = service
+    app.router.add_post("/v1/query", handle_query)
+    app.router.add_get("/v1/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_cleanup.append(_shutdown)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async HTTP API for the text-to-SQL pipeline.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--db-driver", default="mysql+pymysql")
+    parser.add_argument("--db-host", default="localhost")
+    parser.add_argument("--db-port", default="3306")
+    parser.add_argument("--db-user", default="")
+    parser.add_argument("--databases", help="comma-separated databases that may be queried (default: any)")
+    parser.add_argument("--workers", type=int, default=API_WORKER_THREADS)
+    parser.add_argument("--max-concurrent", type=int, default=API_MAX_CONCURRENT_PER_DATABASE,
+                        help="concurrent questions per database")
+    parser.add_argument("--max-queued", type=int, default=API_MAX_QUEUED_PER_DATABASE,
+                        help="queued requests per database before returning 503")
+    args = parser.parse_args()
+
+    databases = [d.strip() for d in args.databases.split(",") if d.strip()] if args.databases else None
+    if args.db_driver.startswith("sqlite") and not databases:
+        parser.error("--databases is required for SQLite, whose database names are file paths")
+    server_config = {
+        'DRIVER': args.db_driver,
+        'USER': args.db_user,
+        'PASSWORD': os.environ.get(PASSWORD_ENV, ""),
+        'HOST': args.db_host,
+        'PORT': args.db_port,
+    }
+    service = Service(server_config, databases, workers=args.workers,
+                      max_concurrent=args.max_concurrent, max_queued=args.max_queued)
+    web.run_app(create_app(service), host=args.host, port=args.port, handler_cancellation=True)
+
+
+if __name__ == "__main__":
+    main()
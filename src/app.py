@@ -2,21 +2,34 @@ import os
 import sys
 import warnings
 import streamlit as st
-import unidecode
-import mysql.connector
-from mysql.connector import Error
-from langchain_community.utilities import SQLDatabase
-import urllib.parse
-from helper import display_code_plots, display_text_with_images
-from llm_agent import initialize_python_agent, initialize_sql_agent
-from constants import LLM_MODEL_NAME
-from sqlalchemy import create_engine, exc, text
-import pymysql
-import time
+from helper import display_code_plots, display_result_table, display_text_with_images
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import uuid
+
+# The agent, database and plotting stacks (LangChain, SQLAlchemy, pandas,
+# plotly) take over a second to import. They are imported where they are first
+# needed, once a database is selected or a question arrives, so the first page
+# paints without them. Python caches the modules, so later imports are free.
 
 OPENAI_API_KEY = st.secrets["openai"]["OPENAI_API_KEY"]
 st.set_page_config(page_title="SQL and Python Agent")
 
+
+def run_abandoned(ctx):
+    """
+    Build a check for whether a script run has been abandoned.
+
+    Streamlit only stops a run at its next element call, so a query blocked
+    in the database would keep running after the user pressed Stop or sent a
+    new message. The SQL guard polls this check to cancel such queries.
+    """
+    def check():
+        # No public API exposes pending stop/rerun requests of a running script
+        requests = getattr(ctx, "script_requests", None)
+        state = getattr(requests, "_state", None)
+        return state is not None and state.name != "CONTINUE"
+    return check
+
 # 1. Initialize session state.
 if "db_config" not in st.session_state:
     st.session_state.db_config = {
@@ -33,6 +46,10 @@ if "db_connected" not in st.session_state:
 if 'databases' not in st.session_state:
     st.session_state.databases = []
 
+# Each browser session keeps its own conversation history
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # 2. Sidebar user inputs.
 st.sidebar.title("DATABASE CONFIGURATION")
 st.sidebar.subheader("Enter MySQL connection details:", divider=True)
@@ -47,38 +64,18 @@ button_label = "Save and Connect" if not st.session_state.db_connected else "Upd
 
 def test_connection(config):
     """Check DB connectivity and, if successful, fetch all databases."""
+    from db_pool import get_engine
+    from sqlalchemy import text
     try:
-        connection_string = (
-            f"mysql+pymysql://{config['USER']}:{urllib.parse.quote_plus(config['PASSWORD'])}"
-            f"@{config['HOST']}:{config['PORT']}/"
-        )
-        engine = create_engine(connection_string)
+        # Server-level engine from the shared registry; reused for catalog lookups.
+        engine = get_engine(config, database='')
         with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-
-        # If we succeed, fetch list of databases for the dropdown
-        try:
-            connection = mysql.connector.connect(
-                host=config['HOST'],
-                user=config['USER'],
-                password=config['PASSWORD'],
-                port=config['PORT']
-            )
-            if connection.is_connected():
-                cursor = connection.cursor()
-                cursor.execute("SHOW DATABASES")
-                dbs = [db[0] for db in cursor.fetchall() 
-                       if db[0] not in ('sys', 'mysql','performance_schema','information_schema')]
-                cursor.close()
-                connection.close()
-                return True, dbs
-        except Error as e:
-            st.sidebar.error(f"Error fetching databases: {e}")
-            return False, []
+            dbs = [row[0] for row in conn.execute(text("SHOW DATABASES"))
+                   if row[0] not in ('sys', 'mysql', 'performance_schema', 'information_schema')]
+        return True, dbs
     except Exception as e:
         st.sidebar.error(f"Connection test failed: {str(e)}")
         return False, []
-    return False, []
 
 # 4. Single button to connect/update.
 if st.sidebar.button(button_label):
@@ -116,14 +113,80 @@ if st.session_state.db_connected and st.session_state.databases:
     if db_choice and db_choice != st.session_state.db_config['DATABASE']:
         # Update the config to the selected DB
         st.session_state.db_config['DATABASE'] = db_choice
+        from llm_agent import initialize_sql_agent
+        from pipeline import register_component_stats
+        from plot_sandbox import get_plot_sandbox
+        from schema_snapshot import get_schema_snapshot
+        from table_index import get_table_index
+        from tracing import span, trace_request
+        register_component_stats()
         try:
-            st.session_state.sql_agent = initialize_sql_agent(st.session_state.db_config)
-            st.session_state.python_agent = initialize_python_agent()
+            # The python agent is built on the first plot request
+            with trace_request("agent_init", database=db_choice):
+                with span("initialize_sql_agent"):
+                    st.session_state.sql_agent = initialize_sql_agent(st.session_state.db_config, session_id=st.session_state.session_id)
+                with span("schema_snapshot"):
+                    st.session_state.schema_fingerprint = get_schema_snapshot(st.session_state.db_config).fingerprint
+                with span("table_index"):
+                    get_table_index(st.session_state.db_config)
+                # Plot workers import pandas and plotly in the background, ready for the first plot
+                get_plot_sandbox()
             st.sidebar.success(f"Connected to {db_choice}!")
         except Exception as e:
             st.session_state.db_config['DATABASE'] = ''
             st.sidebar.error(f"Connection to {db_choice} failed: {str(e)}")
 
+if st.session_state.db_connected:
+    from db_pool import pool_stats
+    from resilience import resilience_stats
+    with st.sidebar.expander("Connection pool"):
+        st.dataframe(pool_stats(), hide_index=True)
+        st.json(resilience_stats())
+
+if st.session_state.db_connected and st.session_state.db_config['DATABASE']:
+    from answer_cache import get_answer_cache
+    from chart_aggregation import chart_aggregation_stats
+    from example_store import get_example_store
+    from figure_cache import figure_cache_stats
+    from history_store import get_history_store
+    from intent_router import router_stats
+    from llm_agent import agent_mode_stats, model_tier_stats
+    from memory import prompt_token_stats
+    from plot_sandbox import plot_sandbox_stats
+    from query_cache import query_cache_stats
+    from result_set import observation_stats
+    from schema_snapshot import get_schema_snapshot
+    from sql_guard import guard_stats
+    from streaming import ttft_stats
+    from tracing import recent_requests
+    with st.sidebar.expander("Answer cache"):
+        st.json(get_answer_cache().stats())
+    with st.sidebar.expander("Query cache"):
+        st.json(query_cache_stats())
+    with st.sidebar.expander("Agent modes"):
+        st.json({
+            **agent_mode_stats(),
+            'time_to_first_token': ttft_stats(),
+            'prompt_tokens': prompt_token_stats(),
+            'chat_history': get_history_store().stats(),
+            'figure_cache': figure_cache_stats(),
+            'sql_guard': guard_stats(),
+            'intent_router': router_stats(),
+            'example_store': get_example_store().stats(),
+            'plot_sandbox': plot_sandbox_stats(),
+            'agent_observations': observation_stats(),
+            'chart_aggregation': chart_aggregation_stats(),
+            'model_tiers': model_tier_stats(),
+        })
+    with st.sidebar.expander("Recent requests"):
+        requests = recent_requests()
+        if requests:
+            st.dataframe(requests, hide_index=True)
+        else:
+            st.caption("No requests yet.")
+    with st.sidebar.expander("Schema snapshot"):
+        st.json(get_schema_snapshot(st.session_state.db_config).stats)
+
 # Main page
 st.title("SQL and Python Agent")
 st.write("This agent can help you with SQL queries and Python code for data analysis. Configure your MySQL database connection using the sidebar.")
@@ -137,68 +200,30 @@ else:
     st.warning("Not connected. Provide credentials and click the button in the sidebar.")
 
 # Initialize all session state variables
-if 'db_connection' not in st.session_state:
-    st.session_state.db_connection = None
-if 'agent_memory_sql' not in st.session_state:
-    st.session_state.agent_memory_sql = None
-if 'agent_memory_python' not in st.session_state:
-    st.session_state.agent_memory_python = None
 if 'connection_tested' not in st.session_state:
     st.session_state.connection_tested = False
 
-# Add connection management functions
-def create_db_connection(config):
-    """Create and return database connection"""
-    try:
-        connection_string = (
-            f"mysql+pymysql://{config['USER']}:{config['PASSWORD']}@"
-            f"{config['HOST']}:{config['PORT']}/{config['DATABASE']}"
-        )
-        engine = create_engine(connection_string, pool_pre_ping=True)
-        db = SQLDatabase.from_uri(connection_string)
-        return db
-    except Exception as e:
-        st.sidebar.error(f"Failed to create connection: {str(e)}")
-        return None
-
-def verify_connection():
-    """Verify database connection is active"""
+def execute_query(query):
+    """
+    Execute a query and return a typed QueryResult, or None on failure.
+
+    Connection health is left to the pool (pre-ping and recycle); transient
+    errors are retried with backoff behind the database's circuit breaker.
+    """
+    from db_pool import get_engine
+    from result_set import fetch_result
+    from sqlalchemy import exc
+    from tracing import record_error, span
     if not st.session_state.get('db_config'):
         st.error("Database configuration not found")
-        return False
-    
-    if not st.session_state.get('db_connection'):
-        st.error("No active database connection")
-        return False
-        
+        return None
     try:
-        # Test connection with a simple query
-        st.session_state.db_connection.run("SELECT 1")
-        return True
-    except:
-        # Try to reconnect
-        st.session_state.db_connection = create_db_connection(st.session_state.db_config)
-        return st.session_state.db_connection is not None
-
-def execute_query(query):
-    """Execute query with connection verification"""
-    max_retries = 3
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        if verify_connection():
-            try:
-                result = st.session_state.db_connection.run(query)
-                return result
-            except exc.SQLAlchemyError as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    st.error(f"Query failed after {max_retries} attempts: {str(e)}")
-                    return None
-                time.sleep(1)  # Wait before retry
-        else:
-            st.error("Connection verification failed")
-            return None
+        with span("execute_query"):
+            return fetch_result(get_engine(st.session_state.db_config), query)
+    except exc.SQLAlchemyError as e:
+        record_error(e)
+        st.error(f"Query failed: {str(e)}")
+        return None
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -216,82 +241,70 @@ os.environ['OPENAI_API_KEY'] = OPENAI_API_KEY
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
-# Initialize agents only after credentials are available
-if 'db_config' in st.session_state:
-    if 'agent_memory_sql' not in st.session_state:
-        st.session_state.agent_memory_sql = initialize_sql_agent(st.session_state.db_config)
-    if 'agent_memory_python' not in st.session_state:
-        st.session_state.agent_memory_python = initialize_python_agent()
-    
-    if 'sql_agent' not in st.session_state:
-        st.session_state.sql_agent = st.session_state.agent_memory_sql
-    if 'python_agent' not in st.session_state:
-        st.session_state.python_agent = st.session_state.agent_memory_python
-else:
-    st.warning("Please configure database credentials first")
+# Agents are built when a database is selected (SQL) or a plot is first requested (python)
+if 'sql_agent' not in st.session_state:
+    st.session_state.sql_agent = None
+if 'python_agent' not in st.session_state:
+    st.session_state.python_agent = None
 
 
-def generate_response(code_type, input_text):
-    """Generate responses for both general and database-specific queries"""
-    
-    # General greetings and help messages
-    greetings = ['hello', 'hi', 'hey', 'help', 'what can you do']
-    if input_text.lower() in greetings:
-        return """Hello! I am a SQL and Python agent designed to help you with:
-            1. SQL queries and database analysis
-            2. Python data visualization
-            3. General database questions
-
-            To get started with database operations, please configure your database connection in the sidebar.
-            You can also ask me general questions about SQL, Python, or data analysis!
-        """
-    
+def generate_response(code_type, input_text, callbacks=None, question=None):
+    """
+    Generate responses for both general and database-specific queries.
+
+    Args:
+        code_type (str): "sql" for a text answer, "python" for plot code.
+        input_text (str): The user question, with any previous context appended.
+        callbacks (list): LangChain callback handlers, e.g. for streaming into the chat.
+        question (str): The user question without previous context, used to
+            retrieve verified examples. Defaults to input_text.
+    """
     # Check if database is configured
     if not st.session_state.get('sql_agent'):
         return "Please configure and connect to a database using the sidebar before running queries."
 
-    # Sanitize input
-    local_prompt = unidecode.unidecode(input_text)
-    
-    if code_type == "python":
-        try:
-            # First get SQL query result
-            sql_response = st.session_state.sql_agent.invoke({"input": local_prompt})
-            if not sql_response or 'output' not in sql_response:
-                return "Failed to get SQL query results"
-                
-            local_response = sql_response['output']
-            print("SQL Response->", local_response)
-            
-            # Check for invalid/error responses
-            exclusion_keywords = ["please provide", "don't know", "more context", 
-                                "provide more", "vague request", "no results"]
-            if any(keyword in local_response.lower() for keyword in exclusion_keywords):
-                return "Unable to generate visualization - no valid data returned from query"
-            
-            # Generate visualization
-            viz_prompt = {"input": "Write code in python to plot the following data\n\n" + local_response}
-            return st.session_state.python_agent.invoke(viz_prompt)
-            
-        except Exception as e:
-            print(f"Error generating response: {str(e)}")
-            return "Failed to generate visualization"
-            
-    else:  # SQL query
-        try:
-            return st.session_state.sql_agent.run(local_prompt)
-        except Exception as e:
-            print(f"SQL query error: {str(e)}")
-            return """Failed to execute SQL query. Ensure you have enough OpenAI API credits. This is most likely to be the issue."""
+    import pipeline
+    return pipeline.generate_response(st.session_state, code_type, input_text, callbacks=callbacks, question=question)
+
+
+def answer_locally(intent, question):
+    """Answer small talk from templates and schema questions from the cached snapshot."""
+    import pipeline
+    return pipeline.answer_locally(st.session_state, intent, question)
+
+
+def mark_correct(index):
+    """Store a SQL answer's question and query as a verified example."""
+    from example_store import database_key, get_example_store
+    message = st.session_state.messages[index]
+    get_example_store().add(database_key(st.session_state.db_config), message["question"], message["sql"])
+    message["verified"] = True
+
+
+def verification_control(index, message):
+    """Offer to mark a SQL answer as correct, or show that it has been."""
+    if not message.get("sql"):
+        return
+    if message.get("verified"):
+        st.caption("✓ Verified")
+    else:
+        st.button("Mark as correct", key=f"verify-{index}", on_click=mark_correct, args=(index,))
 
 
 def reset_conversation():
     st.session_state.messages = []
-    if 'db_config' in st.session_state:
-        st.session_state.agent_memory_sql = initialize_sql_agent(st.session_state.db_config)
-        st.session_state.agent_memory_python = initialize_python_agent()
-        st.session_state.sql_agent = st.session_state.agent_memory_sql
-        st.session_state.python_agent = st.session_state.agent_memory_python
+    # The old conversation is over; its history stays on disk only
+    from history_store import get_history_store
+    from result_set import get_result_store
+    get_history_store().forget(st.session_state.session_id)
+    get_result_store().forget(st.session_state.session_id)
+    st.session_state.session_id = uuid.uuid4().hex
+    # The agents are kept; only the SQL agent's conversation memory is replaced
+    if st.session_state.get('sql_agent') is not None:
+        from llm_agent import start_new_conversation
+        from tracing import span, trace_request
+        with trace_request("agent_reset"), span("start_new_conversation"):
+            st.session_state.sql_agent = start_new_conversation(st.session_state.sql_agent, st.session_state.session_id)
     else:
         st.warning("Please configure database credentials first")
 
@@ -300,48 +313,92 @@ with col2:
     st.button("Reset Chat", on_click=reset_conversation)
 
 # Display chat messages from history
-for message in st.session_state.messages:
+for index, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         if message["role"] in ("assistant", "error"):
             display_text_with_images(message["content"])
+            if message.get("result"):
+                from result_set import get_result_store
+                result = get_result_store().get(message["result"], st.session_state.session_id)
+                if result is not None:
+                    display_result_table(result)
+                else:
+                    st.caption("Result expired: ask the question again to see the full table.")
+            verification_control(index, message)
         elif message["role"] == "plot":
-            exec(message["content"])
+            # Rendered from the cached figure; plot code is never re-run on reruns
+            from figure_cache import load_figure
+            st.plotly_chart(load_figure(message["figure"]), theme='streamlit', use_container_width=True)
         else:
             st.markdown(message["content"])
 
 # Accept user input
 if prompt := st.chat_input("Please ask your question:"):
+    from constants import PREV_CONTEXT_MAX_TOKENS
+    from figure_cache import figure_from_code, load_figure
+    from intent_router import route_intent, schema_vocabulary
+    from memory import clip_tokens
+    from result_set import collect_results
+    from sql_guard import query_owner
+    from streaming import StreamlitAnswerHandler
+    from tracing import record_error, span, trace_request
     # Display user message in chat
     with st.chat_message("user", avatar="🚀"):
         st.markdown(prompt)
     st.session_state.messages.append({"role": "user", "content": prompt})
-    keywords = ["plot", "graph", "chart", "diagram", "visualize", "visualisation", "show"]
-    if any(keyword in prompt.lower() for keyword in keywords):
+    question = prompt
+    # Routed locally: only data questions reach the agents
+    vocabulary = frozenset()
+    if st.session_state.db_config.get('DATABASE'):
+        from schema_snapshot import get_schema_snapshot
+        vocabulary = schema_vocabulary(get_schema_snapshot(st.session_state.db_config))
+    intent, confidence = route_intent(prompt, vocabulary=vocabulary)
+    if intent in ("chitchat", "schema"):
+        with trace_request(intent, session_id=st.session_state.session_id, confidence=round(confidence, 3)):
+            with span("answer_locally"):
+                response = answer_locally(intent, prompt)
+            with span("render"), st.chat_message("assistant", avatar="❇️"):
+                display_text_with_images(response)
+        st.session_state.messages.append({"role": "assistant", "content": response, "result": None, "intent": intent})
+    elif intent == "viz":
         prev_context = ""
         for msg in reversed(st.session_state.messages):
-            if msg["role"] == "assistant":
-                prev_context = msg["content"] + "\n\n" + prev_context
+            if msg["role"] == "assistant" and msg.get("intent") != "chitchat":
+                prev_context = clip_tokens(msg["content"], PREV_CONTEXT_MAX_TOKENS) + "\n\n" + prev_context
                 break
         if prev_context:
             prompt += f"\n\nGiven previous agent responses:\n{prev_context}\n"
-        response = generate_response("python", prompt)
-        if response == "NO_RESPONSE":
-            response = "Please try again with a re-phrased query and more context"
-            with st.chat_message("error"):
-                display_text_with_images(response)
-            st.session_state.messages.append({"role": "error", "content": response})
-        else:
-            code = display_code_plots(response['output'])
-            try:
-                code = f"import pandas as pd\n{code.replace('fig.show()', '')}"
-                code += "st.plotly_chart(fig, theme='streamlit', use_container_width=True)"
-                exec(code)
-                st.session_state.messages.append({"role": "plot", "content": code})
-            except:
-                response = "Please try again with a re-phrased query and more context"
-                with st.chat_message("error"):
+        with trace_request("python", session_id=st.session_state.session_id):
+            # Progress only; the plot itself is rendered once the code is ready
+            stream_handler = StreamlitAnswerHandler(st.container(), stream_answer=False)
+            with query_owner(st.session_state.session_id, run_abandoned(get_script_run_ctx())):
+                response = generate_response("python", prompt, callbacks=[stream_handler], question=question)
+            stream_handler.finish()
+            if not isinstance(response, dict):
+                if response == "NO_RESPONSE":
+                    response = "Please try again with a re-phrased query and more context"
+                with span("render"), st.chat_message("error"):
                     display_text_with_images(response)
                 st.session_state.messages.append({"role": "error", "content": response})
+            elif response.get("figure"):
+                with span("render"):
+                    st.plotly_chart(load_figure(response["figure"]), theme='streamlit', use_container_width=True)
+                st.session_state.messages.append({"role": "plot", "figure": response["figure"]})
+            else:
+                code = display_code_plots(response['output'])
+                try:
+                    # Run the generated code once and keep only the serialized figure
+                    with span("plot_exec"):
+                        figure = figure_from_code(code)
+                    with span("render"):
+                        st.plotly_chart(load_figure(figure), theme='streamlit', use_container_width=True)
+                    st.session_state.messages.append({"role": "plot", "figure": figure})
+                except Exception as e:
+                    record_error(e)
+                    response = "Please try again with a re-phrased query and more context"
+                    with st.chat_message("error"):
+                        display_text_with_images(response)
+                    st.session_state.messages.append({"role": "error", "content": response})
     else:
         if len(st.session_state.messages) > 1:
             context_length = 0
@@ -349,15 +406,31 @@ if prompt := st.chat_input("Please ask your question:"):
             for msg in reversed(st.session_state.messages):
                 if context_length > 1:
                     break
-                if msg["role"] == "assistant":
-                    prev_context = msg["content"] + "\n\n" + prev_context
+                if msg["role"] == "assistant" and msg.get("intent") != "chitchat":
+                    # Long answers, e.g. copied query results, are cut to keep the prompt small
+                    prev_context = clip_tokens(msg["content"], PREV_CONTEXT_MAX_TOKENS) + "\n\n" + prev_context
                     context_length += 1
-            response = generate_response("sql", f"{prompt}\n\nGiven previous agent responses:\n{prev_context}\n")
-        else:
-            response = generate_response("sql", prompt)
-        with st.chat_message("assistant", avatar="❇️"):
-            display_text_with_images(response)
-        st.session_state.messages.append({"role": "assistant", "content": response})
+            prompt = f"{prompt}\n\nGiven previous agent responses:\n{prev_context}\n"
+        with trace_request("sql", session_id=st.session_state.session_id), st.chat_message("assistant", avatar="❇️"):
+            # Stream tool status and answer tokens, then render the final answer in place
+            stream_handler = StreamlitAnswerHandler(st.container())
+            with collect_results() as results, query_owner(st.session_state.session_id, run_abandoned(get_script_run_ctx())):
+                response = generate_response("sql", prompt, callbacks=[stream_handler], question=question)
+            stream_handler.finish()
+            message = {
+                "role": "assistant",
+                "content": response,
+                "result": results[-1].handle if results else None,
+                "question": question,
+                "sql": results[-1].sql if results else None,
+            }
+            with span("render"):
+                display_text_with_images(response)
+                # The agent only saw a preview; show the full typed table of its last query
+                if results:
+                    display_result_table(results[-1])
+                verification_control(len(st.session_state.messages), message)
+        st.session_state.messages.append(message)
 
 # Initialize session state for query
 if 'query' not in st.session_state:
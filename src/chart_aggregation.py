@@ -0,0 +1,160 @@
+import threading
+import pandas as pd
+from chart_planner import ChartSpec
+from constants import CHART_MAX_BARS, CHART_MAX_POINTS
+from downsample import aggregate_function, parse_times
+from result_set import fetch_result
+from sql_guard import remove_auto_limit
+from tracing import span
+
+# Time buckets from finest to coarsest, with their length in seconds
+# (approximate from months up).
+TIME_BUCKETS = [
+    ("second", 1), ("minute", 60), ("hour", 3600), ("day", 86400), ("week", 7 * 86400),
+    ("month", 30.44 * 86400), ("quarter", 91.31 * 86400), ("year", 365.25 * 86400),
+]
+
+# Expression truncating {x} to the start of its bucket, per dialect. Weeks
+# start on Monday.
+BUCKET_SQL = {
+    "mysql": {
+        "second": "DATE_FORMAT({x}, '%Y-%m-%d %H:%i:%s')",
+        "minute": "DATE_FORMAT({x}, '%Y-%m-%d %H:%i:00')",
+        "hour": "DATE_FORMAT({x}, '%Y-%m-%d %H:00:00')",
+        "day": "DATE({x})",
+        "week": "DATE_SUB(DATE({x}), INTERVAL WEEKDAY({x}) DAY)",
+        "month": "DATE_FORMAT({x}, '%Y-%m-01')",
+        "quarter": "MAKEDATE(YEAR({x}), 1) + INTERVAL (QUARTER({x}) - 1) QUARTER",
+        "year": "MAKEDATE(YEAR({x}), 1)",
+    },
+    "sqlite": {
+        "second": "strftime('%Y-%m-%d %H:%M:%S', {x})",
+        "minute": "strftime('%Y-%m-%d %H:%M:00', {x})",
+        "hour": "strftime('%Y-%m-%d %H:00:00', {x})",
+        "day": "date({x})",
+        "week": "date({x}, '-6 days', 'weekday 1')",
+        "month": "strftime('%Y-%m-01', {x})",
+        "quarter": "printf('%s-%02d-01', strftime('%Y', {x}), (CAST(strftime('%m', {x}) AS INTEGER) - 1) / 3 * 3 + 1)",
+        "year": "strftime('%Y-01-01', {x})",
+    },
+    "postgresql": {unit: f"date_trunc('{unit}', {{x}})" for unit, _ in TIME_BUCKETS},
+}
+
+_SQL_AGGREGATES = {"sum": "SUM", "mean": "AVG"}
+
+_stats_lock = threading.Lock()
+_stats = {'large_results': 0, 'pushed_down': 0, 'failed': 0, 'rows_fetched': 0, 'rows_plotted': 0}
+
+
+def _count(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def chart_aggregation_stats():
+    """
+    Report how large chart results were reduced in the database.
+
+    Returns:
+        dict: Counts of results over the point cap, aggregations pushed down
+            and failed, and rows fetched for those results versus rows handed
+            on to the figure after aggregation.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def pick_time_bucket(first, last, series=1, max_points=CHART_MAX_POINTS):
+    """Return the finest bucket in TIME_BUCKETS giving at most max_points points over all series."""
+    seconds = (last - first).total_seconds()
+    for unit, length in TIME_BUCKETS:
+        if seconds / length * series <= max_points:
+            return unit
+    return TIME_BUCKETS[-1][0]
+
+
+def _time_bounds(engine, source, x, times, truncated):
+    if not truncated:
+        return times.min(), times.max()
+    # The fetched rows stop at the row cap; ask the database for the full range
+    bounds = fetch_result(engine, f"SELECT MIN({x}) AS min_x, MAX({x}) AS max_x FROM ({source}) AS chart_source")
+    first, last = pd.to_datetime(bounds.frame.iloc[0], errors="coerce")
+    return first, last
+
+
+def _plan(engine, result, spec, max_points, max_bars):
+    """Build the aggregate statement for a chart, or None when it cannot be pushed down."""
+    dialect = engine.dialect.name
+    quote = engine.dialect.identifier_preparer.quote
+    source = remove_auto_limit(result.sql).strip().rstrip(";")
+    frame = result.frame
+    x = quote(spec.x)
+    values = [f"{_SQL_AGGREGATES[aggregate_function(column)]}({quote(column)}) AS {quote(column)}" for column in spec.y]
+
+    times = parse_times(frame[spec.x]) if spec.kind in ("line", "bar") and spec.y else None
+    if times is not None and dialect in BUCKET_SQL:
+        first, last = _time_bounds(engine, source, x, times, result.truncated)
+        if pd.isna(first) or pd.isna(last) or first == last:
+            return None
+        series = frame[spec.color].nunique(dropna=False) if spec.color else 1
+        unit = pick_time_bucket(first, last, series, max_points)
+        keys = [f"{BUCKET_SQL[dialect][unit].format(x=x)} AS {x}"] + ([quote(spec.color)] if spec.color else [])
+        group_by = ", ".join(str(position + 1) for position in range(len(keys)))
+        statement = (
+            f"SELECT {', '.join(keys + values)} FROM ({source}) AS chart_source "
+            f"WHERE {x} IS NOT NULL GROUP BY {group_by} ORDER BY 1"
+        )
+        return statement, spec
+
+    if spec.kind in ("bar", "pie") and not spec.color and times is None:
+        if not spec.y:
+            values = [f"COUNT(*) AS {quote('count')}"]
+            spec = ChartSpec(spec.kind, spec.x, ["count"])
+        statement = (
+            f"SELECT {x}, {', '.join(values)} FROM ({source}) AS chart_source "
+            f"GROUP BY 1 ORDER BY 2 DESC LIMIT {int(max_bars)}"
+        )
+        return statement, spec
+    return None
+
+
+def aggregate_for_chart(engine, result, spec, max_points=CHART_MAX_POINTS, max_bars=CHART_MAX_BARS):
+    """
+    Aggregate a large chart result in the database instead of in the browser.
+
+    Results within max_points rows are used as they are. Larger ones are
+    re-queried with the agent's statement as a subquery: time series are
+    grouped into the finest time bucket that fits max_points points, bar and
+    pie charts over categories keep the max_bars largest categories. Sums are
+    kept for count- and total-like value columns, averages for the rest.
+    When the chart cannot be expressed this way, or the aggregate query
+    fails, the fetched rows are returned for build_figure to downsample.
+
+    Args:
+        engine (Engine): Engine the result was fetched from.
+        result (QueryResult): The agent's last query result.
+        spec (ChartSpec): The planned chart.
+    Returns:
+        tuple: (ChartSpec, DataFrame) to build the figure from; the spec
+            changes only when value counts are computed in the database.
+    """
+    if result.row_count <= max_points and not result.truncated:
+        return spec, result.frame
+    _count(large_results=1, rows_fetched=result.row_count)
+    try:
+        with span("chart_aggregation") as attributes:
+            plan = _plan(engine, result, spec, max_points, max_bars)
+            attributes['pushed_down'] = plan is not None
+            if plan is None:
+                _count(rows_plotted=result.row_count)
+                return spec, result.frame
+            statement, aggregated_spec = plan
+            frame = fetch_result(engine, statement).frame
+            attributes['rows'] = len(frame)
+    except Exception as e:
+        print(f"Chart aggregation failed, plotting the fetched rows: {str(e)}")
+        _count(failed=1, rows_plotted=result.row_count)
+        return spec, result.frame
+    _count(pushed_down=1, rows_plotted=len(frame))
+    return aggregated_spec, frame
@@ -0,0 +1,212 @@
+import re
+import pandas as pd
+import plotly.express as px
+from constants import CHART_MAX_CATEGORIES, CHART_MAX_POINTS, CHART_MAX_SERIES
+from downsample import fit_chart_frame, histogram_frame
+
+# Chart kinds the planner can build, keyed by words users ask for them with.
+SUPPORTED_KINDS = {
+    "line": ("line", "trend", "over time", "time series"),
+    "bar": ("bar", "bars", "column chart"),
+    "scatter": ("scatter", "correlation", "versus", "vs"),
+    "pie": ("pie", "donut", "share", "proportion"),
+    "histogram": ("histogram", "distribution"),
+}
+
+# Requests the planner cannot express; these go to the LLM plotting agent.
+UNSUPPORTED_WORDS = (
+    "heatmap", "heat map", "map", "geo", "sankey", "treemap", "sunburst", "funnel",
+    "box plot", "boxplot", "violin", "3d", "radar", "candlestick", "waterfall",
+    "gantt", "animate", "animation", "subplot", "subplots", "dual axis", "annotate",
+)
+
+# Whole words of a snake_case column name (camelCase is split first), so
+# "update_count" and "avg_days_open" stay measures while "order_date" does not.
+TIME_NAME_PATTERN = re.compile(
+    r"(^|_)(date|datetime|timestamp|time|day|week|month|year|quarter|period)s?($|_)", re.IGNORECASE
+)
+# Integer columns with a time-like name are only taken for years.
+YEAR_RANGE = (1900, 2100)
+
+
+class ChartSpec:
+    """
+    Plan for one plotly express chart.
+
+    Attributes:
+        kind (str): One of SUPPORTED_KINDS.
+        x (str): Column on the x axis (names for pie charts).
+        y (list): Value columns (values for pie charts); empty for histograms
+            and value counts.
+        color (str): Optional column used to split series.
+    """
+
+    def __init__(self, kind, x, y=None, color=None):
+        self.kind = kind
+        self.x = x
+        self.y = y or []
+        self.color = color
+
+    def __repr__(self):
+        return f"ChartSpec(kind={self.kind!r}, x={self.x!r}, y={self.y!r}, color={self.color!r})"
+
+
+def requested_chart_kind(prompt):
+    """
+    Work out which chart the user asked for.
+
+    Returns:
+        str: A supported kind, "unsupported" when the request needs something
+            the planner cannot build, or None when no chart type was named.
+    """
+    text = prompt.lower()
+
+    def mentions(words):
+        return any(re.search(rf"\b{re.escape(word)}\b", text) for word in words)
+
+    if mentions(UNSUPPORTED_WORDS):
+        return "unsupported"
+    for kind in ("histogram", "pie", "scatter", "line", "bar"):
+        if mentions(SUPPORTED_KINDS[kind]):
+            return kind
+    return None
+
+
+def _is_time_like(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(series.name))
+    if TIME_NAME_PATTERN.search(name):
+        if pd.api.types.is_integer_dtype(series):
+            values = series.dropna()
+            return not values.empty and values.between(*YEAR_RANGE).all()
+        if series.dtype == object:
+            parsed = pd.to_datetime(series, errors="coerce")
+            return parsed.notna().mean() > 0.9
+    return False
+
+
+def _classify_columns(frame):
+    """Split columns into time-like, numeric and categorical lists."""
+    time_cols, numeric_cols, categorical_cols = [], [], []
+    for column in frame.columns:
+        series = frame[column]
+        if _is_time_like(series):
+            time_cols.append(column)
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            numeric_cols.append(column)
+        else:
+            categorical_cols.append(column)
+    return time_cols, numeric_cols, categorical_cols
+
+
+def plan_chart(frame, prompt=""):
+    """
+    Pick a chart for a tabular result from its column dtypes and cardinality.
+
+    Time column + numeric -> line; categorical + numeric -> bar (or pie when
+    asked for); two numerics -> scatter; one numeric -> histogram; one
+    categorical -> bar of value counts.
+
+    Args:
+        frame (DataFrame): The query result.
+        prompt (str): The user request, used to honour an explicit chart type.
+    Returns:
+        ChartSpec: The planned chart, or None if the planner cannot express the
+            request and the LLM should write the plot instead.
+    """
+    if frame is None or frame.empty or frame.columns.duplicated().any():
+        return None
+    requested = requested_chart_kind(prompt)
+    if requested == "unsupported":
+        return None
+
+    time_cols, numeric_cols, categorical_cols = _classify_columns(frame)
+    low_cardinality = [
+        c for c in categorical_cols if frame[c].nunique(dropna=True) <= CHART_MAX_CATEGORIES
+    ]
+
+    if requested == "histogram" and numeric_cols:
+        return ChartSpec("histogram", numeric_cols[0], color=low_cardinality[0] if low_cardinality else None)
+
+    if requested == "scatter" and len(numeric_cols) >= 2:
+        return ChartSpec("scatter", numeric_cols[0], numeric_cols[1:2],
+                         color=low_cardinality[0] if low_cardinality else None)
+
+    if time_cols and numeric_cols and requested in (None, "line", "bar"):
+        color = low_cardinality[0] if low_cardinality else None
+        y = numeric_cols[:1] if color else numeric_cols[:CHART_MAX_SERIES]
+        return ChartSpec("bar" if requested == "bar" else "line", time_cols[0], y, color=color)
+
+    if categorical_cols and numeric_cols:
+        x = categorical_cols[0]
+        if requested == "pie":
+            if frame[x].nunique(dropna=True) > CHART_MAX_CATEGORIES:
+                return None
+            return ChartSpec("pie", x, numeric_cols[:1])
+        if requested in (None, "bar"):
+            others = [c for c in low_cardinality if c != x]
+            color = others[0] if others else None
+            return ChartSpec("bar", x, numeric_cols[:1] if color else numeric_cols[:CHART_MAX_SERIES], color=color)
+        if requested == "line":
+            return ChartSpec("line", x, numeric_cols[:CHART_MAX_SERIES])
+        return None
+
+    if len(numeric_cols) >= 2 and requested in (None, "scatter"):
+        return ChartSpec("scatter", numeric_cols[0], numeric_cols[1:2])
+
+    if len(numeric_cols) == 1 and not categorical_cols and not time_cols and requested in (None, "histogram"):
+        return ChartSpec("histogram", numeric_cols[0])
+
+    if any(pd.api.types.is_numeric_dtype(frame[c]) for c in time_cols):
+        # A numeric column taken for time may be the measure; value counts would hide it
+        return None
+
+    if categorical_cols and not numeric_cols and requested in (None, "bar", "pie"):
+        kind = "pie" if requested == "pie" else "bar"
+        return ChartSpec(kind, categorical_cols[0])
+
+    return None
+
+
+def build_figure(spec, frame, max_points=CHART_MAX_POINTS):
+    """
+    Build the plotly figure for a ChartSpec.
+
+    Data over max_points points is downsampled first (see
+    downsample.fit_chart_frame), and large histograms are pre-binned, so
+    the figure's size does not grow with the result.
+
+    Args:
+        spec (ChartSpec): The planned chart.
+        frame (DataFrame): The query result.
+        max_points (int): Most points the figure should carry.
+    Returns:
+        Figure: The plotly figure.
+    """
+    if not spec.y and spec.kind in ("bar", "pie"):
+        # Categorical column only: plot how often each value occurs
+        frame = frame[spec.x].value_counts().reset_index()
+        frame.columns = [spec.x, "count"]
+        spec = ChartSpec(spec.kind, spec.x, ["count"])
+    frame = fit_chart_frame(spec, frame, max_points)
+
+    if spec.kind == "line":
+        frame = frame.sort_values(spec.x)
+        fig = px.line(frame, x=spec.x, y=spec.y, color=spec.color, markers=len(frame) <= 50)
+    elif spec.kind == "bar":
+        fig = px.bar(frame, x=spec.x, y=spec.y, color=spec.color, barmode="group")
+    elif spec.kind == "scatter":
+        fig = px.scatter(frame, x=spec.x, y=spec.y[0], color=spec.color)
+    elif spec.kind == "pie":
+        fig = px.pie(frame, names=spec.x, values=spec.y[0])
+    elif spec.kind == "histogram" and len(frame) > max_points:
+        fig = px.bar(histogram_frame(frame, spec.x, spec.color), x=spec.x, y="count", color=spec.color)
+        fig.update_layout(bargap=0)
+    elif spec.kind == "histogram":
+        fig = px.histogram(frame, x=spec.x, color=spec.color)
+    else:
+        raise ValueError(f"Unknown chart kind: {spec.kind}")
+    title = f"{', '.join(spec.y) or spec.x} by {spec.x}" if spec.kind != "histogram" else f"Distribution of {spec.x}"
+    fig.update_layout(title=title)
+    return fig
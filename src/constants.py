@@ -1,5 +1,181 @@
+import os
+
 LLM_MODEL_NAME = "gpt-4-0125-preview"
 
+# SQL agent mode: "react" (multi-step tool loop) or "single_shot" (one LLM call,
+# ReAct fallback on execution errors).
+SQL_AGENT_MODE = "react"
+
+# Model tiering for SQL questions. With MODEL_TIERING on, easy questions go to
+# LLM_FAST_MODEL_NAME and are retried on LLM_MODEL_NAME when no SQL ran
+# successfully or the last result was empty. A question is easy when the agent
+# sees at most TIER_FAST_MAX_TABLES tables, it has at most TIER_FAST_MAX_WORDS
+# words, and the fast model answered at least TIER_MIN_SUCCESS_RATE of its last
+# TIER_HISTORY questions on the database; below that rate only every
+# TIER_PROBE_EVERY-th easy question still tries the fast model.
+MODEL_TIERING = True
+LLM_FAST_MODEL_NAME = "gpt-3.5-turbo-0125"
+TIER_FAST_MAX_TABLES = 4
+TIER_FAST_MAX_WORDS = 25
+TIER_MIN_SUCCESS_RATE = 0.7
+TIER_HISTORY = 50
+TIER_PROBE_EVERY = 10
+
+# Connection pool settings shared by every engine in db_pool.
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_RECYCLE = 1800  # seconds; MySQL drops idle connections after wait_timeout
+DB_POOL_TIMEOUT = 30
+DB_POOL_PRE_PING = True
+
+# Transient database errors are retried with exponential backoff and full
+# jitter; after DB_BREAKER_FAILURE_THRESHOLD consecutive failures a database's
+# circuit breaker opens and calls fail fast for DB_BREAKER_RESET_SECONDS.
+DB_RETRY_MAX_ATTEMPTS = 3
+DB_RETRY_BASE_DELAY = 0.2  # seconds
+DB_RETRY_MAX_DELAY = 5  # seconds
+DB_BREAKER_FAILURE_THRESHOLD = 5
+DB_BREAKER_RESET_SECONDS = 30
+
+# Local directory for caches that outlive a single process.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "text-to-sql")
+
+# Hub prompt templates cached on disk; a vendored copy is used when offline.
+PROMPT_CACHE_DIR = os.path.join(CACHE_DIR, "prompts")
+
+# Answer cache in front of generate_response. Backend is "memory" or "sqlite".
+ANSWER_CACHE_BACKEND = "memory"
+ANSWER_CACHE_PATH = os.path.join(CACHE_DIR, "answers.sqlite")
+ANSWER_CACHE_MAX_ENTRIES = 512
+ANSWER_CACHE_TTL_SECONDS = 3600
+
+# Schema snapshots persisted under CACHE_DIR/schema.
+SCHEMA_SAMPLE_ROWS = 3
+SCHEMA_SNAPSHOT_CHECK_INTERVAL = 60  # seconds between catalog version checks
+
+# Tables retrieved per question before adding foreign-key neighbours.
+TABLE_INDEX_TOP_K = 5
+
+# Verified question -> SQL examples, added with "Mark as correct" in the chat.
+# Up to EXAMPLES_TOP_K are put in the SQL agent prompt, if at least
+# EXAMPLES_MIN_OVERLAP of an example question's terms appear in the question.
+EXAMPLE_STORE_PATH = os.path.join(CACHE_DIR, "examples.sqlite")
+EXAMPLES_TOP_K = 3
+EXAMPLES_MIN_OVERLAP = 0.5
+
+# Typed query results: rows fetched per round trip, row cap per query, and rows
+# the agent sees as text. Recent results stay addressable by handle within their
+# session, up to RESULT_STORE_SESSION_MAX_ROWS rows per session and
+# RESULT_STORE_MAX_ROWS rows over all sessions.
+RESULT_CHUNK_SIZE = 1000
+RESULT_MAX_ROWS = 100000
+RESULT_PREVIEW_ROWS = 50
+RESULT_STORE_SESSION_MAX_ROWS = 200000
+RESULT_STORE_MAX_ROWS = 1000000
+
+# Results of more than RESULT_PREVIEW_ROWS rows reach the agent as a summary:
+# row count, column types, the first and last RESULT_SUMMARY_EDGE_ROWS rows,
+# and stats for up to RESULT_SUMMARY_MAX_COLUMNS columns with the
+# RESULT_SUMMARY_TOP_VALUES most common values of text columns. Each earlier
+# answer appended to a follow-up question is clipped to PREV_CONTEXT_MAX_TOKENS.
+RESULT_SUMMARY_EDGE_ROWS = 5
+RESULT_SUMMARY_MAX_COLUMNS = 20
+RESULT_SUMMARY_TOP_VALUES = 3
+PREV_CONTEXT_MAX_TOKENS = 300
+
+# SQL result cache shared by every session, keyed by normalized SQL text and
+# invalidated when a table it reads changes. Backend is "memory" or "sqlite".
+# Versions of the tables a statement names are re-read from the catalog at most
+# every QUERY_CACHE_VERSION_TTL seconds, or QUERY_CACHE_VERSION_COST_FACTOR times
+# as long as the last catalog read took on databases where that is longer;
+# results over QUERY_CACHE_MAX_ROWS rows are not cached.
+QUERY_CACHE_BACKEND = "memory"
+QUERY_CACHE_PATH = os.path.join(CACHE_DIR, "query_results.sqlite")
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_MAX_ROWS = 10000
+QUERY_CACHE_VERSION_TTL = 2  # seconds
+QUERY_CACHE_VERSION_COST_FACTOR = 50
+
+# Guard in front of every query: plans estimated to examine more rows than
+# SQL_GUARD_MAX_ESTIMATED_ROWS are rejected, SELECTs without a LIMIT get one
+# just above the fetch cap, and statements are stopped after the timeout (by
+# the server where supported). Running queries are checked for cancellation
+# every SQL_GUARD_CANCEL_POLL_INTERVAL seconds.
+SQL_GUARD_MAX_ESTIMATED_ROWS = 50_000_000
+SQL_GUARD_AUTO_LIMIT = RESULT_MAX_ROWS + 1
+SQL_GUARD_TIMEOUT_SECONDS = 30
+SQL_GUARD_CANCEL_POLL_INTERVAL = 0.5
+
+# Chart planner limits: distinct values for a colour/pie column, value series per chart.
+CHART_MAX_CATEGORIES = 12
+CHART_MAX_SERIES = 4
+
+# Points per chart: results of more than CHART_MAX_POINTS rows are aggregated
+# in the database (time buckets, or the top CHART_MAX_BARS categories), and
+# whatever still exceeds the cap is downsampled (LTTB for lines and time bars,
+# sampling for scatter plots, pre-binned histograms) before the figure is built.
+CHART_MAX_POINTS = 2000
+CHART_MAX_BARS = 50
+
+# Conversation memory: recent turns kept verbatim within a token budget; older
+# turns are folded into a capped rolling summary.
+MEMORY_MAX_TURNS = 6
+MEMORY_TOKEN_BUDGET = 1500
+MEMORY_SUMMARY_MAX_TOKENS = 300
+
+# Chat history is kept in a local SQLite file and written behind the answer
+# path in batches; set HISTORY_MIRROR_TO_MYSQL to also copy it to the analysed
+# database's message_store table. The messages of the HISTORY_CACHE_MAX_SESSIONS
+# most recently used sessions are kept in memory.
+HISTORY_STORE_PATH = os.path.join(CACHE_DIR, "history.sqlite")
+HISTORY_FLUSH_BATCH_SIZE = 50
+HISTORY_FLUSH_INTERVAL = 0.5  # seconds
+HISTORY_CACHE_MAX_SESSIONS = 256
+HISTORY_MIRROR_TO_MYSQL = False
+
+# Parsed plot figures kept in memory for re-rendering chat history.
+FIGURE_CACHE_MAX_ENTRIES = 256
+
+# Generated plot code runs in a pool of PLOT_SANDBOX_WORKERS worker processes,
+# each capped at PLOT_SANDBOX_MEMORY_MB of address space; a run is killed after
+# PLOT_SANDBOX_TIMEOUT_SECONDS, and waits at most PLOT_SANDBOX_QUEUE_TIMEOUT_SECONDS
+# for a free worker. A worker not ready within PLOT_SANDBOX_START_TIMEOUT_SECONDS
+# is killed. Only the tail of the code's printed output is returned.
+PLOT_SANDBOX_WORKERS = 2
+PLOT_SANDBOX_TIMEOUT_SECONDS = 10
+PLOT_SANDBOX_MEMORY_MB = 1024
+PLOT_SANDBOX_QUEUE_TIMEOUT_SECONDS = 30
+PLOT_SANDBOX_START_TIMEOUT_SECONDS = 60
+PLOT_SANDBOX_MAX_OUTPUT_CHARS = 4000
+
+# Request tracing: spans are appended to a JSONL file and metrics rewritten in
+# Prometheus text format after every request; the app shows the most recent ones.
+# The span file is rotated at TRACE_SPANS_MAX_BYTES, keeping TRACE_SPANS_BACKUPS
+# older files; set TRACE_SPANS_PATH to None to stop writing spans.
+TRACE_SPANS_PATH = os.path.join(CACHE_DIR, "traces.jsonl")
+TRACE_SPANS_MAX_BYTES = 50 * 1024 * 1024
+TRACE_SPANS_BACKUPS = 3
+TRACE_METRICS_PATH = os.path.join(CACHE_DIR, "metrics.prom")
+TRACE_RECENT_REQUESTS = 20
+TRACE_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Intent router: chitchat and schema questions are answered locally only when
+# the classifier is at least this confident; otherwise they go to the SQL agent.
+INTENT_MIN_CONFIDENCE = 0.6
+
+# Async HTTP API (src/api.py). Questions run on API_WORKER_THREADS threads, at
+# most API_MAX_CONCURRENT_PER_DATABASE at a time per database; up to
+# API_MAX_QUEUED_PER_DATABASE more wait for a slot, each for at most
+# API_QUEUE_TIMEOUT_SECONDS, and further requests are turned away with a 503.
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+API_WORKER_THREADS = 32
+API_MAX_CONCURRENT_PER_DATABASE = 8
+API_MAX_QUEUED_PER_DATABASE = 64
+API_QUEUE_TIMEOUT_SECONDS = 30
+API_MAX_SESSIONS = 1000
+API_MAX_RESULT_ROWS = 1000
+
 CUSTOM_SUFFIX = """Begin!
 
 Relevant pieces of previous conversation:
@@ -0,0 +1,117 @@
+import threading
+import urllib.parse
+from sqlalchemy import create_engine
+from constants import (
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_PRE_PING,
+)
+from sql_guard import install_statement_timeout
+
+# Engines live at module level so that every Streamlit rerun and every browser
+# session in this process shares the same connection pools.
+_engines = {}
+_lock = threading.Lock()
+
+
+def _registry_key(config, database):
+    return (
+        config.get('DRIVER', 'mysql+pymysql'),
+        config.get('USER', ''),
+        config.get('PASSWORD', ''),
+        config.get('HOST', ''),
+        str(config.get('PORT', '')),
+        database,
+    )
+
+
+def build_connection_string(config, database=None):
+    """
+    Build the SQLAlchemy URL for a connection config.
+
+    Args:
+        config (dict): Connection config with USER, PASSWORD, HOST and PORT keys,
+            and an optional DRIVER (default "mysql+pymysql").
+        database (str): Database to connect to. Defaults to config['DATABASE'];
+            pass an empty string for a server-level connection.
+    Returns:
+        str: The connection string.
+    """
+    if database is None:
+        database = config.get('DATABASE', '')
+    driver = config.get('DRIVER', 'mysql+pymysql')
+    if driver.startswith('sqlite'):
+        # Local file databases (e.g. benchmark fixtures); DATABASE is the file path
+        return f"{driver}:///{database}"
+    password = urllib.parse.quote_plus(config['PASSWORD'])
+    return (
+        f"{driver}://{config['USER']}:{password}@"
+        f"{config['HOST']}:{config['PORT']}/{database}"
+    )
+
+
+def get_engine(config, database=None):
+    """
+    Return the shared pooled engine for a connection config, creating it on first use.
+
+    Args:
+        config (dict): Connection config with USER, PASSWORD, HOST and PORT keys.
+        database (str): Database to connect to. Defaults to config['DATABASE'];
+            pass an empty string for a server-level engine used for catalog lookups.
+    Returns:
+        Engine: A SQLAlchemy engine with a bounded, pre-pinged connection pool
+            whose connections carry a server-side statement timeout.
+    """
+    if database is None:
+        database = config.get('DATABASE', '')
+    key = _registry_key(config, database)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(
+                build_connection_string(config, database),
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+            install_statement_timeout(engine)
+            _engines[key] = engine
+    return engine
+
+
+def dispose_engine(config, database=None):
+    """Close all pooled connections for a config and drop it from the registry."""
+    if database is None:
+        database = config.get('DATABASE', '')
+    with _lock:
+        engine = _engines.pop(_registry_key(config, database), None)
+    if engine is not None:
+        engine.dispose()
+
+
+def pool_stats():
+    """
+    Report the state of every pooled engine in the registry.
+
+    Returns:
+        list: One dict per engine with its label and pool counters.
+    """
+    stats = []
+    for key, engine in list(_engines.items()):
+        driver, user, _, host, port, database = key
+        pool = engine.pool
+        stats.append({
+            'engine': f"{driver}://{user}@{host}:{port}/{database}",
+            'size': pool.size() if hasattr(pool, 'size') else None,
+            'checked_in': pool.checkedin() if hasattr(pool, 'checkedin') else None,
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+        })
+    return stats
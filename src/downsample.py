@@ -0,0 +1,197 @@
+import re
+import warnings
+import numpy as np
+import pandas as pd
+from constants import CHART_MAX_BARS, CHART_MAX_POINTS
+
+# Value columns whose values add up over a group (summed); others are averaged.
+ADDITIVE_NAME_PATTERN = re.compile(
+    r"(count|total|sum|revenue|amount|sales|orders|units|quantity|qty|volume|number)", re.IGNORECASE
+)
+
+# Most bins a pre-binned histogram gets.
+HISTOGRAM_MAX_BINS = 100
+
+# Values of a text column tried as times before the whole column is parsed.
+TIME_PROBE_VALUES = 100
+
+
+def aggregate_function(column):
+    """Return "sum" for columns that add up over a group, "mean" for the rest."""
+    return "sum" if ADDITIVE_NAME_PATTERN.search(str(column)) else "mean"
+
+
+def lttb(x, y, threshold):
+    """
+    Pick points of a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; the others are split into
+    threshold - 2 buckets, and from each the point forming the largest
+    triangle with the previously picked point and the next bucket's average
+    is kept, so peaks and troughs survive.
+
+    Args:
+        x (ndarray): Float x values, sorted ascending.
+        y (ndarray): Float y values, without NaN.
+        threshold (int): Points to keep.
+    Returns:
+        ndarray: Indices of the kept points, ascending.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=int)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def parse_times(series):
+    """
+    Return a column as datetimes if it holds times, else None.
+
+    Text columns count as times when over 90% of their values parse; a sample
+    is tried first, since values that are not dates parse slowly one by one.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if series.dtype != object:
+        return None
+
+    def parse(values):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # mixed formats fall back to dateutil
+            return pd.to_datetime(values, errors="coerce")
+
+    if parse(series.dropna().head(TIME_PROBE_VALUES)).notna().mean() <= 0.9:
+        return None
+    parsed = parse(series)
+    return parsed if parsed.notna().mean() > 0.9 else None
+
+
+def _time_values(series):
+    values = series.to_numpy(dtype="datetime64[ns]").astype("int64").astype(float)
+    values[series.isna().to_numpy()] = np.nan
+    return values
+
+
+def _axis_values(series):
+    """Float positions of an orderable column (numbers or times), or None."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=float, na_value=np.nan)
+    times = parse_times(series)
+    return _time_values(times) if times is not None else None
+
+
+def _value_array(series):
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def _lttb_frame(frame, x, y, threshold):
+    """Rows of frame kept by LTTB over (x, y); frame must be sorted by x."""
+    positions = _axis_values(frame[x])
+    if positions is None:
+        positions = np.arange(len(frame), dtype=float)
+    values = _value_array(frame[y])
+    valid = ~(np.isnan(positions) | np.isnan(values))
+    kept = frame[valid]
+    return kept.iloc[lttb(positions[valid], values[valid], threshold)]
+
+
+def _top_categories(frame, x, y, color, max_bars):
+    """Aggregate value columns per category and keep the max_bars largest categories."""
+    keys = [x, color] if color else [x]
+    grouped = frame.groupby(keys, dropna=False, sort=False).agg({column: aggregate_function(column) for column in y})
+    grouped = grouped.reset_index()
+    totals = grouped.groupby(x, dropna=False, sort=False)[y[0]].sum().nlargest(max_bars)
+    return grouped[grouped[x].isin(totals.index)]
+
+
+def fit_chart_frame(spec, frame, max_points=CHART_MAX_POINTS, max_bars=CHART_MAX_BARS):
+    """
+    Reduce a chart's data to at most about max_points points.
+
+    Lines, and bars over an orderable x, are downsampled with LTTB per colour
+    series; bars and pies over categories are aggregated per category, keeping
+    the max_bars largest; scatter plots are sampled. Histograms are binned
+    when the figure is built. Frames within the cap are returned unchanged.
+
+    Args:
+        spec (ChartSpec): The planned chart, with value columns in spec.y.
+        frame (DataFrame): The chart's data.
+    Returns:
+        DataFrame: The rows to plot.
+    """
+    if len(frame) <= max_points or not spec.y:
+        return frame
+    if spec.kind == "scatter":
+        return frame.sample(max_points, random_state=0).sort_index()
+    orderable = _axis_values(frame[spec.x]) is not None
+    if spec.kind == "line" or (spec.kind == "bar" and orderable):
+        frame = frame.sort_values(spec.x, kind="stable")
+        groups = [group for _, group in frame.groupby(spec.color, sort=False)] if spec.color else [frame]
+        threshold = max(max_points // len(groups), 3)
+        return pd.concat([_lttb_frame(group, spec.x, spec.y[0], threshold) for group in groups])
+    if spec.kind in ("bar", "pie"):
+        return _top_categories(frame, spec.x, spec.y, spec.color, max_bars)
+    return frame
+
+
+def histogram_frame(frame, column, color=None, max_bins=HISTOGRAM_MAX_BINS):
+    """
+    Count a numeric column's values into bins shared by every colour group.
+
+    Returns:
+        DataFrame: One row per bin (and colour) with the bin centre in `column`
+            and the number of values in "count".
+    """
+    values = _value_array(frame[column])
+    valid = ~np.isnan(values)
+    edges = np.histogram_bin_edges(values[valid], bins="auto")
+    if len(edges) > max_bins + 1:
+        edges = np.linspace(edges[0], edges[-1], max_bins + 1)
+    centres = (edges[:-1] + edges[1:]) / 2
+    groups = frame[valid].groupby(color, sort=False) if color else [(None, frame[valid])]
+    parts = []
+    for name, group in groups:
+        counts, _ = np.histogram(_value_array(group[column]), bins=edges)
+        part = pd.DataFrame({column: centres, "count": counts})
+        if color:
+            part[color] = name
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def spread_rows(frame, max_rows):
+    """
+    Pick up to max_rows rows spread across the whole frame.
+
+    Rows are chosen with LTTB over row order and the first numeric column, so
+    the extremes of that column are kept; without one, rows are evenly spaced.
+    """
+    if len(frame) <= max_rows:
+        return frame
+    numeric = [
+        position for position in range(frame.shape[1])
+        if pd.api.types.is_numeric_dtype(frame.iloc[:, position])
+        and not pd.api.types.is_bool_dtype(frame.iloc[:, position])
+    ]
+    if numeric:
+        values = _value_array(frame.iloc[:, numeric[0]])
+        values = np.where(np.isnan(values), np.nanmean(values) if (~np.isnan(values)).any() else 0.0, values)
+        return frame.iloc[lttb(np.arange(len(frame), dtype=float), values, max_rows)]
+    return frame.iloc[np.unique(np.linspace(0, len(frame) - 1, max_rows).round().astype(int))]
@@ -0,0 +1,171 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from constants import EXAMPLE_STORE_PATH, EXAMPLES_MIN_OVERLAP, EXAMPLES_TOP_K
+from sql_guard import remove_auto_limit
+from table_index import BM25Index, tokenize
+
+# Question words that say nothing about which query is meant; ignored when
+# judging whether an example is close enough to the question.
+STOP_TERMS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "per", "is", "are", "was", "were",
+    "what", "which", "who", "how", "many", "much", "show", "me", "list", "give", "get", "find",
+    "tell", "all", "each", "every", "and", "or", "with", "from", "do", "doe", "did", "there",
+}
+
+
+def database_key(db_config):
+    """Key under which a database's examples are kept."""
+    return f"{db_config.get('HOST', '')}:{db_config.get('PORT', '')}/{db_config['DATABASE']}"
+
+
+def _normalize_question(question):
+    return re.sub(r"\s+", " ", question).strip()
+
+
+class ExampleStore:
+    """
+    Verified question -> SQL pairs per database, persisted in a local SQLite file.
+
+    Questions are searched with a BM25 index over their terms, built per
+    database on first search and rebuilt after an example is added.
+
+    Args:
+        path (str): SQLite file holding the examples.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            "id INTEGER PRIMARY KEY, database TEXT NOT NULL, question TEXT NOT NULL, "
+            "sql TEXT NOT NULL, created_at REAL NOT NULL, UNIQUE (database, question))"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._stats = {'added': 0, 'searches': 0, 'searches_with_examples': 0, 'seconds': 0.0}
+
+    def add(self, database, question, sql):
+        """
+        Store a verified example; a question already stored gets the new SQL.
+
+        Args:
+            database (str): Key from database_key().
+            question (str): The user's question, without conversation context.
+            sql (str): The statement that answered it.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO examples (database, question, sql, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (database, question) DO UPDATE SET sql = excluded.sql, created_at = excluded.created_at",
+                (database, _normalize_question(question), remove_auto_limit(sql).strip(), time.time()),
+            )
+            self._conn.commit()
+            self._indexes.pop(database, None)
+            self._stats['added'] += 1
+
+    def _index(self, database):
+        with self._lock:
+            cached = self._indexes.get(database)
+            if cached is None:
+                rows = self._conn.execute(
+                    "SELECT id, question, sql FROM examples WHERE database = ?", (database,)
+                ).fetchall()
+                examples = {row[0]: {'question': row[1], 'sql': row[2]} for row in rows}
+                bm25 = BM25Index({row[0]: tokenize(row[1]) for row in rows})
+                cached = self._indexes[database] = (examples, bm25)
+            return cached
+
+    def search(self, database, question, k=EXAMPLES_TOP_K, min_overlap=EXAMPLES_MIN_OVERLAP):
+        """
+        Find the verified examples closest to a question.
+
+        Args:
+            database (str): Key from database_key().
+            question (str): The user's question.
+            k (int): Most examples returned.
+            min_overlap (float): Share of an example question's content terms
+                that must appear in the question.
+        Returns:
+            list: Up to k dicts with question, sql and score, best first.
+        """
+        start = time.perf_counter()
+        examples, bm25 = self._index(database)
+        terms = tokenize(question)
+        content = set(terms) - STOP_TERMS
+        found = []
+        for example_id, score in bm25.search(terms, k * 3):
+            example = examples[example_id]
+            example_terms = set(tokenize(example['question'])) - STOP_TERMS
+            if example_terms and len(example_terms & content) / len(example_terms) >= min_overlap:
+                found.append(dict(example, score=round(score, 3)))
+                if len(found) == k:
+                    break
+        with self._lock:
+            self._stats['searches'] += 1
+            self._stats['searches_with_examples'] += int(bool(found))
+            self._stats['seconds'] += time.perf_counter() - start
+        return found
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['examples'] = self._conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+        seconds = stats.pop('seconds')
+        stats['avg_search_ms'] = round(1000 * seconds / stats['searches'], 3) if stats['searches'] else None
+        return stats
+
+
+_example_store = None
+_example_store_lock = threading.Lock()
+
+
+def get_example_store():
+    """Return the process-wide example store."""
+    global _example_store
+    if _example_store is None:
+        with _example_store_lock:
+            if _example_store is None:
+                _example_store = ExampleStore(EXAMPLE_STORE_PATH)
+    return _example_store
+
+
+# Examples for the question being answered, read when the agent prompt is formatted.
+_examples = ContextVar("sql_examples", default=())
+
+
+@contextmanager
+def example_scope(examples):
+    """
+    Make examples available to the SQL agent prompt within this context.
+
+    Args:
+        examples (list): Results of ExampleStore.search().
+    """
+    token = _examples.set(tuple(examples))
+    try:
+        yield
+    finally:
+        _examples.reset(token)
+
+
+def examples_prompt():
+    """Render the examples in scope as a prompt section; empty when there are none."""
+    examples = _examples.get()
+    if not examples:
+        return ""
+    lines = [
+        "Verified examples of questions about this database and the SQL that answered them. "
+        "If one asks the same thing as the question, adapt its SQL instead of exploring the schema:"
+    ]
+    for example in examples:
+        lines.append(f"Example question: {example['question']}\nExample SQL: {example['sql']}")
+    return "\n\n".join(lines) + "\n"
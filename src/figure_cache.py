@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import plotly.io as pio
+from constants import FIGURE_CACHE_MAX_ENTRIES
+from plot_sandbox import PlotCodeError, get_plot_sandbox
+
+# Parsed figures keyed by the sha256 of their JSON, shared by every session.
+_figures = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def figure_key(figure_json):
+    """Content address of a serialized figure."""
+    return hashlib.sha256(figure_json.encode("utf-8")).hexdigest()
+
+
+def _remember(key, figure):
+    with _lock:
+        _figures[key] = figure
+        _figures.move_to_end(key)
+        while len(_figures) > FIGURE_CACHE_MAX_ENTRIES:
+            _figures.popitem(last=False)
+
+
+def load_figure(figure_json):
+    """
+    Return the plotly figure for its JSON, parsing it only the first time it is seen.
+
+    Args:
+        figure_json (str): Figure serialized with Figure.to_json().
+    Returns:
+        Figure: The parsed figure. Treat it as read-only; it is shared.
+    """
+    key = figure_key(figure_json)
+    with _lock:
+        figure = _figures.get(key)
+        if figure is not None:
+            _figures.move_to_end(key)
+            _stats['hits'] += 1
+            return figure
+        _stats['misses'] += 1
+    figure = pio.from_json(figure_json)
+    _remember(key, figure)
+    return figure
+
+
+def figure_from_code(code):
+    """
+    Run generated plotly code once, in the plot sandbox, and serialize the figure it builds.
+
+    Args:
+        code (str): Python code that assigns a plotly figure to `fig`.
+    Returns:
+        str: The figure as JSON.
+    Raises:
+        PlotCodeError: If the code failed, timed out, or did not produce a
+            plotly figure named `fig`.
+    """
+    result = get_plot_sandbox().run(code)
+    if result['error']:
+        raise PlotCodeError(result['error'])
+    if result['figure'] is None:
+        raise PlotCodeError("Generated code did not create a plotly figure named `fig`")
+    return result['figure']
+
+
+def figure_cache_stats():
+    with _lock:
+        return dict(_stats, entries=len(_figures))
@@ -43,3 +43,17 @@ def display_text_with_images(text):
         # Display the image if it exists
         if i < len(image_urls):
             st.image(image_urls[i])
+
+
+def display_result_table(result):
+    """
+    Display a typed query result in a collapsible table.
+    Args:
+        result (QueryResult): The result to display.
+    Returns:
+        None
+    """
+    rows = f"{result.row_count}+" if result.truncated else str(result.row_count)
+    cached = ", cached" if result.cached else ""
+    with st.expander(f"Result table ({rows} rows{cached})"):
+        st.dataframe(result.frame, hide_index=True)
@@ -0,0 +1,237 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+from sqlalchemy import Column, Integer, MetaData, Table, Text
+from constants import (
+    HISTORY_CACHE_MAX_SESSIONS,
+    HISTORY_FLUSH_BATCH_SIZE,
+    HISTORY_FLUSH_INTERVAL,
+    HISTORY_STORE_PATH,
+)
+
+
+# Same layout as SQLChatMessageHistory's table, for mirroring to MySQL
+_mirror_metadata = MetaData()
+_mirror_table = Table(
+    "message_store",
+    _mirror_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("session_id", Text),
+    Column("message", Text),
+)
+
+
+class WriteBehindHistoryStore:
+    """
+    Local chat history store with an in-process read cache and batched writes.
+
+    Messages are appended to the cache and queued; a background thread writes
+    them to a local SQLite database (WAL mode) in batches, and optionally
+    mirrors each batch to the `message_store` table of a MySQL engine. The
+    cache holds the least recently used `max_cached_sessions` sessions with
+    no writes pending; an evicted session is reloaded from SQLite on its next
+    access.
+
+    Args:
+        path (str): SQLite file holding the history.
+        batch_size (int): Maximum messages written per transaction.
+        flush_interval (float): Seconds the writer waits for more messages
+            before flushing a partial batch.
+        max_cached_sessions (int): Sessions whose messages are kept in memory.
+    """
+
+    def __init__(self, path, batch_size=HISTORY_FLUSH_BATCH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL,
+                 max_cached_sessions=HISTORY_CACHE_MAX_SESSIONS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_cached_sessions = max_cached_sessions
+        self._cache = OrderedDict()
+        self._pending = {}  # session_id -> messages queued but not yet written
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._mirrors = {}
+        self._stats = {'queued': 0, 'written': 0, 'batches': 0, 'errors': 0, 'mirrored': 0, 'mirror_errors': 0}
+
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS message_store ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "message TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS message_store_session ON message_store (session_id)")
+        conn.commit()
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def messages(self, session_id):
+        """Return the messages of a session, loading them from disk on first access."""
+        with self._cache_lock:
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                self._cache.move_to_end(session_id)
+                return list(cached)
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute(
+                "SELECT message FROM message_store WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        loaded = messages_from_dict([json.loads(row[0]) for row in rows])
+        with self._cache_lock:
+            # Messages appended while we were reading are already in the cache
+            cached = self._cache.setdefault(session_id, loaded)
+            self._cache.move_to_end(session_id)
+            self._evict()
+            return list(cached)
+
+    def _evict(self):
+        # Sessions with unwritten messages stay, since SQLite does not have them yet
+        while len(self._cache) > self.max_cached_sessions:
+            victim = next((session_id for session_id in self._cache if not self._pending.get(session_id)), None)
+            if victim is None:
+                return
+            del self._cache[victim]
+
+    def append(self, session_id, messages, mirror_engine=None):
+        """Add messages to the cache and queue them for the background writer."""
+        self.messages(session_id)
+        now = time.time()
+        with self._cache_lock:
+            self._cache.setdefault(session_id, []).extend(messages)
+            self._pending[session_id] = self._pending.get(session_id, 0) + len(messages)
+        for message in messages:
+            payload = json.dumps(message_to_dict(message))
+            self._queue.put((session_id, payload, now, mirror_engine))
+        self._stats['queued'] += len(messages)
+
+    def clear(self, session_id):
+        self.flush()
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("DELETE FROM message_store WHERE session_id = ?", (session_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        self.forget(session_id)
+
+    def forget(self, session_id):
+        """Drop a session from the cache, e.g. when its conversation ends; SQLite keeps its messages."""
+        with self._cache_lock:
+            if not self._pending.get(session_id):
+                self._cache.pop(session_id, None)
+
+    def flush(self):
+        """Block until every queued message has been written."""
+        self._queue.join()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany(
+                    "INSERT INTO message_store (session_id, message, created_at) VALUES (?, ?, ?)",
+                    [(session_id, payload, created_at) for session_id, payload, created_at, _ in batch],
+                )
+                conn.commit()
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"Chat history write failed: {str(e)}")
+            try:
+                self._mirror(batch)
+            except Exception as e:
+                self._stats['mirror_errors'] += 1
+                print(f"Chat history mirror failed: {str(e)}")
+            with self._cache_lock:
+                for session_id, _, _, _ in batch:
+                    self._pending[session_id] -= 1
+                    if not self._pending[session_id]:
+                        del self._pending[session_id]
+                self._evict()
+            for _ in batch:
+                self._queue.task_done()
+
+    def _mirror(self, batch):
+        by_engine = {}
+        for session_id, payload, _, engine in batch:
+            if engine is not None:
+                by_engine.setdefault(engine, []).append({"session_id": session_id, "message": payload})
+        for engine, rows in by_engine.items():
+            if engine not in self._mirrors:
+                _mirror_metadata.create_all(engine, checkfirst=True)
+                self._mirrors[engine] = True
+            with engine.begin() as conn:
+                conn.execute(_mirror_table.insert(), rows)
+            self._stats['mirrored'] += len(rows)
+
+    def stats(self):
+        return dict(self._stats, pending=self._queue.qsize(), cached_sessions=len(self._cache))
+
+
+class LocalChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat message history for one session backed by the write-behind store.
+
+    Reads come from the in-process cache and writes return immediately, so the
+    answer path never waits on a database for history.
+
+    Args:
+        session_id (str): Conversation key.
+        mirror_engine (Engine): Optional MySQL engine each flushed batch is copied to.
+    """
+
+    def __init__(self, session_id, mirror_engine=None):
+        self.session_id = session_id
+        self.mirror_engine = mirror_engine
+        self.store = get_history_store()
+
+    @property
+    def messages(self):
+        return self.store.messages(self.session_id)
+
+    def add_messages(self, messages):
+        self.store.append(self.session_id, list(messages), self.mirror_engine)
+
+    def clear(self):
+        self.store.clear(self.session_id)
+
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Return the process-wide history store at HISTORY_STORE_PATH."""
+    global _history_store
+    if _history_store is None:
+        with _history_store_lock:
+            if _history_store is None:
+                _history_store = WriteBehindHistoryStore(HISTORY_STORE_PATH)
+    return _history_store
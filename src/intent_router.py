@@ -0,0 +1,390 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from constants import INTENT_MIN_CONFIDENCE
+from table_index import tokenize
+
+INTENTS = ("chitchat", "schema", "sql", "viz")
+
+# Words that only ever appear in small talk; a message made of nothing else is
+# chitchat. Spelled as tokenize() returns them ("thanks" -> "thank").
+CHITCHAT_WORDS = {
+    "hi", "hello", "hey", "hiya", "yo", "thank", "thx", "cheer", "bye", "goodbye",
+    "ok", "okay", "cool", "great", "nice", "awesome", "good", "morning", "afternoon", "evening",
+    "there", "you", "again", "much", "so", "very", "help", "please", "see", "ya", "later",
+}
+# Any of these asks for a chart, whatever else the request says; without one,
+# a request is never routed to the python agent.
+VIZ_WORDS = {
+    "plot", "chart", "graph", "visualize", "visualise", "visualization", "visualisation",
+    "histogram", "heatmap", "scatter", "pie", "diagram", "barplot", "boxplot", "draw",
+}
+# A schema answer is only given when the request names a part of the schema.
+SCHEMA_WORDS = {
+    "table", "column", "schema", "field", "key", "type", "structure", "database",
+    "definition", "describe", "related", "relationship",
+}
+# Words that ask about the data itself. A request with any of them, or with a
+# table or column name, is never answered from a template or the schema.
+DATA_WORDS = {
+    "null", "empty", "missing", "value", "row", "record", "distinct", "duplicate",
+    "top", "bottom", "total", "sum", "average", "avg", "mean", "median", "max", "maximum",
+    "min", "minimum", "most", "least", "highest", "lowest", "best", "worst", "latest", "recent",
+    "last", "today", "yesterday", "day", "week", "month", "year", "ago", "since", "between",
+}
+# Ask for data when combined with anything but small talk ("find", "show me ...").
+QUERY_WORDS = {"find", "show", "list", "get", "give", "count", "fetch", "select", "return", "compare"}
+
+GREETING_REPLY = """Hello! I am a SQL and Python agent designed to help you with:
+            1. SQL queries and database analysis
+            2. Python data visualization
+            3. General database questions
+
+            To get started with database operations, please configure your database connection in the sidebar.
+            You can also ask me general questions about SQL, Python, or data analysis!
+        """
+THANKS_REPLY = "You're welcome! Ask me anything else about your data."
+GOODBYE_REPLY = "Goodbye! Your conversation stays here if you want to pick it up later."
+
+# Labeled requests the classifier is trained on. benchmarks/bench_intent.py
+# measures it on a separate set; add misrouted phrasings here.
+TRAINING_EXAMPLES = [
+    ("hi", "chitchat"),
+    ("hello there", "chitchat"),
+    ("hey, how are you?", "chitchat"),
+    ("good morning", "chitchat"),
+    ("thanks a lot", "chitchat"),
+    ("thank you, that was helpful", "chitchat"),
+    ("bye", "chitchat"),
+    ("see you later", "chitchat"),
+    ("what can you do", "chitchat"),
+    ("help", "chitchat"),
+    ("who are you", "chitchat"),
+    ("what are you", "chitchat"),
+    ("how do I use this app", "chitchat"),
+    ("how does this work", "chitchat"),
+    ("are you a bot", "chitchat"),
+    ("nice job", "chitchat"),
+    ("that's great, thanks", "chitchat"),
+    ("ok cool", "chitchat"),
+    ("what kind of questions can I ask you", "chitchat"),
+    ("can you help me", "chitchat"),
+    ("what tables are there", "schema"),
+    ("what tables are in the database", "schema"),
+    ("list all tables", "schema"),
+    ("show me the tables", "schema"),
+    ("show tables", "schema"),
+    ("which tables do we have", "schema"),
+    ("how many tables are there", "schema"),
+    ("what columns does the orders table have", "schema"),
+    ("list the columns of users", "schema"),
+    ("describe the products table", "schema"),
+    ("what is the schema of the orders table", "schema"),
+    ("show me the schema", "schema"),
+    ("what fields are in the customers table", "schema"),
+    ("what is the structure of the users table", "schema"),
+    ("which table has the email column", "schema"),
+    ("which table contains the status column", "schema"),
+    ("how are orders and users related", "schema"),
+    ("what are the foreign keys of order items", "schema"),
+    ("what is the primary key of the products table", "schema"),
+    ("what data type is the created at column", "schema"),
+    ("what does the database contain", "schema"),
+    ("describe the database", "schema"),
+    ("what columns are available", "schema"),
+    ("show the table definitions", "schema"),
+    ("how many orders are there", "sql"),
+    ("how many users signed up last month", "sql"),
+    ("what is the total revenue", "sql"),
+    ("what is the average order value", "sql"),
+    ("list the top 10 customers by spend", "sql"),
+    ("show me the top selling products", "sql"),
+    ("show me orders from yesterday", "sql"),
+    ("which users placed more than 5 orders", "sql"),
+    ("what is the return percentage", "sql"),
+    ("find the users whose first name is john", "sql"),
+    ("count orders per status", "sql"),
+    ("revenue by month in 2023", "sql"),
+    ("give me the number of returns per product category", "sql"),
+    ("who are the most valuable customers", "sql"),
+    ("which product has the highest price", "sql"),
+    ("what was the best month for sales", "sql"),
+    ("list all orders with status shipped", "sql"),
+    ("sum of sales by country", "sql"),
+    ("how many products are out of stock", "sql"),
+    ("show the latest 20 orders", "sql"),
+    ("get the email of user 42", "sql"),
+    ("what percentage of orders were returned", "sql"),
+    ("average delivery time per region", "sql"),
+    ("which customers have not ordered this year", "sql"),
+    ("list the customers in germany", "sql"),
+    ("list the orders placed today", "sql"),
+    ("list products cheaper than 20", "sql"),
+    ("average price by category", "sql"),
+    ("number of orders by status", "sql"),
+    ("total quantity sold by product", "sql"),
+    ("how many orders have a null shipping date", "sql"),
+    ("which columns have empty values in users", "sql"),
+    ("which rows have a missing email", "sql"),
+    ("plot revenue by month", "viz"),
+    ("plot the number of orders per status", "viz"),
+    ("draw a bar chart of sales by category", "viz"),
+    ("show a pie chart of users by country", "viz"),
+    ("visualize orders over time", "viz"),
+    ("make a line graph of daily signups", "viz"),
+    ("chart the average order value by month", "viz"),
+    ("histogram of order totals", "viz"),
+    ("create a scatter plot of price versus quantity", "viz"),
+    ("show me a graph of returns per month", "viz"),
+    ("can you plot that", "viz"),
+    ("visualise the top products", "viz"),
+    ("heatmap of orders by weekday and hour", "viz"),
+    ("show the trend of revenue over the year as a chart", "viz"),
+    ("graph it", "viz"),
+    ("draw the distribution of customer ages", "viz"),
+]
+
+
+def features(text):
+    """Unigram and bigram terms of a request."""
+    terms = tokenize(text)
+    return terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+
+
+class IntentClassifier:
+    """
+    Multinomial naive Bayes over unigram and bigram terms.
+
+    Args:
+        examples (list): (text, intent) pairs to train on.
+        alpha (float): Additive smoothing for unseen terms.
+    """
+
+    def __init__(self, examples, alpha=1.0):
+        counts = {intent: Counter() for intent in INTENTS}
+        documents = Counter()
+        for text, intent in examples:
+            counts[intent].update(features(text))
+            documents[intent] += 1
+        self.vocabulary = set().union(*counts.values())
+        self.log_prior = {}
+        self.log_likelihood = {}
+        self.log_unseen = {}
+        for intent in INTENTS:
+            total = sum(counts[intent].values()) + alpha * len(self.vocabulary)
+            self.log_prior[intent] = math.log((documents[intent] + 1) / (len(examples) + len(INTENTS)))
+            self.log_likelihood[intent] = {
+                term: math.log((count + alpha) / total) for term, count in counts[intent].items()
+            }
+            self.log_unseen[intent] = math.log(alpha / total)
+
+    def probabilities(self, text):
+        """
+        Posterior probability of each intent for a request.
+
+        Returns:
+            dict: Intent -> probability; the priors when no term is known.
+        """
+        terms = [term for term in features(text) if term in self.vocabulary]
+        scores = {
+            intent: self.log_prior[intent] + sum(
+                self.log_likelihood[intent].get(term, self.log_unseen[intent]) for term in terms
+            )
+            for intent in INTENTS
+        }
+        top = max(scores.values())
+        weights = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(weights.values())
+        return {intent: weight / total for intent, weight in weights.items()}
+
+
+_classifier = None
+_lock = threading.Lock()
+_stats = {'routed': 0, 'by_rule': 0, 'low_confidence': 0, 'seconds': 0.0, **{intent: 0 for intent in INTENTS}}
+
+
+def get_classifier():
+    """Return the process-wide classifier, trained on first use."""
+    global _classifier
+    with _lock:
+        if _classifier is None:
+            _classifier = IntentClassifier(TRAINING_EXAMPLES)
+        return _classifier
+
+
+def _by_rule(terms):
+    if not terms or all(term in CHITCHAT_WORDS for term in terms):
+        return "chitchat"
+    if any(term in VIZ_WORDS for term in terms):
+        return "viz"
+    return None
+
+
+def _allowed(intent, terms, vocabulary):
+    """Whether the request's words permit a classifier intent other than sql."""
+    asks_for_data = any(term in DATA_WORDS or term in vocabulary or term.isdigit() for term in terms)
+    if intent == "chitchat":
+        return not asks_for_data and not any(term in QUERY_WORDS for term in terms)
+    if intent == "schema":
+        return not any(term in DATA_WORDS or term.isdigit() for term in terms) and any(
+            term in SCHEMA_WORDS for term in terms
+        )
+    # Charts are only drawn when asked for by a chart word, which _by_rule matches
+    return intent == "sql"
+
+
+_vocabularies = {}  # database -> (snapshot, terms of its table and column names)
+
+
+def schema_vocabulary(snapshot):
+    """
+    Terms of a snapshot's table and column names, for route_intent.
+
+    Args:
+        snapshot (SchemaSnapshot): Cached metadata of the selected database.
+    Returns:
+        frozenset: The terms, as tokenize() returns them.
+    """
+    with _lock:
+        cached = _vocabularies.get(snapshot.database)
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+    terms = set()
+    for name, table in snapshot.tables.items():
+        terms.update(tokenize(name))
+        for column in table['columns']:
+            terms.update(tokenize(column['name']))
+    terms = frozenset(terms - CHITCHAT_WORDS)
+    with _lock:
+        _vocabularies[snapshot.database] = (snapshot, terms)
+    return terms
+
+
+def route_intent(question, min_confidence=INTENT_MIN_CONFIDENCE, vocabulary=frozenset()):
+    """
+    Decide how a chat request is answered, without calling an LLM.
+
+    Small talk and chart words are matched by rule; anything else goes to
+    the classifier. Answering a data question from a template or the schema
+    is wrong, while sending anything else to the SQL agent only costs time,
+    so every doubt resolves to sql: chitchat needs a request without data
+    words or names from the schema, schema needs a word such as "table" or
+    "column", and both need min_confidence.
+
+    Args:
+        question (str): The user's message, without conversation context.
+        min_confidence (float): Probability needed to answer locally.
+        vocabulary (frozenset): Terms of the database's table and column
+            names, from schema_vocabulary().
+    Returns:
+        tuple: (intent, confidence), intent being one of INTENTS.
+    """
+    start = time.perf_counter()
+    terms = tokenize(question)
+    rule = _by_rule(terms)
+    if rule is not None:
+        intent, confidence = rule, 1.0
+    else:
+        probabilities = get_classifier().probabilities(question)
+        intent = max(probabilities, key=probabilities.get)
+        confidence = probabilities[intent]
+        if confidence < min_confidence or not _allowed(intent, terms, vocabulary):
+            intent = "sql"
+    with _lock:
+        _stats['routed'] += 1
+        _stats['by_rule'] += int(rule is not None)
+        _stats['low_confidence'] += int(rule is None and confidence < min_confidence)
+        _stats['seconds'] += time.perf_counter() - start
+        _stats[intent] += 1
+    return intent, confidence
+
+
+def router_stats():
+    """
+    Report how requests were routed.
+
+    Returns:
+        dict: Requests per intent, how many were decided by rule or fell back
+            to the SQL agent for low confidence, and mean routing time.
+    """
+    with _lock:
+        stats = dict(_stats)
+    seconds = stats.pop('seconds')
+    stats['avg_ms'] = round(1000 * seconds / stats['routed'], 3) if stats['routed'] else None
+    return stats
+
+
+def chitchat_reply(question):
+    """Answer small talk from a template."""
+    terms = set(tokenize(question))
+    if terms & {"thank", "thx", "cheer"}:
+        return THANKS_REPLY
+    if terms & {"bye", "goodbye", "later"}:
+        return GOODBYE_REPLY
+    return GREETING_REPLY
+
+
+def _mentioned(names, terms):
+    """Names whose every term is in the question, dropping those contained in a longer match."""
+    matches = {name: set(tokenize(name)) for name in names if set(tokenize(name)) <= terms}
+    return sorted(
+        name for name, name_terms in matches.items()
+        if not any(name_terms < other for other in matches.values())
+    )
+
+
+def _describe_table(name, table):
+    primary_key = set(table['primary_key'])
+    lines = [f"**{name}**" + (f": {table['comment']}" if table.get('comment') else "")]
+    for column in table['columns']:
+        notes = ["primary key"] if column['name'] in primary_key else []
+        if column.get('comment'):
+            notes.append(column['comment'])
+        suffix = f" ({', '.join(notes)})" if notes else ""
+        lines.append(f"- `{column['name']}` {column['type']}{suffix}")
+    for fk in table['foreign_keys']:
+        lines.append(
+            f"- `{', '.join(fk['columns'])}` references "
+            f"`{fk['referred_table']}.{', '.join(fk['referred_columns'])}`"
+        )
+    return "\n".join(lines)
+
+
+def answer_schema_question(snapshot, question):
+    """
+    Answer a question about the database's structure from its schema snapshot.
+
+    Tables named in the question are described with their columns and keys;
+    otherwise columns named in it are located; otherwise every table is listed.
+
+    Args:
+        snapshot (SchemaSnapshot): Cached metadata of the selected database.
+        question (str): The user's question.
+    Returns:
+        str: Markdown answer.
+    """
+    terms = set(tokenize(question))
+    tables = _mentioned(snapshot.tables, terms)
+    if tables:
+        return "\n\n".join(_describe_table(name, snapshot.tables[name]) for name in tables)
+
+    columns = {}
+    for name, table in snapshot.tables.items():
+        for column in _mentioned([c['name'] for c in table['columns']], terms):
+            columns.setdefault(column, []).append(name)
+    # Generic names such as "id" would match nearly every table
+    columns = {column: names for column, names in columns.items() if not re.fullmatch(r"id|name", column)}
+    if columns:
+        return "\n".join(
+            f"- `{column}` is in: {', '.join(f'`{name}`' for name in sorted(names))}"
+            for column, names in sorted(columns.items())
+        )
+
+    names = sorted(snapshot.tables)
+    return (
+        f"`{snapshot.database}` has {len(names)} tables:\n"
+        + "\n".join(f"- `{name}` ({len(snapshot.tables[name]['columns'])} columns)" for name in names)
+        + "\n\nAsk about a table by name to see its columns and keys."
+    )
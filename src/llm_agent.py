@@ -1,15 +1,45 @@
-import urllib.parse
+import copy
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+import openai
 from langchain import hub
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.agents import create_sql_agent
 from langchain.agents.agent_types import AgentType
-from langchain.memory import ConversationBufferMemory 
+from langchain.agents.mrkl import prompt as react_prompt
+from langchain.memory import ReadOnlySharedMemory
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_community.chat_message_histories import SQLChatMessageHistory 
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.tools import PythonREPLTool
+from langchain_community.agent_toolkits.sql.prompt import SQL_PREFIX
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.load import dumps, loads
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
+from langchain_core.tools import BaseTool
 from langchain.chat_models import ChatOpenAI
-from constants import LLM_MODEL_NAME
+from constants import (
+    HISTORY_MIRROR_TO_MYSQL,
+    LLM_FAST_MODEL_NAME,
+    LLM_MODEL_NAME,
+    MODEL_TIERING,
+    PROMPT_CACHE_DIR,
+    SQL_AGENT_MODE,
+    TIER_FAST_MAX_TABLES,
+    TIER_FAST_MAX_WORDS,
+    TIER_HISTORY,
+    TIER_MIN_SUCCESS_RATE,
+    TIER_PROBE_EVERY,
+)
+from db_pool import get_engine
+from example_store import database_key, examples_prompt
+from schema_snapshot import SnapshotSQLDatabase, get_schema_snapshot
+from memory import BoundedSummaryMemory, PromptTokenCounter
+from plot_sandbox import PlotCodeError, get_plot_sandbox
+from history_store import LocalChatMessageHistory
+from result_set import collect_results
+from tracing import span
 import streamlit as st
 
 CUSTOM_SUFFIX = """Begin!
@@ -18,6 +48,7 @@ Relevant pieces of previous conversation:
 {chat_history}
 (Note: Only reference this information if it is relevant to the current query.)
 
+{examples}
 Question: {input}
 Thought Process: It is imperative that I do not fabricate information not present in any table or engage in hallucination; maintaining trustworthiness is crucial.
 In SQL queries involving string or TEXT comparisons like first_name, I must use the `LOWER()` function for case-insensitive comparisons and the `LIKE` operator for fuzzy matching. 
@@ -30,6 +61,23 @@ My final response should STRICTLY be the output of SQL query.
 {agent_scratchpad}
 """
 
+SINGLE_SHOT_PROMPT = """You are a {dialect} expert. Given the tables below, write one syntactically correct {dialect} query that answers the question.
+Use only the tables and columns listed. For string or TEXT comparisons like first_name, use the `LOWER()` function and the `LIKE` operator for fuzzy matching.
+Return percentage is defined as total number of returns divided by total number of orders.
+Return only the SQL query, without explanation or markdown.
+
+{table_info}
+
+Relevant pieces of previous conversation:
+{chat_history}
+(Note: Only reference this information if it is relevant to the current query.)
+
+{examples}
+Question: {input}
+SQL query:"""
+
+SQL_AGENT_MODES = ("react", "single_shot")
+
 OPENAI_API_KEY = st.secrets["openai"]["OPENAI_API_KEY"]
 
 langchain_chat_kwargs = {
@@ -89,16 +137,7 @@ def get_agent_llm(agent_llm_name: str):
     return llm_agent
 
 
-def initialize_python_agent(agent_llm_name: str = LLM_MODEL_NAME):
-    """
-    Create an agent for Python-related tasks.
-
-    Args:
-        agent_llm_name (str): The name or identifier of the language model for the agent.
-    Returns:
-        AgentExecutor: An agent executor configured for Python-related tasks.
-    """
-    instructions = """You are an agent designed to write python code to answer questions.
+PYTHON_AGENT_INSTRUCTIONS = """You are an agent designed to write python code to answer questions.
             You have access to a python REPL, which you can use to execute python code.
             If you get an error, debug your code and try again.
             You might know the answer without running any code, but you should still run the code to get the answer.
@@ -109,71 +148,630 @@ def initialize_python_agent(agent_llm_name: str = LLM_MODEL_NAME):
             Return the code <code> in the following
             format ```python <code>```
             """
-    base_prompt = hub.pull("langchain-ai/openai-functions-template")
-    prompt = base_prompt.partial(instructions=instructions)
-    tools = [PythonREPLTool()]
-    agent = create_openai_functions_agent(ChatOpenAI(model=agent_llm_name, temperature=0), tools, prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+
+class SandboxedPythonTool(BaseTool):
+    """
+    Stand-in for PythonREPLTool that runs code in the plot sandbox.
+
+    Keeps the REPL tool's name, so prompts and agents written for it work
+    unchanged, but code runs in a worker process under a time and memory
+    limit instead of in the app, and every run starts from a fresh namespace.
+    """
+
+    name: str = "Python_REPL"
+    description: str = (
+        "A Python shell in a sandboxed process with pandas (pd), numpy (np) and plotly "
+        "(px, go) imported. Each run starts fresh, so include all the code it needs, data "
+        "included. Input should be a valid python command. If you want to see the output "
+        "of a value, you should print it out with `print(...)`."
+    )
+
+    def _run(self, query: str, run_manager=None) -> str:
+        # Strip backticks and a leading "python" the model may wrap around the code
+        query = re.sub(r"^(\s|`)*(?i:python)?\s*", "", query)
+        query = re.sub(r"(\s|`)*$", "", query)
+        try:
+            result = get_plot_sandbox().run(query)
+        except PlotCodeError as e:
+            return f"{type(e).__name__}: {str(e)}"
+        return "\n".join(part for part in (result['output'], result['error']) if part)
+
+
+def _vendored_openai_functions_template():
+    # Copy of langchain-ai/openai-functions-template from the LangChain hub
+    return ChatPromptTemplate.from_messages([
+        ("system", "{instructions}"),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("human", "{input}"),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+
+
+VENDORED_PROMPTS = {
+    "langchain-ai/openai-functions-template": _vendored_openai_functions_template,
+}
+
+_prompts = {}
+_prompts_lock = threading.Lock()
+
+
+def get_hub_prompt(name):
+    """
+    Return a LangChain hub prompt, pulling it over the network at most once.
+
+    Prompts are kept in memory for the process and on disk under
+    PROMPT_CACHE_DIR across restarts. When the hub cannot be reached and
+    nothing is cached, the vendored copy in VENDORED_PROMPTS is used.
+
+    Args:
+        name (str): Hub handle, e.g. "langchain-ai/openai-functions-template".
+    Returns:
+        BasePromptTemplate: The prompt.
+    """
+    prompt = _prompts.get(name)
+    if prompt is not None:
+        return prompt
+    with _prompts_lock:
+        prompt = _prompts.get(name)
+        if prompt is not None:
+            return prompt
+        path = os.path.join(PROMPT_CACHE_DIR, name.replace("/", "__") + ".json")
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    prompt = loads(f.read())
+            except Exception as e:
+                print(f"Ignoring unreadable cached prompt {path}: {str(e)}")
+        if prompt is None:
+            try:
+                prompt = hub.pull(name)
+                os.makedirs(PROMPT_CACHE_DIR, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w") as f:
+                    # input_types holds typing objects, which do not serialize
+                    f.write(dumps(prompt.copy(update={"input_types": {}})))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                if name not in VENDORED_PROMPTS:
+                    raise
+                print(f"Using vendored copy of {name}: {str(e)}")
+                prompt = VENDORED_PROMPTS[name]()
+        _prompts[name] = prompt
+    return prompt
+
+
+_python_agents = {}
+_python_agents_lock = threading.Lock()
+
+
+def initialize_python_agent(agent_llm_name: str = LLM_MODEL_NAME):
+    """
+    Create an agent for Python-related tasks.
+
+    The prompt and the LLM-bound agent are built once per model and shared;
+    each call only wraps them in a new executor. Code the agent runs goes to
+    the plot sandbox's worker processes.
+
+    Args:
+        agent_llm_name (str): The name or identifier of the language model for the agent.
+    Returns:
+        AgentExecutor: An agent executor configured for Python-related tasks.
+    """
+    with _python_agents_lock:
+        agent = _python_agents.get(agent_llm_name)
+        if agent is None:
+            prompt = get_hub_prompt("langchain-ai/openai-functions-template").partial(
+                instructions=PYTHON_AGENT_INSTRUCTIONS
+            )
+            agent = create_openai_functions_agent(get_llm(agent_llm_name), [SandboxedPythonTool()], prompt)
+            _python_agents[agent_llm_name] = agent
+    agent_executor = AgentExecutor(agent=agent, tools=[SandboxedPythonTool()], verbose=True)
     return agent_executor
 
 
-def initialize_sql_agent(db_config):
-    """Initialize SQL agent with proper validation"""
-    required_fields = ['USER', 'PASSWORD', 'HOST', 'DATABASE', 'PORT']
-    
-    # Validate config
-    if not db_config or not isinstance(db_config, dict):
-        raise ValueError("Invalid database configuration")
-        
-    # Check required fields
-    for field in required_fields:
-        if field not in db_config or not db_config[field]:
-            raise ValueError(f"Missing required field: {field}")
-    
-    try:
-        # Initialize LLM first
-        llm = ChatOpenAI(
-            temperature=0,
-            model=LLM_MODEL_NAME,
-            openai_api_key=OPENAI_API_KEY
-        )
-        
-        # Create database connection
-        password = urllib.parse.quote_plus(db_config['PASSWORD'])
-        connection_string = (
-            f"mysql+pymysql://{db_config['USER']}:{password}@"
-            f"{db_config['HOST']}:{db_config['PORT']}/{db_config['DATABASE']}"
+_mode_stats = {}
+_mode_stats_lock = threading.Lock()
+
+
+def _record_mode(mode, llm_calls=0, seconds=None, fallback=False):
+    with _mode_stats_lock:
+        stats = _mode_stats.setdefault(
+            mode, {'questions': 0, 'llm_calls': 0, 'seconds': 0.0, 'fallbacks': 0}
         )
-        
-        db = SQLDatabase.from_uri(connection_string)
-        
+        stats['llm_calls'] += llm_calls
+        stats['fallbacks'] += int(fallback)
+        if seconds is not None:
+            stats['questions'] += 1
+            stats['seconds'] += seconds
+
+
+def agent_mode_stats():
+    """
+    Report LLM calls and latency per SQL agent mode.
+
+    Returns:
+        dict: Mode -> totals plus per-question averages.
+    """
+    with _mode_stats_lock:
+        report = {}
+        for mode, stats in _mode_stats.items():
+            questions = stats['questions'] or 1
+            report[mode] = dict(
+                stats,
+                avg_llm_calls=stats['llm_calls'] / questions,
+                avg_seconds=stats['seconds'] / questions,
+            )
+        return report
+
+
+class ModeStatsHandler(BaseCallbackHandler):
+    """Counts LLM calls and times top-level agent runs for one agent mode."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        _record_mode(self.mode, llm_calls=1)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        _record_mode(self.mode, llm_calls=1)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._started[run_id] = time.perf_counter()
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            _record_mode(self.mode, seconds=time.perf_counter() - started)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+
+_llms = {}
+_llms_lock = threading.Lock()
+
+
+def get_llm(model_name=LLM_MODEL_NAME, mode=None):
+    """
+    Return the process-wide chat model for a model name and agent mode.
+
+    Reusing one client keeps its HTTP connection pool to the API warm across
+    agents, sessions and resets.
+
+    Args:
+        model_name (str): OpenAI model name.
+        mode (str): SQL agent mode whose LLM calls and latency are recorded,
+            or None for models outside the SQL agent.
+    Returns:
+        ChatOpenAI: A streaming chat model with token counting callbacks.
+    """
+    key = (model_name, mode)
+    with _llms_lock:
+        llm = _llms.get(key)
+        if llm is None:
+            callbacks = [PromptTokenCounter()]
+            if mode is not None:
+                callbacks.insert(0, ModeStatsHandler(mode))
+            llm = ChatOpenAI(
+                temperature=0,
+                model=model_name,
+                openai_api_key=OPENAI_API_KEY,
+                streaming=True,
+                callbacks=callbacks
+            )
+            _llms[key] = llm
+    return llm
+
+
+def _extract_sql(text):
+    """Strip markdown fences and labels the model may wrap around a query."""
+    match = re.search(r"```(?:sql)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    if match:
+        text = match.group(1)
+    text = re.sub(r"^\s*(SQL query|SQLQuery|Query)\s*:", "", text, flags=re.IGNORECASE)
+    return text.strip().rstrip(";")
+
+
+class SingleShotSQLAgent:
+    """
+    Answers a question with one LLM call: schema in, SQL out, then runs the SQL directly.
+
+    Falls back to the full ReAct agent when the generated SQL fails to execute.
+    Exposes the same `run` and `invoke` entry points as AgentExecutor.
+
+    Args:
+        llm: Chat model used to write the SQL.
+        db (SQLDatabase): Database the SQL runs against; table info comes from it.
+        memory: Conversation memory shared with the fallback agent.
+        fallback_agent (AgentExecutor): ReAct agent used on execution errors.
+    """
+
+    mode = "single_shot"
+
+    def __init__(self, llm, db, memory, fallback_agent):
+        self.llm = llm
+        self.db = db
+        self.memory = memory
+        self.fallback_agent = fallback_agent
+
+    def invoke(self, inputs, config=None):
+        question = inputs["input"]
+        start = time.perf_counter()
+        try:
+            chat_history = self.memory.load_memory_variables({})["chat_history"]
+            prompt = SINGLE_SHOT_PROMPT.format(
+                dialect=self.db.dialect,
+                table_info=self.db.get_table_info(),
+                chat_history=chat_history,
+                examples=examples_prompt(),
+                input=question,
+            )
+            sql = _extract_sql(self.llm.invoke(prompt, config=config).content)
+            try:
+                result = self.db.run(sql)
+            except Exception as e:
+                print(f"Single-shot SQL failed, falling back to ReAct: {str(e)}")
+                _record_mode(self.mode, fallback=True)
+                return self.fallback_agent.invoke(inputs, config=config)
+            output = result if result else "No results found"
+            self.memory.save_context({"input": question}, {"output": output})
+            return {"input": question, "output": output}
+        finally:
+            _record_mode(self.mode, seconds=time.perf_counter() - start)
+
+    def run(self, question, callbacks=None):
+        config = {"callbacks": callbacks} if callbacks else None
+        return self.invoke({"input": question}, config=config)["output"]
+
+
+MODEL_TIERS = ("fast", "large")
+
+
+class ModelTierPolicy:
+    """
+    Decides which model answers an SQL question and records how each tier did.
+
+    A question goes to the fast tier when it is easy: the agent sees at most
+    `max_tables` tables, it has at most `max_words` words, and the fast tier
+    answered at least `min_success_rate` of its last `history` questions on
+    the database. Once that rate drops, every `probe_every`-th easy question
+    still tries the fast tier so the rate can recover. The rate is trusted
+    only after `min_outcomes` fast answers.
+    """
+
+    def __init__(self, max_tables=TIER_FAST_MAX_TABLES, max_words=TIER_FAST_MAX_WORDS,
+                 min_success_rate=TIER_MIN_SUCCESS_RATE, history=TIER_HISTORY,
+                 probe_every=TIER_PROBE_EVERY, min_outcomes=5):
+        self.max_tables = max_tables
+        self.max_words = max_words
+        self.min_success_rate = min_success_rate
+        self.history = history
+        self.probe_every = probe_every
+        self.min_outcomes = min_outcomes
+        self._lock = threading.Lock()
+        self._outcomes = {}  # database -> deque of fast tier successes
+        self._held_back = {}  # database -> easy questions kept off the fast tier
+        self._routes = {'easy': 0, 'wide_schema': 0, 'long_question': 0, 'low_success_rate': 0, 'probe': 0}
+        self._tiers = {tier: {'questions': 0, 'seconds': 0.0, 'escalations': 0} for tier in MODEL_TIERS}
+
+    def success_rate(self, database):
+        """Fast tier success rate over its recent questions on a database, or None before min_outcomes."""
+        with self._lock:
+            outcomes = self._outcomes.get(database)
+            if not outcomes or len(outcomes) < self.min_outcomes:
+                return None
+            return sum(outcomes) / len(outcomes)
+
+    def choose(self, database, question, table_count):
+        """
+        Pick the tier for a question.
+
+        Args:
+            database (str): Key of the database the question is about.
+            question (str): The question.
+            table_count (int): Tables the agent sees for the question.
+        Returns:
+            tuple: ("fast" or "large", the reason for the choice).
+        """
+        if table_count > self.max_tables:
+            route = "wide_schema"
+        elif len(question.split()) > self.max_words:
+            route = "long_question"
+        else:
+            rate = self.success_rate(database)
+            route = "easy"
+            if rate is not None and rate < self.min_success_rate:
+                with self._lock:
+                    held_back = self._held_back.get(database, 0) + 1
+                    self._held_back[database] = held_back
+                route = "probe" if held_back % self.probe_every == 0 else "low_success_rate"
+        with self._lock:
+            self._routes[route] += 1
+        return ("fast" if route in ("easy", "probe") else "large"), route
+
+    def record(self, database, tier, seconds, escalated=False):
+        """Record one tier's attempt at a question; fast tier attempts feed its success rate."""
+        with self._lock:
+            stats = self._tiers[tier]
+            stats['questions'] += 1
+            stats['seconds'] += seconds
+            stats['escalations'] += int(escalated)
+            if tier == "fast":
+                self._outcomes.setdefault(database, deque(maxlen=self.history)).append(not escalated)
+
+    def stats(self):
+        """
+        Report routing decisions and per-tier latency and escalations.
+
+        Returns:
+            dict: Per tier, the model, questions attempted, total and average
+                seconds, escalations to the large model and escalation rate;
+                plus how many questions took each route and the fast tier's
+                recent success rate per database.
+        """
+        with self._lock:
+            report = {}
+            for tier, stats in self._tiers.items():
+                questions = stats['questions'] or 1
+                report[tier] = dict(
+                    stats,
+                    model=LLM_FAST_MODEL_NAME if tier == "fast" else LLM_MODEL_NAME,
+                    avg_seconds=stats['seconds'] / questions,
+                    escalation_rate=stats['escalations'] / questions,
+                )
+            report['routes'] = dict(self._routes)
+            report['fast_success_rate'] = {
+                database: sum(outcomes) / len(outcomes) for database, outcomes in self._outcomes.items() if outcomes
+            }
+            return report
+
+
+_tier_policy = None
+_tier_policy_lock = threading.Lock()
+
+
+def get_tier_policy():
+    """Return the process-wide model tier policy."""
+    global _tier_policy
+    with _tier_policy_lock:
+        if _tier_policy is None:
+            _tier_policy = ModelTierPolicy()
+        return _tier_policy
+
+
+def model_tier_stats():
+    """
+    Report how SQL questions were split between the fast and large models.
+
+    Returns:
+        dict: See ModelTierPolicy.stats.
+    """
+    return get_tier_policy().stats()
+
+
+def _escalation_reason(results):
+    """Why an answer should be retried on the large model, or None when it stands."""
+    if not results:
+        return "ran no SQL successfully"
+    if results[-1].row_count == 0:
+        return "got an empty result"
+    return None
+
+
+class TieredSQLAgent:
+    """
+    Answers easy questions with a fast model and retries them on the large model.
+
+    The fast agent's answer stands unless none of its SQL executed or its last
+    result was empty; then the question is asked again of the large agent.
+    Questions the policy judges hard go straight to the large agent. Both
+    agents read the conversation memory but only the answer kept is saved.
+    Exposes the same `run` and `invoke` entry points as AgentExecutor.
+
+    Args:
+        fast_agent (AgentExecutor or SingleShotSQLAgent): Agent on LLM_FAST_MODEL_NAME.
+        large_agent (AgentExecutor or SingleShotSQLAgent): Agent on LLM_MODEL_NAME.
+        db (SQLDatabase): Database whose usable tables measure the question's width.
+        memory: Conversation memory.
+        database (str): Key of the database in the policy's success history.
+        policy (ModelTierPolicy): Routing policy; the process-wide one by default.
+    """
+
+    def __init__(self, fast_agent, large_agent, db, memory, database, policy=None):
+        self.fast_agent = fast_agent
+        self.large_agent = large_agent
+        self.db = db
+        self.memory = memory
+        self.database = database
+        self.policy = policy or get_tier_policy()
+
+    def _attempt(self, tier, route, agent, inputs, config):
+        """Run one tier's agent; return its response and why to escalate it, or None."""
+        start = time.perf_counter()
+        response, reason = None, None
+        with span("model_tier", tier=tier, route=route) as attributes, collect_results() as results:
+            try:
+                response = agent.invoke(inputs, config=config)
+                if tier == "fast":
+                    reason = _escalation_reason(results)
+            except openai.OpenAIError as e:
+                # A fast model the API rejects or cannot serve counts as a failed answer
+                if tier != "fast":
+                    raise
+                reason = f"failed: {str(e)}"
+            finally:
+                self.policy.record(self.database, tier, time.perf_counter() - start, escalated=reason is not None)
+            attributes['escalated'] = reason is not None
+        return response, reason
+
+    def invoke(self, inputs, config=None):
+        question = inputs["input"]
+        tier, route = self.policy.choose(self.database, question, len(self.db.get_usable_table_names()))
+        reason = None
+        if tier == "fast":
+            response, reason = self._attempt("fast", route, self.fast_agent, inputs, config)
+            if reason is not None:
+                print(f"Fast model {reason}, retrying on {LLM_MODEL_NAME}")
+        if tier == "large" or reason is not None:
+            route = route if tier == "large" else "escalated"
+            response, _ = self._attempt("large", route, self.large_agent, inputs, config)
+        self.memory.save_context({"input": question}, {"output": response["output"]})
+        return response
+
+    def run(self, question, callbacks=None):
+        config = {"callbacks": callbacks} if callbacks else None
+        return self.invoke({"input": question}, config=config)["output"]
+
+
+def _new_memory(session_id, engine):
+    # History lives in a local write-behind store, off the analysed database
+    message_history = LocalChatMessageHistory(
+        session_id=session_id or uuid.uuid4().hex,
+        mirror_engine=engine if HISTORY_MIRROR_TO_MYSQL else None
+    )
+    return BoundedSummaryMemory(memory_key="chat_history", input_key='input', chat_memory=message_history, return_messages=False)
+
+
+# Per database, mode and model: the snapshot fingerprint the template was built for,
+# the SQLDatabase, and an executor template without memory.
+_sql_agents = {}
+_sql_agents_lock = threading.Lock()
+
+
+def _sql_agent_template(db_config, mode, model_name=LLM_MODEL_NAME):
+    """Build, or reuse while the schema is unchanged, the memory-less SQL agent for a database and model."""
+    engine = get_engine(db_config)
+    snapshot = get_schema_snapshot(db_config)
+    key = (tuple(sorted((k, str(v)) for k, v in db_config.items())), mode, model_name)
+    with _sql_agents_lock:
+        cached = _sql_agents.get(key)
+        if cached is not None and cached[0] == snapshot.fingerprint:
+            return cached[1], cached[2]
+
+        llm = get_llm(model_name, mode)
+        db = SnapshotSQLDatabase(engine, snapshot)
+
         # Create toolkit with LLM
         toolkit = SQLDatabaseToolkit(
             db=db,
             llm=llm
         )
-        
-        message_history = SQLChatMessageHistory(
-            session_id="my-session",
-            connection_string = (
-            f"mysql+pymysql://{db_config['USER']}:{password}@"
-            f"{db_config['HOST']}:{db_config['PORT']}/{db_config['DATABASE']}"), #added recently
-            table_name="message_store",
-            session_id_field_name="session_id"
-        )
-        memory = ConversationBufferMemory(memory_key="chat_history", input_key='input', chat_memory=message_history, return_messages=False) #added recently
 
-        # Create and return agent
-        return create_sql_agent(
+        # The single-shot agent records its own latency, so its fallback executor
+        # must not report questions under the react mode.
+        executor_kwargs = {}
+        if mode == "react":
+            executor_kwargs["callbacks"] = [ModeStatsHandler(mode)]
+
+        # create_sql_agent ignores `suffix` for ReAct agents, so the prompt is
+        # assembled here. Verified examples are filled in when it is formatted.
+        prompt = PromptTemplate.from_template(
+            "\n\n".join([SQL_PREFIX, "{tools}", react_prompt.FORMAT_INSTRUCTIONS, CUSTOM_SUFFIX])
+        ).partial(examples=examples_prompt)
+
+        template = create_sql_agent(
             llm=llm,
             toolkit=toolkit,
             agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            input_variables=["input", "agent_scratchpad", "chat_history"], #added recently
-            suffix=CUSTOM_SUFFIX, #added recently
-            memory=memory, #added recently
-            agent_executor_kwargs={"memory": memory}, #added recently
+            prompt=prompt,
+            agent_executor_kwargs=executor_kwargs, #added recently
             verbose=True,
             handle_parsing_errors=True
         )
+        _sql_agents[key] = (snapshot.fingerprint, db, template)
+        return db, template
+
+
+def _with_memory(agent, memory):
+    """Copy an agent around a different memory; everything else is shared."""
+    if isinstance(agent, TieredSQLAgent):
+        # The tiers only read the memory; the tiered agent saves the answer kept
+        shared = ReadOnlySharedMemory(memory=memory)
+        return TieredSQLAgent(
+            _with_memory(agent.fast_agent, shared), _with_memory(agent.large_agent, shared),
+            agent.db, memory, agent.database, agent.policy,
+        )
+    if isinstance(agent, SingleShotSQLAgent):
+        return SingleShotSQLAgent(agent.llm, agent.db, memory, _with_memory(agent.fallback_agent, memory))
+    # A shallow copy: pydantic's .copy() would drop the excluded callbacks field
+    executor = copy.copy(agent)
+    executor.memory = memory
+    return executor
+
+
+def _mode_agent(db, template, memory, mode, model_name):
+    """The agent for a mode on one model, around the given memory."""
+    react_agent = _with_memory(template, memory)
+    if mode == "single_shot":
+        return SingleShotSQLAgent(get_llm(model_name, mode), db, memory, react_agent)
+    return react_agent
+
+
+def start_new_conversation(agent, session_id):
+    """
+    Give an SQL agent a fresh, empty memory, reusing everything else.
+
+    Args:
+        agent (AgentExecutor, SingleShotSQLAgent or TieredSQLAgent): Agent from initialize_sql_agent.
+        session_id (str): Key of the new conversation's history.
+    Returns:
+        AgentExecutor, SingleShotSQLAgent or TieredSQLAgent: The agent with the new memory.
+    """
+    mirror_engine = agent.memory.chat_memory.mirror_engine
+    return _with_memory(agent, _new_memory(session_id, mirror_engine))
+
+
+def initialize_sql_agent(db_config, mode=SQL_AGENT_MODE, session_id=None):
+    """
+    Initialize SQL agent with proper validation.
+
+    The LLM client, SQLDatabase, toolkit and agent are cached per database,
+    mode and model (rebuilt when the schema snapshot changes); each call only
+    adds a memory for the session. With MODEL_TIERING on, an agent on
+    LLM_FAST_MODEL_NAME answers easy questions first (see TieredSQLAgent).
+
+    Args:
+        db_config (dict): Connection config including DATABASE.
+        mode (str): "react" for the multi-step ReAct agent, or "single_shot" to
+            generate the SQL in one LLM call and fall back to ReAct on errors.
+        session_id (str): Conversation history key, one per browser session.
+            A fresh id is generated when omitted.
+    Returns:
+        AgentExecutor, SingleShotSQLAgent or TieredSQLAgent: The agent for the requested mode.
+    """
+    if mode not in SQL_AGENT_MODES:
+        raise ValueError(f"Unknown SQL agent mode: {mode}")
+
+    # Validate config
+    if not db_config or not isinstance(db_config, dict):
+        raise ValueError("Invalid database configuration")
+
+    # SQLite databases (local fixtures) are addressed by file path alone
+    if db_config.get('DRIVER', '').startswith('sqlite'):
+        required_fields = ['DATABASE']
+    else:
+        required_fields = ['USER', 'PASSWORD', 'HOST', 'DATABASE', 'PORT']
+        
+    # Check required fields
+    for field in required_fields:
+        if field not in db_config or not db_config[field]:
+            raise ValueError(f"Missing required field: {field}")
+    
+    try:
+        db, template = _sql_agent_template(db_config, mode)
+        memory = _new_memory(session_id, get_engine(db_config))
+        if not MODEL_TIERING or LLM_FAST_MODEL_NAME == LLM_MODEL_NAME:
+            return _mode_agent(db, template, memory, mode, LLM_MODEL_NAME)
+        fast_db, fast_template = _sql_agent_template(db_config, mode, LLM_FAST_MODEL_NAME)
+        shared = ReadOnlySharedMemory(memory=memory)
+        return TieredSQLAgent(
+            _mode_agent(fast_db, fast_template, shared, mode, LLM_FAST_MODEL_NAME),
+            _mode_agent(db, template, shared, mode, LLM_MODEL_NAME),
+            db, memory, database_key(db_config),
+        )
     except Exception as e:
         raise ValueError(f"Failed to initialize SQL agent: {str(e)}")
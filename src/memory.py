@@ -0,0 +1,154 @@
+import threading
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import get_buffer_string
+from langchain_core.pydantic_v1 import Field
+from constants import (
+    MEMORY_MAX_TURNS,
+    MEMORY_SUMMARY_MAX_TOKENS,
+    MEMORY_TOKEN_BUDGET,
+)
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Count tokens with the cl100k_base encoding, or estimate at ~4 characters
+    per token when tiktoken or its encoding file is unavailable.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def clip_tokens(text, max_tokens):
+    """Cut text to its first max_tokens tokens, marking the cut with an ellipsis."""
+    count_tokens("")  # loads the encoding
+    if _encoding:
+        tokens = _encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return _encoding.decode(tokens[:max_tokens]) + " …"
+    if len(text) <= 4 * max_tokens:
+        return text
+    return text[:4 * max_tokens] + " …"
+
+
+def _clip_words(text, words):
+    parts = text.split()
+    clipped = " ".join(parts[:words])
+    return clipped + " …" if len(parts) > words else clipped
+
+
+class BoundedSummaryMemory(BaseChatMemory):
+    """
+    Chat memory that keeps recent turns verbatim under a token budget.
+
+    The last `max_turns` turns are injected as-is as long as they fit in
+    `token_budget`. Older turns are folded, without an LLM call, into a rolling
+    summary of one clipped question/answer line per turn, itself capped at
+    `summary_max_tokens` by dropping its oldest lines.
+    """
+
+    memory_key: str = "chat_history"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    max_turns: int = MEMORY_MAX_TURNS
+    token_budget: int = MEMORY_TOKEN_BUDGET
+    summary_max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS
+    summary_lines: list = Field(default_factory=list)
+    summarized_messages: int = 0
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def _fold_into_summary(self, messages):
+        for i in range(0, len(messages) - 1, 2):
+            question = _clip_words(messages[i].content, 15)
+            answer = _clip_words(messages[i + 1].content, 25)
+            self.summary_lines.append(f"- Q: {question} -> A: {answer}")
+        while self.summary_lines and count_tokens("\n".join(self.summary_lines)) > self.summary_max_tokens:
+            self.summary_lines.pop(0)
+
+    def load_memory_variables(self, inputs):
+        messages = self.chat_memory.messages
+        # Walk back from the newest turn, keeping whole turns while they fit
+        kept_from = len(messages)
+        used_tokens = 0
+        turns = 0
+        while kept_from >= 2 and turns < self.max_turns:
+            turn_tokens = count_tokens(
+                get_buffer_string(messages[kept_from - 2:kept_from], self.human_prefix, self.ai_prefix)
+            )
+            if used_tokens + turn_tokens > self.token_budget:
+                break
+            used_tokens += turn_tokens
+            kept_from -= 2
+            turns += 1
+
+        if kept_from > self.summarized_messages:
+            self._fold_into_summary(messages[self.summarized_messages:kept_from])
+            self.summarized_messages = kept_from
+
+        recent = messages[kept_from:]
+        if self.return_messages:
+            return {self.memory_key: recent}
+        buffer = get_buffer_string(recent, self.human_prefix, self.ai_prefix)
+        if self.summary_lines:
+            summary = "Summary of earlier conversation:\n" + "\n".join(self.summary_lines)
+            buffer = f"{summary}\n\n{buffer}" if buffer else summary
+        return {self.memory_key: buffer}
+
+    def clear(self):
+        super().clear()
+        self.summary_lines = []
+        self.summarized_messages = 0
+
+
+_prompt_tokens_lock = threading.Lock()
+_prompt_tokens = {'calls': 0, 'total': 0, 'last': 0, 'max': 0}
+
+
+def prompt_token_stats():
+    """
+    Report prompt sizes across LLM calls.
+
+    Returns:
+        dict: Call count and last, average and max prompt tokens per call.
+    """
+    with _prompt_tokens_lock:
+        calls = _prompt_tokens['calls']
+        return {
+            'calls': calls,
+            'last': _prompt_tokens['last'],
+            'avg': _prompt_tokens['total'] / calls if calls else 0,
+            'max': _prompt_tokens['max'],
+        }
+
+
+class PromptTokenCounter(BaseCallbackHandler):
+    """Counts the tokens of every prompt sent to the LLM."""
+
+    def _record(self, tokens):
+        with _prompt_tokens_lock:
+            _prompt_tokens['calls'] += 1
+            _prompt_tokens['total'] += tokens
+            _prompt_tokens['last'] = tokens
+            _prompt_tokens['max'] = max(_prompt_tokens['max'], tokens)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        for prompt in prompts:
+            self._record(count_tokens(prompt))
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        for message_list in messages:
+            self._record(count_tokens(get_buffer_string(message_list)))
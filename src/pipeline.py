@@ -0,0 +1,217 @@
+import unidecode
+from langchain_core.callbacks import BaseCallbackHandler
+from answer_cache import get_answer_cache, make_cache_key
+from chart_aggregation import aggregate_for_chart, chart_aggregation_stats
+from chart_planner import build_figure, plan_chart
+from db_pool import get_engine
+from example_store import database_key, example_scope, get_example_store
+from figure_cache import figure_cache_stats
+from helper import display_code_plots
+from history_store import get_history_store
+from intent_router import answer_schema_question, chitchat_reply, router_stats
+from llm_agent import initialize_python_agent, model_tier_stats
+from memory import prompt_token_stats
+from plot_sandbox import plot_sandbox_stats
+from query_cache import query_cache_stats
+from resilience import resilience_stats
+from result_set import collect_results, observation_stats
+from schema_snapshot import get_schema_snapshot, table_scope
+from sql_guard import guard_stats
+from streaming import ttft_stats
+from table_index import get_table_index
+from tracing import TracingHandler, record_error, register_stats, span
+
+NOT_CONNECTED = "Please configure and connect to a database using the sidebar before running queries."
+SQL_FAILED = "Failed to execute SQL query. Ensure you have enough OpenAI API credits. This is most likely to be the issue."
+
+
+
+class RequestCancelled(Exception):
+    """Raised from an agent callback to stop a request whose caller has gone."""
+
+
+class RunHealthHandler(BaseCallbackHandler):
+    """
+    Counts failures during an agent run, so answers built around them are not cached.
+
+    SQL tools report database errors (including an open circuit breaker) as
+    an "Error: ..." observation rather than raising, so tool outputs are
+    checked as well as tool and LLM errors.
+    """
+
+    def __init__(self):
+        self.errors = 0
+
+    def on_tool_end(self, output, **kwargs):
+        if str(output).startswith("Error:"):
+            self.errors += 1
+
+    def on_tool_error(self, error, **kwargs):
+        self.errors += 1
+
+    def on_llm_error(self, error, **kwargs):
+        self.errors += 1
+
+
+def _completed(health, output):
+    """Whether an agent run finished without errors or hitting its iteration or time limit."""
+    return health.errors == 0 and not str(output).startswith("Agent stopped due to")
+
+
+# The SQL agent's answer carries no data to plot
+NO_DATA_KEYWORDS = ["please provide", "don't know", "more context",
+                    "provide more", "vague request", "no results"]
+
+
+def generate_response(session, code_type, input_text, callbacks=None, question=None):
+    """
+    Generate responses for both general and database-specific queries.
+
+    The session is any object with db_config, sql_agent, python_agent and
+    schema_fingerprint attributes: Streamlit's session state in the app, an
+    api.Session in the HTTP service. A python agent is built on it on the
+    first plot request.
+
+    Args:
+        session: Per-conversation state, as above.
+        code_type (str): "sql" for a text answer, "python" for plot code.
+        input_text (str): The user question, with any previous context appended.
+        callbacks (list): LangChain callback handlers, e.g. for streaming into the chat.
+        question (str): The user question without previous context, used to
+            retrieve verified examples. Defaults to input_text.
+    Returns:
+        str or dict: The answer text for "sql"; for "python" a dict with either
+            a planned "figure" (JSON) or the python agent's "output", or a
+            message string when no plot could be made.
+    """
+    # Check if database is configured
+    if not getattr(session, 'sql_agent', None):
+        return NOT_CONNECTED
+
+    # LLM calls, tokens and tool runs are recorded on the caller's request trace
+    health = RunHealthHandler()
+    callbacks = list(callbacks or []) + [TracingHandler(), health]
+    run_config = {"callbacks": callbacks}
+
+    # Sanitize input
+    local_prompt = unidecode.unidecode(input_text)
+
+    # Repeat questions against an unchanged schema are answered from the cache
+    answer_cache = get_answer_cache()
+    cache_key = make_cache_key(
+        code_type,
+        local_prompt,
+        session.db_config['DATABASE'],
+        getattr(session, 'schema_fingerprint', None),
+    )
+    with span("answer_cache") as attributes:
+        cached = answer_cache.get(cache_key)
+        attributes['hit'] = cached is not None
+    if cached is not None:
+        return cached
+
+    # Only the tables relevant to the question are exposed to the agent's tools
+    with span("table_selection") as attributes:
+        relevant_tables = get_table_index(session.db_config).select_tables(local_prompt)
+        attributes['tables'] = len(relevant_tables) if relevant_tables else None
+
+    # Verified question -> SQL pairs close to the question go into the agent prompt
+    with span("example_retrieval") as attributes:
+        examples = get_example_store().search(
+            database_key(session.db_config),
+            unidecode.unidecode(question) if question else local_prompt,
+        )
+        attributes['examples'] = len(examples)
+
+    if code_type == "python":
+        try:
+            # First get SQL query result
+            with span("sql_agent"), table_scope(relevant_tables), example_scope(examples), collect_results() as results:
+                sql_response = session.sql_agent.invoke({"input": local_prompt}, config=run_config)
+            if not sql_response or 'output' not in sql_response:
+                return "Failed to get SQL query results"
+
+            local_response = sql_response['output']
+            print("SQL Response->", local_response)
+
+            # Check for invalid/error responses
+            if any(keyword in local_response.lower() for keyword in NO_DATA_KEYWORDS):
+                return "Unable to generate visualization - no valid data returned from query"
+
+            # Chart the typed result directly when the planner can express the request
+            frame = results[-1].frame if results else None
+            with span("chart_plan") as attributes:
+                spec = plan_chart(frame, local_prompt)
+                attributes['planned'] = spec is not None
+                figure = None
+                if spec is not None:
+                    # Large results are aggregated by the database, then capped in points
+                    spec, frame = aggregate_for_chart(get_engine(session.db_config), results[-1], spec)
+                    figure = build_figure(spec, frame).to_json()
+            if figure is not None:
+                if _completed(health, local_response):
+                    answer_cache.put(cache_key, {"figure": figure})
+                return {"figure": figure}
+
+            # Otherwise have the python agent write the plot, from rows spread
+            # over the result rather than the summary the SQL agent saw of it
+            data = results[-1].preview_text(spread=True) if results else local_response
+            viz_prompt = {"input": "Write code in python to plot the following data\n\n" + data}
+            if getattr(session, 'python_agent', None) is None:
+                with span("initialize_python_agent"):
+                    session.python_agent = initialize_python_agent()
+            with span("python_agent"):
+                viz_response = session.python_agent.invoke(viz_prompt, config=run_config)
+            # Only replies with plot code to run are worth replaying
+            if _completed(health, viz_response["output"]) and display_code_plots(viz_response["output"]):
+                answer_cache.put(cache_key, {"output": viz_response["output"]})
+            return viz_response
+
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            record_error(e)
+            print(f"Error generating response: {str(e)}")
+            return "Failed to generate visualization"
+
+    else:  # SQL query
+        try:
+            with span("sql_agent"), table_scope(relevant_tables), example_scope(examples):
+                response = session.sql_agent.run(local_prompt, callbacks=callbacks)
+            if _completed(health, response):
+                answer_cache.put(cache_key, response)
+            return response
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            record_error(e)
+            print(f"SQL query error: {str(e)}")
+            return SQL_FAILED
+
+
+def answer_locally(session, intent, question):
+    """Answer small talk from templates and schema questions from the cached snapshot."""
+    if intent == "chitchat":
+        return chitchat_reply(question)
+    # Schema answers need only the snapshot, not an agent
+    if not getattr(session, 'db_config', None) or not session.db_config.get('DATABASE'):
+        return NOT_CONNECTED
+    return answer_schema_question(get_schema_snapshot(session.db_config), question)
+
+
+def register_component_stats():
+    """Export component stats alongside the request metrics."""
+    register_stats("answer_cache", lambda: get_answer_cache().stats())
+    register_stats("query_cache", query_cache_stats)
+    register_stats("figure_cache", figure_cache_stats)
+    register_stats("time_to_first_token", ttft_stats)
+    register_stats("prompt_tokens", prompt_token_stats)
+    register_stats("chat_history", lambda: get_history_store().stats())
+    register_stats("sql_guard", guard_stats)
+    register_stats("db_resilience", resilience_stats)
+    register_stats("intent_router", router_stats)
+    register_stats("example_store", lambda: get_example_store().stats())
+    register_stats("plot_sandbox", plot_sandbox_stats)
+    register_stats("agent_observations", observation_stats)
+    register_stats("chart_aggregation", chart_aggregation_stats)
+    register_stats("model_tiers", model_tier_stats)
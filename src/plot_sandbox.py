@@ -0,0 +1,249 @@
+import contextlib
+import io
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+from constants import (
+    PLOT_SANDBOX_MAX_OUTPUT_CHARS,
+    PLOT_SANDBOX_MEMORY_MB,
+    PLOT_SANDBOX_QUEUE_TIMEOUT_SECONDS,
+    PLOT_SANDBOX_START_TIMEOUT_SECONDS,
+    PLOT_SANDBOX_TIMEOUT_SECONDS,
+    PLOT_SANDBOX_WORKERS,
+)
+
+# Started as `python -c` so the worker does not re-run the parent's __main__,
+# which under Streamlit is the app script
+_WORKER_BOOTSTRAP = (
+    "import sys; sys.path.insert(0, sys.argv[1]); import plot_sandbox; "
+    "plot_sandbox._worker_main(int(sys.argv[2]), int(sys.argv[3]))"
+)
+
+# Environment variables workers inherit; everything else (API keys, database
+# credentials) stays out of reach of the code they run.
+_WORKER_ENV = ("PATH", "PYTHONPATH", "PYTHONHOME", "LANG", "LANGUAGE", "TZ", "TMPDIR")
+
+
+class PlotCodeError(Exception):
+    """Generated code failed, or did not build a figure when one was required."""
+
+
+class PlotCodeTimeout(PlotCodeError):
+    """Generated code ran past the time limit and its worker was killed."""
+
+
+def _limit_memory(memory_bytes):
+    try:
+        import resource
+    except ImportError:
+        # No rlimits on this platform; the timeout still applies
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def _execute(code):
+    import plotly.graph_objects as go
+    namespace = {}
+    stdout = io.StringIO()
+    error = None
+    try:
+        with contextlib.redirect_stdout(stdout):
+            exec("import pandas as pd\nimport numpy as np\nimport plotly.express as px\n"
+                 "import plotly.graph_objects as go\n" + code, namespace)
+    except BaseException as e:  # includes SystemExit from exit() and MemoryError
+        error = f"{type(e).__name__}: {e}"
+    figure = namespace.get("fig")
+    return {
+        'output': stdout.getvalue()[-PLOT_SANDBOX_MAX_OUTPUT_CHARS:],
+        'error': error,
+        'figure': figure.to_json() if error is None and isinstance(figure, go.Figure) else None,
+    }
+
+
+def _worker_main(fd, memory_bytes):
+    conn = Connection(fd)
+    _limit_memory(memory_bytes)
+    import pandas  # noqa: F401
+    import plotly.express  # noqa: F401
+    import plotly.graph_objects as go
+    # Generated code ends with fig.show(); there is no browser to open here
+    go.Figure.show = lambda self, *args, **kwargs: None
+    conn.send("ready")
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            return
+        conn.send(_execute(code))
+
+
+class PlotSandbox:
+    """
+    Pre-warmed pool of worker processes that run generated plot code.
+
+    Each worker has pandas, numpy and plotly imported and an address-space
+    cap of memory_mb. A run that exceeds the timeout has its worker killed;
+    a replacement is started in the background. Workers are fresh
+    interpreters talking to the app over a socket pair (POSIX only), so the
+    app's threads, connections and __main__ script are not carried over, and
+    they get only a minimal environment (see _WORKER_ENV).
+
+    Args:
+        workers (int): Worker processes kept running.
+        timeout (float): Wall-clock seconds a run may take.
+        memory_mb (int): Address-space limit per worker.
+        queue_timeout (float): Seconds a run may wait for a free worker.
+        start_timeout (float): Seconds a new worker may take to become ready.
+    """
+
+    def __init__(self, workers=PLOT_SANDBOX_WORKERS, timeout=PLOT_SANDBOX_TIMEOUT_SECONDS,
+                 memory_mb=PLOT_SANDBOX_MEMORY_MB, queue_timeout=PLOT_SANDBOX_QUEUE_TIMEOUT_SECONDS,
+                 start_timeout=PLOT_SANDBOX_START_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.queue_timeout = queue_timeout
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'errors': 0, 'timeouts': 0, 'crashes': 0, 'kills': 0,
+                       'workers_started': 0, 'start_failures': 0, 'queue_depth': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+        for _ in range(workers):
+            self._replace()
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def _start_worker(self):
+        parent, child = socket.socketpair()
+        env = {name: value for name, value in os.environ.items() if name in _WORKER_ENV or name.startswith("LC_")}
+        # One BLAS thread: thread stacks and buffers would eat into the address space cap
+        env.update(OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1", MKL_NUM_THREADS="1")
+        try:
+            process = subprocess.Popen(
+                [sys.executable, "-c", _WORKER_BOOTSTRAP, os.path.dirname(os.path.abspath(__file__)),
+                 str(child.fileno()), str(self.memory_bytes)],
+                pass_fds=(child.fileno(),), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, env=env,
+            )
+        finally:
+            child.close()
+        conn = Connection(parent.detach())
+        try:
+            # A worker stuck importing would otherwise hold this thread forever
+            if not conn.poll(self.start_timeout) or conn.recv() != "ready":
+                raise PlotCodeError("Sandbox worker failed to start")
+        except (PlotCodeError, EOFError, OSError):
+            process.kill()
+            process.wait()
+            conn.close()
+            self._count(start_failures=1)
+            raise
+        self._count(workers_started=1)
+        return process, conn
+
+    def _replace(self):
+        """Start a worker in the background and add it to the pool once it is ready."""
+        def start():
+            try:
+                self._idle.put(self._start_worker())
+            except Exception as e:
+                print(f"Failed to start plot sandbox worker: {e!r}")
+        threading.Thread(target=start, name="plot-sandbox-start", daemon=True).start()
+
+    def _kill(self, process, conn):
+        process.kill()
+        process.wait()
+        conn.close()
+        self._count(kills=1)
+        self._replace()
+
+    def _checkout(self):
+        with self._lock:
+            self._stats['queue_depth'] += 1
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while True:
+                try:
+                    process, conn = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise PlotCodeError("No plot sandbox worker became free in time")
+                if process.poll() is None:
+                    return process, conn
+                # Died while idle, e.g. killed by the OS
+                conn.close()
+                self._count(crashes=1)
+                self._replace()
+        finally:
+            with self._lock:
+                self._stats['queue_depth'] -= 1
+
+    def run(self, code):
+        """
+        Run code in a worker.
+
+        Returns:
+            dict: 'output' (captured stdout, tail only), 'error' (exception
+                text or None) and 'figure' (JSON of a plotly figure named
+                `fig`, or None).
+        Raises:
+            PlotCodeTimeout: If the run took longer than the timeout.
+            PlotCodeError: If no worker was free in time or the worker died.
+        """
+        process, conn = self._checkout()
+        start = time.perf_counter()
+        try:
+            conn.send(code)
+            if not conn.poll(self.timeout):
+                self._kill(process, conn)
+                self._count(timeouts=1)
+                raise PlotCodeTimeout(f"Plot code ran longer than {self.timeout} seconds")
+            result = conn.recv()
+        except (EOFError, OSError) as e:
+            self._kill(process, conn)
+            self._count(crashes=1)
+            raise PlotCodeError(f"Plot sandbox worker died: {str(e) or type(e).__name__}")
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._stats['runs'] += 1
+                self._stats['seconds'] += seconds
+                self._stats['max_seconds'] = max(self._stats['max_seconds'], seconds)
+        self._idle.put((process, conn))
+        if result['error']:
+            self._count(errors=1)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop('seconds')
+        stats['idle_workers'] = self._idle.qsize()
+        stats['avg_seconds'] = round(seconds / stats['runs'], 4) if stats['runs'] else None
+        stats['max_seconds'] = round(stats['max_seconds'], 4)
+        return stats
+
+
+_plot_sandbox = None
+_plot_sandbox_lock = threading.Lock()
+
+
+def get_plot_sandbox():
+    """Return the process-wide plot sandbox, starting its workers on first use."""
+    global _plot_sandbox
+    if _plot_sandbox is None:
+        with _plot_sandbox_lock:
+            if _plot_sandbox is None:
+                _plot_sandbox = PlotSandbox()
+    return _plot_sandbox
+
+
+def plot_sandbox_stats():
+    """Report the plot sandbox's stats; empty until it has been started."""
+    sandbox = _plot_sandbox
+    return sandbox.stats() if sandbox is not None else {}
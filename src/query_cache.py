@@ -0,0 +1,396 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import pandas as pd
+from sqlalchemy import bindparam, exc, text
+from answer_cache import InMemoryBackend, SQLiteBackend
+from constants import (
+    QUERY_CACHE_BACKEND,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_MAX_ROWS,
+    QUERY_CACHE_PATH,
+    QUERY_CACHE_VERSION_COST_FACTOR,
+    QUERY_CACHE_VERSION_TTL,
+)
+from resilience import call_with_retry
+from sql_guard import is_read_statement
+
+# String literals, comments, (possibly qualified and quoted) identifiers, then any other character.
+_TOKEN = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\""
+    r"|/\*.*?\*/|--[^\n]*|#[^\n]*"
+    r"|(?:`[^`]*`|\w+)(?:\s*\.\s*(?:`[^`]*`|\w+))*"
+    r"|\S",
+    re.DOTALL,
+)
+_COMMENT = re.compile(r"/\*|--|#")
+
+# Keywords are case-folded when normalizing; identifiers keep their case
+# because MySQL table names can be case-sensitive.
+_KEYWORDS = {
+    "select", "distinct", "from", "where", "join", "inner", "left", "right", "full", "outer",
+    "cross", "natural", "straight_join", "on", "using", "group", "by", "order", "having", "limit",
+    "offset", "as", "and", "or", "not", "in", "is", "null", "like", "between", "exists", "case",
+    "when", "then", "else", "end", "union", "all", "asc", "desc", "with", "recursive", "window",
+    "over", "partition", "count", "sum", "avg", "min", "max", "cast", "lower", "upper", "for",
+    "lock", "share", "mode", "update", "into", "values", "set",
+}
+
+# Functions whose value changes between runs of the same statement.
+_VOLATILE = {
+    "now", "curdate", "curtime", "current_date", "current_time", "current_timestamp", "sysdate",
+    "localtime", "localtimestamp", "utc_date", "utc_time", "utc_timestamp", "unix_timestamp",
+    "rand", "random", "uuid", "uuid_short", "last_insert_id", "connection_id", "found_rows",
+    "row_count", "sleep", "user", "current_user", "session_user", "'now'", "\"now\"",
+}
+
+
+def _tokens(sql):
+    return [token for token in _TOKEN.findall(sql) if not _COMMENT.match(token)]
+
+
+def _is_word(token):
+    return token[0] == "`" or token[0] == "\"" or token[0].isalnum() or token[0] == "_"
+
+
+def _identifier(token):
+    """Unquote a possibly qualified identifier: '`db` . `t`' -> 'db.t'."""
+    return ".".join(part.strip().strip("`\"") for part in re.split(r"\s*\.\s*", token))
+
+
+def normalize_sql(sql):
+    """
+    Fold a statement into the form used as its cache key.
+
+    Comments and trailing semicolons are dropped, whitespace is collapsed and
+    keywords are lower-cased; literals and identifiers are kept as written.
+
+    Returns:
+        str: The normalized statement.
+    """
+    tokens = _tokens(sql)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(token.lower() if token.lower() in _KEYWORDS else token for token in tokens)
+
+
+def referenced_tables(sql, database=None):
+    """
+    Find the tables a SELECT reads, from its FROM and JOIN clauses.
+
+    Names defined by a WITH clause are left out; names qualified with another
+    database keep their qualifier.
+
+    Args:
+        sql (str): The statement.
+        database (str): The connection's database, stripped from qualified names.
+    Returns:
+        set: Table names as written in the statement.
+    """
+    tokens = _tokens(sql)
+    lower = [token.lower() for token in tokens]
+    ctes = {
+        _identifier(tokens[i - 1])
+        for i in range(2, len(tokens) - 1)
+        if lower[i] == "as" and tokens[i + 1] == "(" and lower[i - 2] in ("with", "recursive", ",")
+    }
+    tables = set()
+    for i, token in enumerate(lower):
+        if token not in ("from", "join"):
+            continue
+        j = i + 1
+        while j < len(tokens) and _is_word(tokens[j]) and lower[j] not in _KEYWORDS:
+            name = _identifier(tokens[j])
+            if database and name.lower().startswith(database.lower() + "."):
+                name = name[len(database) + 1:]
+            if name not in ctes:
+                tables.add(name)
+            j += 1
+            # Skip an alias
+            if j < len(tokens) and lower[j] == "as":
+                j += 2
+            elif j < len(tokens) and _is_word(tokens[j]) and lower[j] not in _KEYWORDS:
+                j += 1
+            if token != "from" or j >= len(tokens) or tokens[j] != ",":
+                break
+            j += 1
+    return tables
+
+
+def is_volatile(sql):
+    """Whether a statement calls a function whose result changes between runs."""
+    return any(token.lower() in _VOLATILE for token in _tokens(sql))
+
+
+def _read_catalog(engine, names):
+    """
+    Read a version marker for the named tables of the engine's database.
+
+    MySQL: UPDATE_TIME and TABLE_ROWS from information_schema for just those
+    tables, with the statistics cache disabled for the read (MySQL 8
+    otherwise serves them up to a day old) and the connection's setting put
+    back afterwards. SQLite: the database and WAL files' mtime and size,
+    shared by all tables. UPDATE_TIME has one-second resolution, so a change
+    that keeps the row count within the second a result was cached can be
+    missed; writes made through this process are tracked separately. Views
+    take a version derived from every table's, which needs one read of the
+    whole schema.
+
+    Args:
+        engine (Engine): The database.
+        names (list): Table names as written in a statement.
+    Returns:
+        dict: Lower-cased table name -> version string for the names that
+            exist, or None when the dialect offers no cheap version marker.
+    """
+    wanted = {name.lower() for name in names}
+    if engine.dialect.name == "sqlite":
+        path = engine.url.database
+        if not path or path == ":memory:":
+            return None
+        version = ":".join(
+            f"{stat.st_mtime_ns}-{stat.st_size}"
+            for stat in (os.stat(p) for p in (path, path + "-wal") if os.path.exists(p))
+        )
+        with engine.connect() as conn:
+            tables = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars().all()
+        return {table.lower(): version for table in tables if table.lower() in wanted}
+    if engine.dialect.name != "mysql":
+        return None
+    query = (
+        "SELECT TABLE_NAME, TABLE_TYPE, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE()"
+    )
+    with engine.connect() as conn:
+        try:
+            expiry = conn.execute(text("SELECT @@SESSION.information_schema_stats_expiry")).scalar()
+            conn.execute(text("SET SESSION information_schema_stats_expiry = 0"))
+        except exc.DBAPIError:
+            # MariaDB and MySQL 5.7 have no statistics cache
+            expiry = None
+        try:
+            rows = conn.execute(
+                text(f"{query} AND TABLE_NAME IN :names").bindparams(bindparam("names", expanding=True)),
+                {"names": sorted(set(names))},
+            ).fetchall()
+            views = [name for name, table_type, _, _ in rows if table_type == "VIEW"]
+            if views:
+                rows = conn.execute(text(f"{query} AND TABLE_TYPE = 'BASE TABLE'")).fetchall()
+        finally:
+            if expiry is not None:
+                conn.execute(text("SET SESSION information_schema_stats_expiry = :expiry"), {"expiry": expiry})
+    catalog = {
+        name.lower(): f"{update_time}:{table_rows}"
+        for name, table_type, update_time, table_rows in rows if table_type == "BASE TABLE"
+    }
+    if views:
+        # A view changes whenever any table does; its own catalog row never does
+        everything = hashlib.sha256("|".join(sorted(catalog.values())).encode("utf-8")).hexdigest()
+        catalog.update({name.lower(): everything for name in views})
+    return {name: version for name, version in catalog.items() if name in wanted}
+
+
+def _encode(entry):
+    frame = entry['frame']
+    return dict(
+        entry,
+        frame=frame.to_json(orient="split", date_format="iso", date_unit="ns", index=False),
+        dtypes=[str(dtype) for dtype in frame.dtypes],
+    )
+
+
+def _decode(value):
+    frame = pd.read_json(io.StringIO(value['frame']), orient="split", dtype=False, convert_dates=False)
+    for position, dtype in enumerate(value['dtypes']):
+        if dtype != "object":
+            frame.isetitem(position, frame.iloc[:, position].astype(dtype))
+    return dict(value, frame=frame)
+
+
+class QueryCache:
+    """
+    Results of read statements, shared by every session of the process.
+
+    An entry records the version of each table its statement reads and is
+    discarded once any of them changes: on the server (see _read_catalog) or
+    through a write statement run by this process. Statements that read
+    unknown relations (e.g. in other databases) or call volatile functions
+    such as NOW() are not cached.
+
+    Args:
+        backend: An answer_cache InMemoryBackend or SQLiteBackend; eviction
+            is LRU by entry count.
+        max_rows (int): Larger results are not cached.
+        version_ttl (float): Seconds a table's catalog entry is reused for at
+            least; databases whose catalog reads are slow reuse entries for
+            QUERY_CACHE_VERSION_COST_FACTOR times the read's duration.
+    """
+
+    def __init__(self, backend, max_rows=QUERY_CACHE_MAX_ROWS, version_ttl=QUERY_CACHE_VERSION_TTL):
+        self.backend = backend
+        self.persistent = isinstance(backend, SQLiteBackend)
+        self.max_rows = max_rows
+        self.version_ttl = version_ttl
+        self._catalogs = {}  # database -> lower-cased table -> (read at, version or None)
+        self._catalog_ttls = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0, 'misses': 0, 'stale': 0, 'uncacheable': 0, 'stored': 0,
+            'evictions': 0, 'invalidations': 0, 'saved_seconds': 0.0,
+        }
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def _catalog(self, engine, name, tables):
+        """Versions of the named tables that exist, re-reading those older than the database's TTL."""
+        now = time.monotonic()
+        with self._lock:
+            known = self._catalogs.get(name, {})
+            ttl = self._catalog_ttls.get(name, self.version_ttl)
+            fresh = {table.lower(): known[table.lower()] for table in tables
+                     if table.lower() in known and now - known[table.lower()][0] < ttl}
+        missing = [table for table in tables if table.lower() not in fresh]
+        if missing:
+            # Behind the circuit breaker, so a database that is down is not polled
+            started = time.monotonic()
+            catalog = call_with_retry(engine, lambda: _read_catalog(engine, missing), retry=False)
+            if catalog is None:
+                return None
+            read_at = time.monotonic()
+            with self._lock:
+                ttl = max(self.version_ttl, (read_at - started) * QUERY_CACHE_VERSION_COST_FACTOR)
+                self._catalog_ttls[name] = ttl
+                entries = {
+                    table: entry for table, entry in self._catalogs.get(name, {}).items()
+                    if read_at - entry[0] < ttl
+                }
+                for table in missing:
+                    entries[table.lower()] = fresh[table.lower()] = (read_at, catalog.get(table.lower()))
+                self._catalogs[name] = entries
+        return {table: version for table, (_, version) in fresh.items() if version is not None}
+
+    def _versions(self, name, tables, catalog):
+        with self._lock:
+            everything = self._generations.get((name, None), 0)
+            return [
+                [table, catalog[table], everything + self._generations.get((name, table), 0)]
+                for table in tables
+            ]
+
+    def get(self, engine, sql, max_rows):
+        """
+        Look up a statement's result.
+
+        Returns:
+            tuple: (entry, token). entry is a dict with the cached frame,
+                truncated flag and original seconds, or None on a miss. Pass
+                token to put() after running the statement; it is None when
+                the statement cannot be cached. entry also holds the statement
+                as executed, after the SQL guard's rewrite.
+        """
+        if not is_read_statement(sql) or is_volatile(sql):
+            self._count(uncacheable=1)
+            return None, None
+        name = engine.url.render_as_string(hide_password=True)
+        tables = referenced_tables(sql, engine.url.database)
+        # Any other table named in the statement (e.g. inside a derived table)
+        # counts too; a false match only invalidates more often.
+        words = {
+            _identifier(token) for token in _tokens(sql)
+            if _is_word(token) and token.lower() not in _KEYWORDS and not token.isdigit()
+        }
+        catalog = None
+        if tables:
+            try:
+                catalog = self._catalog(engine, name, sorted(tables | words))
+            except exc.SQLAlchemyError:
+                catalog = None
+        if not catalog or any(table.lower() not in catalog for table in tables):
+            self._count(uncacheable=1)
+            return None, None
+        dependencies = sorted({table.lower() for table in tables} | ({word.lower() for word in words} & catalog.keys()))
+        versions = self._versions(name, dependencies, catalog)
+        key = hashlib.sha256(f"{name}\x1f{max_rows}\x1f{normalize_sql(sql)}".encode("utf-8")).hexdigest()
+
+        stored = self.backend.get(key)
+        if stored is not None:
+            value = stored[0]
+            if value['versions'] == versions:
+                entry = _decode(value) if self.persistent else dict(value, frame=value['frame'].copy())
+                self._count(hits=1, saved_seconds=entry['seconds'])
+                return entry, None
+            self.backend.delete(key)
+            self._count(stale=1)
+        self._count(misses=1)
+        return None, (key, versions)
+
+    def put(self, token, result):
+        """Store a freshly fetched QueryResult under the token returned by get()."""
+        if token is None or result.truncated or result.row_count > self.max_rows:
+            return
+        key, versions = token
+        entry = {
+            'sql': result.sql,
+            'frame': result.frame,
+            'truncated': result.truncated,
+            'seconds': result.seconds,
+            'versions': versions,
+        }
+        evicted = self.backend.set(key, _encode(entry) if self.persistent else entry, time.time())
+        self._count(stored=1, evictions=evicted)
+
+    def invalidate(self, engine, sql):
+        """
+        Drop entries that may be affected by a write statement.
+
+        Entries reading a table named in the statement are invalidated; when
+        no known table is named, every entry of the database is.
+        """
+        name = engine.url.render_as_string(hide_password=True)
+        with self._lock:
+            known = {table for table, (_, version) in self._catalogs.get(name, {}).items() if version is not None}
+        words = {_identifier(token).lower() for token in _tokens(sql) if _is_word(token)}
+        tables = sorted(words & known)
+        with self._lock:
+            for table in tables or [None]:
+                self._generations[(name, table)] = self._generations.get((name, table), 0) + 1
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['saved_seconds'] = round(stats['saved_seconds'], 3)
+        stats['entries'] = len(self.backend)
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Return the process-wide SQL result cache configured in constants."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                if QUERY_CACHE_BACKEND == "sqlite":
+                    backend = SQLiteBackend(QUERY_CACHE_PATH, QUERY_CACHE_MAX_ENTRIES)
+                else:
+                    backend = InMemoryBackend(QUERY_CACHE_MAX_ENTRIES)
+                _query_cache = QueryCache(backend)
+    return _query_cache
+
+
+def query_cache_stats():
+    return get_query_cache().stats()
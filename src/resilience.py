@@ -0,0 +1,208 @@
+import random
+import threading
+import time
+from sqlalchemy import exc
+from constants import (
+    DB_BREAKER_FAILURE_THRESHOLD,
+    DB_BREAKER_RESET_SECONDS,
+    DB_RETRY_BASE_DELAY,
+    DB_RETRY_MAX_ATTEMPTS,
+    DB_RETRY_MAX_DELAY,
+)
+from sql_guard import QueryCancelled, QueryRejected
+from tracing import span
+
+# MySQL client/server errors worth retrying: server gone or unreachable, lost
+# connection, too many connections, shutdown in progress, lock wait timeout, deadlock.
+TRANSIENT_MYSQL_ERRORS = {1040, 1053, 1205, 1213, 2002, 2003, 2006, 2013, 2055}
+
+
+class CircuitOpenError(exc.SQLAlchemyError):
+    """Raised without touching the database while its circuit breaker is open."""
+
+
+def is_transient(error):
+    """
+    Whether a database error is likely to succeed if the call is repeated.
+
+    Dropped or refused connections, pool timeouts, lock timeouts and deadlocks
+    are transient; SQL errors, guard rejections and cancellations are not.
+    """
+    if isinstance(error, (QueryRejected, QueryCancelled, CircuitOpenError)):
+        return False
+    if isinstance(error, (exc.DisconnectionError, exc.TimeoutError)):
+        return True
+    if isinstance(error, exc.DBAPIError):
+        if error.connection_invalidated:
+            return True
+        if isinstance(error, exc.OperationalError):
+            args = getattr(error.orig, "args", None) or ()
+            if args and args[0] in TRANSIENT_MYSQL_ERRORS:
+                return True
+            # SQLite reports lock contention as a plain message
+            return "database is locked" in str(error.orig)
+    return False
+
+
+class CircuitBreaker:
+    """
+    Fails fast for one database after repeated transient failures.
+
+    Closed: calls go through. After `failure_threshold` consecutive transient
+    failures it opens and rejects calls for `reset_seconds`; then it lets a
+    single trial call through (half-open), closing on success and reopening
+    on failure.
+
+    Args:
+        name (str): Database label used in errors and stats.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_seconds (float): How long the breaker stays open.
+    """
+
+    def __init__(self, name, failure_threshold=DB_BREAKER_FAILURE_THRESHOLD, reset_seconds=DB_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls to the database should not be attempted now."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError(
+                        f"Database {self.name} is unavailable; not retrying for "
+                        f"{self.reset_seconds - (time.monotonic() - self.opened_at):.0f}s"
+                    )
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._trial_running:
+                    raise CircuitOpenError(f"Database {self.name} is recovering; try again shortly")
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self):
+        """End a call whose outcome says nothing about the database's health."""
+        with self._lock:
+            self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'database': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+            }
+
+
+_breakers = {}
+_lock = threading.Lock()
+_stats = {'calls': 0, 'retries': 0, 'transient_errors': 0, 'permanent_errors': 0, 'short_circuited': 0}
+
+
+def _count(**increments):
+    with _lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def get_breaker(engine):
+    """Return the circuit breaker for an engine's database."""
+    name = engine.url.render_as_string(hide_password=True)
+    with _lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def backoff_delay(attempt, base_delay=DB_RETRY_BASE_DELAY, max_delay=DB_RETRY_MAX_DELAY):
+    """Exponential backoff with full jitter for the given retry (1-based)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def call_with_retry(engine, fn, retry=True, max_attempts=DB_RETRY_MAX_ATTEMPTS):
+    """
+    Call fn behind the engine's circuit breaker, retrying transient errors.
+
+    Args:
+        engine (Engine): Engine whose database fn talks to.
+        fn (callable): The database call; must be safe to repeat when retry is set.
+        retry (bool): Whether transient errors are retried; pass False for
+            statements that must not run twice.
+        max_attempts (int): Total attempts including the first.
+    Returns:
+        The value returned by fn.
+    Raises:
+        CircuitOpenError: If the breaker is open.
+    """
+    breaker = get_breaker(engine)
+    attempt = 1
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            _count(short_circuited=1)
+            raise
+        _count(calls=1)
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_transient(e):
+                # The database answered; the statement itself was the problem
+                if isinstance(e, exc.DBAPIError):
+                    _count(permanent_errors=1)
+                    breaker.record_success()
+                else:
+                    breaker.release()
+                raise
+            _count(transient_errors=1)
+            breaker.record_failure()
+            if not retry or attempt >= max_attempts or breaker.state == "open":
+                raise
+            delay = backoff_delay(attempt)
+            _count(retries=1)
+            print(f"Transient database error, retry {attempt} in {delay:.2f}s: {str(e)}")
+            with span("db_retry_wait", attempt=attempt, seconds=delay):
+                time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def resilience_stats():
+    """
+    Report retry counters and the state of every circuit breaker.
+
+    Returns:
+        dict: Totals for calls, retries, transient and permanent errors and
+            short-circuited calls, plus the breakers and how many are open.
+    """
+    with _lock:
+        stats = dict(_stats)
+        breakers = list(_breakers.values())
+    stats['breakers'] = [breaker.stats() for breaker in breakers]
+    stats['open_breakers'] = sum(1 for b in stats['breakers'] if b['state'] != "closed")
+    return stats
@@ -0,0 +1,394 @@
+import decimal
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import pandas as pd
+from sqlalchemy import text
+from constants import (
+    RESULT_CHUNK_SIZE,
+    RESULT_MAX_ROWS,
+    RESULT_PREVIEW_ROWS,
+    RESULT_STORE_MAX_ROWS,
+    RESULT_STORE_SESSION_MAX_ROWS,
+    RESULT_SUMMARY_EDGE_ROWS,
+    RESULT_SUMMARY_MAX_COLUMNS,
+    RESULT_SUMMARY_TOP_VALUES,
+)
+from downsample import spread_rows
+from memory import count_tokens
+from query_cache import get_query_cache
+from resilience import call_with_retry
+from sql_guard import current_owner, guard_statement, is_read_statement, track_query
+from tracing import record_sql, record_tokens_saved, span
+
+# Longest cell value shown to the agent, matching SQLDatabase.max_string_length.
+MAX_PREVIEW_STRING_LENGTH = 300
+# Longest value quoted in a column's most common values.
+MAX_SUMMARY_VALUE_LENGTH = 40
+# Rows rendered to estimate the token count of a full result's text.
+TOKEN_SAMPLE_ROWS = 1000
+
+
+def _rows_text(frame):
+    """Render rows as SQLDatabase.run does: a list of tuples with long strings cut."""
+    return str([
+        tuple(
+            value[:MAX_PREVIEW_STRING_LENGTH] + "..."
+            if isinstance(value, str) and len(value) > MAX_PREVIEW_STRING_LENGTH else value
+            for value in row
+        )
+        for row in frame.itertuples(index=False, name=None)
+    ])
+
+
+def _number(value):
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+
+def _column_stats(series, top_values):
+    nulls = int(series.isna().sum())
+    values = series.dropna()
+    if values.empty:
+        return "all null"
+    if pd.api.types.is_bool_dtype(values):
+        parts = [f"{int(values.sum())} true, {int((~values).sum())} false"]
+    elif pd.api.types.is_numeric_dtype(values):
+        parts = [f"min {_number(values.min())}", f"max {_number(values.max())}",
+                 f"mean {_number(float(values.mean()))}"]
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        parts = [f"min {values.min()}", f"max {values.max()}"]
+    else:
+        try:
+            counts = values.value_counts()
+        except TypeError:  # unhashable values, e.g. JSON arrays
+            counts = values.astype(str).value_counts()
+        if counts.iloc[0] == 1:
+            parts = [f"{len(counts)} distinct, no repeats"]
+        else:
+            top = ", ".join(
+                f"{str(value)[:MAX_SUMMARY_VALUE_LENGTH]} ({count})" for value, count in counts.head(top_values).items()
+            )
+            parts = [f"{len(counts)} distinct", f"most common {top}"]
+    if nulls:
+        parts.append(f"{nulls} null")
+    return ", ".join(parts)
+
+
+class QueryResult:
+    """
+    Typed result of one SQL statement.
+
+    Attributes:
+        sql (str): The statement that produced the result.
+        frame (DataFrame): The fetched rows with pandas dtypes.
+        truncated (bool): Whether rows beyond the row cap were left unfetched.
+        seconds (float): Execution plus fetch time.
+        handle (str): Key under which the result is kept in the result store.
+        cached (bool): Whether the rows came from the SQL result cache.
+    """
+
+    def __init__(self, sql, frame, truncated, seconds, cached=False):
+        self.sql = sql
+        self.frame = frame
+        self.truncated = truncated
+        self.seconds = seconds
+        self.cached = cached
+        self.handle = uuid.uuid4().hex
+
+    @property
+    def row_count(self):
+        return len(self.frame)
+
+    def preview_text(self, max_rows=RESULT_PREVIEW_ROWS, spread=False):
+        """
+        Render the first rows the way SQLDatabase.run does, for the agent to read.
+
+        Args:
+            max_rows (int): Most rows to render.
+            spread (bool): Pick the rows across the whole result (see
+                downsample.spread_rows) instead of taking the first ones.
+        Returns:
+            str: A list-of-tuples string, empty when there are no rows, with a
+                note on how many rows were left out.
+        """
+        if self.frame.empty:
+            return ""
+        rows = spread_rows(self.frame, max_rows) if spread else self.frame.head(max_rows)
+        preview = _rows_text(rows)
+        if self.row_count > max_rows or self.truncated:
+            total = f"{self.row_count}+" if self.truncated else str(self.row_count)
+            across = ", spread across the result" if spread else ""
+            preview += f"\n(showing {len(rows)} of {total} rows{across})"
+        return preview
+
+    def summary_text(self, max_rows=RESULT_PREVIEW_ROWS, edge_rows=RESULT_SUMMARY_EDGE_ROWS,
+                     max_columns=RESULT_SUMMARY_MAX_COLUMNS, top_values=RESULT_SUMMARY_TOP_VALUES):
+        """
+        Render the result for the agent: in full when small, otherwise summarized.
+
+        Results of up to max_rows rows read as in preview_text. Larger ones
+        give the row count, column types, the first and last edge_rows rows
+        and per-column stats, so the agent's scratchpad does not grow with the
+        result.
+
+        Returns:
+            str: The text to put in the agent's observation.
+        """
+        if self.row_count <= max_rows and not self.truncated:
+            return self.preview_text(max_rows)
+        frame = self.frame
+        total = f"{self.row_count}+ (stopped at the row cap)" if self.truncated else str(self.row_count)
+        types = ", ".join(
+            f"{name} ({'text' if dtype == object else dtype})" for name, dtype in zip(frame.columns, frame.dtypes)
+        )
+        lines = [
+            f"Result of {total} rows, {frame.shape[1]} columns: {types}",
+            f"First {edge_rows} rows: {_rows_text(frame.head(edge_rows))}",
+            f"Last {edge_rows} rows: {_rows_text(frame.tail(edge_rows))}",
+            "Column stats:",
+        ]
+        # By position: joins can return several columns with the same name
+        for position in range(min(frame.shape[1], max_columns)):
+            lines.append(f"- {frame.columns[position]}: {_column_stats(frame.iloc[:, position], top_values)}")
+        if frame.shape[1] > max_columns:
+            lines.append(f"- ({frame.shape[1] - max_columns} more columns)")
+        lines.append("The full result is shown to the user; query with GROUP BY or WHERE for other details.")
+        return "\n".join(lines)
+
+    def full_text_tokens(self):
+        """
+        Tokens of the whole result rendered as SQLDatabase.run would, estimated
+        from the first TOKEN_SAMPLE_ROWS rows for larger results.
+        """
+        if self.frame.empty:
+            return 0
+        sample = self.frame.head(TOKEN_SAMPLE_ROWS)
+        tokens = count_tokens(_rows_text(sample))
+        return round(tokens * self.row_count / len(sample))
+
+
+_observation_stats = {'observations': 0, 'summarized': 0, 'full_tokens': 0, 'sent_tokens': 0}
+_observation_lock = threading.Lock()
+
+
+def agent_observation(result):
+    """
+    Text handed to the SQL agent for a result, with tokens saved recorded.
+
+    The saving is counted against the full result as plain SQLDatabase.run
+    would return it, on the current request trace and in observation_stats.
+    """
+    text = result.summary_text()
+    sent = count_tokens(text)
+    full = max(result.full_text_tokens(), sent)
+    record_tokens_saved(full - sent)
+    with _observation_lock:
+        _observation_stats['observations'] += 1
+        _observation_stats['summarized'] += int(result.row_count > RESULT_PREVIEW_ROWS or result.truncated)
+        _observation_stats['full_tokens'] += full
+        _observation_stats['sent_tokens'] += sent
+    return text
+
+
+def observation_stats():
+    """Process-wide counts of agent observations and the tokens their summaries saved."""
+    with _observation_lock:
+        stats = dict(_observation_stats)
+    stats['tokens_saved'] = stats['full_tokens'] - stats['sent_tokens']
+    return stats
+
+
+def _to_frame(chunks, columns):
+    frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    # Work by position: joins can return several columns with the same name
+    for position in range(frame.shape[1]):
+        series = frame.iloc[:, position]
+        if series.dtype != object:
+            continue
+        # DECIMAL columns arrive as decimal.Decimal objects; make them numeric
+        values = series.dropna()
+        if len(values) and all(isinstance(v, decimal.Decimal) for v in values):
+            frame.isetitem(position, pd.to_numeric(series, errors="coerce"))
+    return frame.convert_dtypes(dtype_backend="numpy_nullable", convert_string=False)
+
+
+def _execute(engine, sql, max_rows, chunk_size):
+    start = time.perf_counter()
+    chunks = []
+    columns = []
+    truncated = False
+    fetched = 0
+    with span("sql_execute") as attributes, engine.connect() as conn:
+        sql = guard_statement(conn, sql)
+        with track_query(conn, sql):
+            result = conn.execution_options(stream_results=True).execute(text(sql))
+            if result.returns_rows:
+                columns = list(result.keys())
+                while fetched < max_rows:
+                    rows = result.fetchmany(min(chunk_size, max_rows - fetched))
+                    if not rows:
+                        break
+                    chunks.append(pd.DataFrame.from_records(rows, columns=columns))
+                    fetched += len(rows)
+                truncated = fetched >= max_rows and result.fetchone() is not None
+                if truncated:
+                    # Closing a server-side cursor reads the unfetched rows off the
+                    # wire; drop the connection from the pool instead.
+                    conn.invalidate()
+                else:
+                    result.close()
+        if not conn.invalidated:
+            conn.commit()
+        attributes.update(rows=fetched, truncated=truncated)
+    record_sql(fetched)
+    return QueryResult(sql, _to_frame(chunks, columns), truncated, time.perf_counter() - start)
+
+
+def fetch_result(engine, sql, max_rows=RESULT_MAX_ROWS, chunk_size=RESULT_CHUNK_SIZE):
+    """
+    Run a statement on a server-side cursor and fetch at most max_rows rows in chunks.
+
+    Read statements are answered from the shared SQL result cache while the
+    tables they read are unchanged; writes invalidate it. Otherwise the
+    statement first goes through the SQL guard, which may reject it or add
+    a LIMIT, and stays cancellable while it runs. Transient errors are retried
+    with backoff for read statements, behind the database's circuit breaker.
+
+    Args:
+        engine (Engine): Engine to run the statement on.
+        sql (str): The statement.
+        max_rows (int): Row cap; the result is marked truncated beyond it.
+        chunk_size (int): Rows fetched per round trip.
+    Returns:
+        QueryResult: The typed result, also registered in the result store.
+    Raises:
+        QueryRejected: If the guard judged the statement too expensive.
+        QueryCancelled: If the statement was cancelled or timed out.
+        CircuitOpenError: If the database's circuit breaker is open.
+    """
+    query_cache = get_query_cache()
+    with span("query_cache") as attributes:
+        cached, token = query_cache.get(engine, sql, max_rows)
+        attributes['hit'] = cached is not None
+    if cached is not None:
+        query_result = QueryResult(cached['sql'], cached['frame'], cached['truncated'], cached['seconds'], cached=True)
+    else:
+        # Writes are not repeated: a dropped connection may hide a committed change
+        is_read = is_read_statement(sql)
+        try:
+            query_result = call_with_retry(
+                engine,
+                lambda: _execute(engine, sql, max_rows, chunk_size),
+                retry=is_read,
+            )
+        finally:
+            if not is_read:
+                # Even a failed write may have changed data before it failed
+                query_cache.invalidate(engine, sql)
+        query_cache.put(token, query_result)
+    get_result_store().put(query_result, current_owner())
+    collected = _collected_results.get()
+    if collected is not None:
+        collected.append(query_result)
+    return query_result
+
+
+class ResultStore:
+    """
+    Recent query results per session, addressable by handle.
+
+    Each session keeps its most recent results up to max_session_rows rows;
+    across sessions, the least recently used session's oldest results are
+    dropped once max_rows rows are held. A session's newest result is only
+    dropped with the session itself.
+
+    Args:
+        max_session_rows (int): Rows kept per session.
+        max_rows (int): Rows kept over all sessions.
+    """
+
+    def __init__(self, max_session_rows=RESULT_STORE_SESSION_MAX_ROWS, max_rows=RESULT_STORE_MAX_ROWS):
+        self.max_session_rows = max_session_rows
+        self.max_rows = max_rows
+        self._sessions = OrderedDict()  # session -> OrderedDict of handle -> result
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def _drop_oldest(self, session, results):
+        _, result = results.popitem(last=False)
+        self._rows -= result.row_count
+        if not results:
+            del self._sessions[session]
+
+    def put(self, result, session=None):
+        """Keep a result under its handle for a session (e.g. the query owner)."""
+        with self._lock:
+            results = self._sessions.setdefault(session, OrderedDict())
+            self._sessions.move_to_end(session)
+            previous = results.pop(result.handle, None)
+            if previous is not None:
+                self._rows -= previous.row_count
+            results[result.handle] = result
+            self._rows += result.row_count
+            session_rows = sum(kept.row_count for kept in results.values())
+            while len(results) > 1 and session_rows > self.max_session_rows:
+                session_rows -= next(iter(results.values())).row_count
+                self._drop_oldest(session, results)
+            while self._rows > self.max_rows:
+                oldest, kept = next(iter(self._sessions.items()))
+                if oldest == session and len(kept) == 1:
+                    break
+                self._drop_oldest(oldest, kept)
+
+    def get(self, handle, session=None):
+        """Return a session's result for handle, or None if it has expired."""
+        with self._lock:
+            results = self._sessions.get(session)
+            result = results.get(handle) if results is not None else None
+            if result is not None:
+                results.move_to_end(handle)
+                self._sessions.move_to_end(session)
+            return result
+
+    def forget(self, session):
+        """Drop every result of a session, e.g. when its conversation ends."""
+        with self._lock:
+            results = self._sessions.pop(session, None)
+            if results:
+                self._rows -= sum(result.row_count for result in results.values())
+
+
+_result_store = ResultStore()
+
+
+def get_result_store():
+    return _result_store
+
+
+# Results fetched while answering the current request, in execution order.
+_collected_results = ContextVar("collected_results", default=None)
+
+
+@contextmanager
+def collect_results():
+    """
+    Collect every QueryResult fetched within this context.
+
+    Contexts nest: an enclosing collector receives the inner one's results
+    when the inner context exits.
+
+    Yields:
+        list: Filled with the results as queries run.
+    """
+    results = []
+    outer = _collected_results.get()
+    token = _collected_results.set(results)
+    try:
+        yield results
+    finally:
+        _collected_results.reset(token)
+        if outer is not None:
+            outer.extend(results)
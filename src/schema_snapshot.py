@@ -0,0 +1,358 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import MetaData, Table, inspect, select, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.types import NullType
+from langchain_community.utilities import SQLDatabase
+from constants import (
+    CACHE_DIR,
+    SCHEMA_SAMPLE_ROWS,
+    SCHEMA_SNAPSHOT_CHECK_INTERVAL,
+)
+from db_pool import get_engine
+from result_set import agent_observation, fetch_result
+
+
+class SchemaSnapshot:
+    """
+    Reflected schema of one database, persisted as JSON between processes.
+
+    Each entry in `tables` holds the table's columns, primary and foreign keys,
+    comment, sample rows, rendered CREATE TABLE text and the catalog version
+    (UPDATE_TIME and column checksum) it was reflected at.
+    """
+
+    def __init__(self, database, tables=None, avg_reflect_seconds=0.0):
+        self.database = database
+        self.tables = tables or {}
+        self.avg_reflect_seconds = avg_reflect_seconds
+        self.stats = {}
+
+    @property
+    def fingerprint(self):
+        """Hash of every table's column checksum; changes whenever the schema does."""
+        digest = hashlib.sha256()
+        for name in sorted(self.tables):
+            digest.update(f"{name}:{self.tables[name]['checksum']}\x1e".encode("utf-8"))
+        return digest.hexdigest()
+
+    def table_info(self, table_names=None):
+        """
+        Render table descriptions in the same format as SQLDatabase.get_table_info.
+
+        Args:
+            table_names (list): Tables to describe. Defaults to every table.
+        Returns:
+            str: CREATE TABLE statements followed by sample rows, one block per table.
+        """
+        names = sorted(self.tables) if table_names is None else table_names
+        blocks = []
+        for name in names:
+            table = self.tables[name]
+            block = table['create_table']
+            if SCHEMA_SAMPLE_ROWS:
+                columns = "\t".join(column['name'] for column in table['columns'])
+                rows = "\n".join("\t".join(row) for row in table['sample_rows'])
+                block += (
+                    f"\n\n/*\n{SCHEMA_SAMPLE_ROWS} rows from {name} table:\n"
+                    f"{columns}\n{rows}\n*/"
+                )
+            blocks.append(block)
+        blocks.sort()
+        return "\n\n".join(blocks)
+
+    def to_dict(self):
+        return {
+            'database': self.database,
+            'avg_reflect_seconds': self.avg_reflect_seconds,
+            'tables': self.tables,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['database'], data['tables'], data.get('avg_reflect_seconds', 0.0))
+
+
+# Tables visible to the agent for the question being answered; None means all.
+_table_scope = ContextVar("table_scope", default=None)
+
+
+@contextmanager
+def table_scope(table_names):
+    """
+    Limit the tables a SnapshotSQLDatabase exposes within this context.
+
+    Args:
+        table_names (list): Tables to expose, or None to expose every table.
+    """
+    token = _table_scope.set(frozenset(table_names) if table_names is not None else None)
+    try:
+        yield
+    finally:
+        _table_scope.reset(token)
+
+
+class SnapshotSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that serves table names and table info from a SchemaSnapshot.
+
+    Inside a `table_scope` block only the scoped tables are listed or described.
+    """
+
+    def __init__(self, engine, snapshot, **kwargs):
+        self.snapshot = snapshot
+        kwargs.setdefault('sample_rows_in_table_info', SCHEMA_SAMPLE_ROWS)
+        super().__init__(engine, lazy_table_reflection=True, **kwargs)
+
+    def get_usable_table_names(self):
+        """Get names of tables available."""
+        scope = _table_scope.get()
+        if scope is not None:
+            return sorted(scope.intersection(self.snapshot.tables))
+        return sorted(self.snapshot.tables)
+
+    def get_table_info(self, table_names=None):
+        """Get information about specified tables without reflecting them."""
+        usable_tables = self.get_usable_table_names()
+        if table_names is None:
+            table_names = usable_tables
+        missing_tables = set(table_names).difference(usable_tables)
+        if missing_tables:
+            raise ValueError(f"table_names {missing_tables} not found in database")
+        return self.snapshot.table_info(table_names)
+
+    def run(self, command, fetch="all", include_columns=False, **kwargs):
+        """
+        Execute a SQL command through the typed, chunked result layer.
+
+        Plain-text statements fetched in full are run on a server-side cursor;
+        the agent gets the rows of small results and a summary of large ones
+        while the full typed table stays in the result store. Other calls
+        behave like SQLDatabase.run.
+        """
+        # run_no_throw always passes parameters/execution_options, usually as None
+        if not isinstance(command, str) or fetch != "all" or include_columns or any(kwargs.values()):
+            return super().run(command, fetch, include_columns, **kwargs)
+        return agent_observation(fetch_result(self._engine, command))
+
+
+def _catalog_versions(engine, database):
+    """
+    Read the cheap per-table version markers used to detect changes.
+
+    Returns:
+        dict: Table name -> (update_time, column checksum, comment).
+    """
+    if engine.dialect.name != "mysql":
+        # No information_schema; fall back to the inspector's column listing.
+        inspector = inspect(engine)
+        versions = {}
+        for name in inspector.get_table_names():
+            columns = [f"{c['name']}:{c['type']}:{c['nullable']}" for c in inspector.get_columns(name)]
+            checksum = hashlib.sha256("|".join(columns).encode("utf-8")).hexdigest()
+            versions[name] = (None, checksum, '')
+        return versions
+
+    with engine.connect() as conn:
+        tables = conn.execute(
+            text(
+                "SELECT TABLE_NAME, UPDATE_TIME, TABLE_COMMENT FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = :schema AND TABLE_TYPE = 'BASE TABLE'"
+            ),
+            {"schema": database},
+        ).fetchall()
+        columns = conn.execute(
+            text(
+                "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT "
+                "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :schema "
+                "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+            ),
+            {"schema": database},
+        ).fetchall()
+
+    digests = {}
+    for row in columns:
+        digests.setdefault(row[0], hashlib.sha256()).update(
+            ("\x1f".join(str(v) for v in row[1:]) + "\x1e").encode("utf-8")
+        )
+    return {
+        name: (
+            str(update_time) if update_time is not None else None,
+            digests[name].hexdigest() if name in digests else '',
+            comment or '',
+        )
+        for name, update_time, comment in tables
+    }
+
+
+def _reflect_table(engine, name):
+    """Reflect a single table into its snapshot entry."""
+    table = Table(name, MetaData(), autoload_with=engine)
+    for column in list(table.columns):
+        # Mirror SQLDatabase, which drops columns of unknown type (e.g. JSON)
+        if type(column.type) is NullType:
+            table._columns.remove(column)
+
+    sample_rows = []
+    if SCHEMA_SAMPLE_ROWS:
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(select(table).limit(SCHEMA_SAMPLE_ROWS))
+                sample_rows = [[str(value)[:100] for value in row] for row in result]
+        except ProgrammingError:
+            sample_rows = []
+
+    return {
+        'columns': [
+            {'name': c.name, 'type': str(c.type), 'nullable': c.nullable, 'comment': c.comment or ''}
+            for c in table.columns
+        ],
+        'primary_key': [c.name for c in table.primary_key.columns],
+        'foreign_keys': [
+            {
+                'columns': [element.parent.name for element in fk.elements],
+                'referred_table': fk.referred_table.name,
+                'referred_columns': [element.column.name for element in fk.elements],
+            }
+            for fk in table.foreign_key_constraints
+        ],
+        'create_table': str(CreateTable(table).compile(engine)).strip(),
+        'sample_rows': sample_rows,
+    }
+
+
+def snapshot_path(db_config):
+    """Location of the on-disk snapshot for a connection config."""
+    label = f"{db_config['HOST']}:{db_config['PORT']}/{db_config['DATABASE']}"
+    name = hashlib.sha256(label.encode("utf-8")).hexdigest()[:16]
+    prefix = re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.basename(db_config['DATABASE']))
+    return os.path.join(CACHE_DIR, "schema", f"{prefix}-{name}.json")
+
+
+def _load(path, database):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return SchemaSnapshot.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return SchemaSnapshot(database)
+
+
+def _save(snapshot, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+def refresh_snapshot(engine, database, path):
+    """
+    Bring the snapshot at path up to date, re-reflecting only tables that changed.
+
+    A table is re-reflected when it is new or when its information_schema
+    UPDATE_TIME or column checksum differs from the stored one. Tables that
+    no longer exist are dropped.
+
+    Args:
+        engine (Engine): Engine connected to the database.
+        database (str): Name of the database.
+        path (str): JSON file holding the snapshot.
+    Returns:
+        SchemaSnapshot: The refreshed snapshot, with timings in `stats`.
+    """
+    start = time.perf_counter()
+    snapshot = _load(path, database)
+    versions = _catalog_versions(engine, database)
+    check_seconds = time.perf_counter() - start
+
+    changed = [
+        name for name, (update_time, checksum, _) in versions.items()
+        if name not in snapshot.tables
+        or snapshot.tables[name]['checksum'] != checksum
+        or snapshot.tables[name]['update_time'] != update_time
+    ]
+    removed = set(snapshot.tables) - set(versions)
+    for name in removed:
+        del snapshot.tables[name]
+
+    reflect_start = time.perf_counter()
+    for name in changed:
+        update_time, checksum, comment = versions[name]
+        entry = _reflect_table(engine, name)
+        entry.update({'update_time': update_time, 'checksum': checksum, 'comment': comment})
+        snapshot.tables[name] = entry
+    reflect_seconds = time.perf_counter() - reflect_start
+
+    if changed:
+        per_table = reflect_seconds / len(changed)
+        # Running estimate of what a full reflection of one table costs
+        snapshot.avg_reflect_seconds = (
+            per_table if not snapshot.avg_reflect_seconds
+            else 0.8 * snapshot.avg_reflect_seconds + 0.2 * per_table
+        )
+    if changed or removed:
+        _save(snapshot, path)
+
+    reused = len(versions) - len(changed)
+    snapshot.stats = {
+        'tables': len(versions),
+        'reflected_tables': len(changed),
+        'reused_tables': reused,
+        'removed_tables': len(removed),
+        'check_seconds': round(check_seconds, 4),
+        'reflect_seconds': round(reflect_seconds, 4),
+        'estimated_saved_seconds': round(reused * snapshot.avg_reflect_seconds, 4),
+    }
+    return snapshot
+
+
+_snapshots = {}
+_refresh_locks = {}
+_snapshots_lock = threading.Lock()
+
+
+def _fresh(cached):
+    return cached is not None and time.monotonic() - cached[0] < SCHEMA_SNAPSHOT_CHECK_INTERVAL
+
+
+def get_schema_snapshot(db_config):
+    """
+    Return the schema snapshot for a database, refreshing it at most once per check interval.
+
+    Each database is refreshed by one thread at a time, without holding the
+    lock other databases need. While a refresh is running, callers that already
+    have a snapshot of that database get the previous one instead of waiting.
+
+    Args:
+        db_config (dict): Connection config including DATABASE.
+    Returns:
+        SchemaSnapshot: The current snapshot.
+    """
+    path = snapshot_path(db_config)
+    with _snapshots_lock:
+        cached = _snapshots.get(path)
+        if _fresh(cached):
+            return cached[1]
+        refresh_lock = _refresh_locks.setdefault(path, threading.Lock())
+
+    if not refresh_lock.acquire(blocking=cached is None):
+        return cached[1]
+    try:
+        with _snapshots_lock:
+            cached = _snapshots.get(path)
+        # Another thread may have refreshed it while this one waited
+        if _fresh(cached):
+            return cached[1]
+        snapshot = refresh_snapshot(get_engine(db_config), db_config['DATABASE'], path)
+        with _snapshots_lock:
+            _snapshots[path] = (time.monotonic(), snapshot)
+        return snapshot
+    finally:
+        refresh_lock.release()
@@ -0,0 +1,369 @@
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event, exc, text
+from constants import (
+    SQL_GUARD_AUTO_LIMIT,
+    SQL_GUARD_CANCEL_POLL_INTERVAL,
+    SQL_GUARD_MAX_ESTIMATED_ROWS,
+    SQL_GUARD_TIMEOUT_SECONDS,
+)
+
+
+class QueryRejected(exc.SQLAlchemyError):
+    """
+    Raised instead of running a statement whose plan is too expensive.
+
+    Subclasses SQLAlchemyError so the agent's query tool reports it like a
+    database error and the model gets a chance to write a cheaper query.
+    """
+
+
+class QueryCancelled(exc.SQLAlchemyError):
+    """Raised when a running statement was cancelled or hit the guard's timeout."""
+
+
+# String literals (group 1) and comments, matched together so that comment
+# markers and semicolons inside quoted values are left alone.
+_LITERALS_AND_COMMENTS = re.compile(
+    r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\")|/\*.*?\*/|--[^\n]*|#[^\n]*",
+    re.DOTALL,
+)
+# Words, quoted identifiers and parentheses, for finding a statement's keyword.
+_TOKENS = re.compile(r"`[^`]*`|\w+|[()]")
+# Keywords that start the statement a WITH clause's common table expressions feed.
+_STATEMENT_KEYWORDS = {"select", "insert", "update", "delete", "replace", "table", "values"}
+# Locking clause ending a SELECT; MySQL only accepts LIMIT before it.
+_LOCKING = (
+    r"(for\s+(update|share)(\s+of\s+[\w`.]+(\s*,\s*[\w`.]+)*)?(\s+(nowait|skip\s+locked))?"
+    r"|lock\s+in\s+share\s+mode)"
+)
+_TRAILING_LOCKING = re.compile(rf"\s{_LOCKING}\s*$", re.IGNORECASE)
+_TRAILING_LIMIT = re.compile(
+    rf"\blimit\s+\d+(\s*,\s*\d+|\s+offset\s+\d+)?\s*{_LOCKING}?\s*$",
+    re.IGNORECASE,
+)
+
+_stats_lock = threading.Lock()
+_stats = {'checked': 0, 'explained': 0, 'rejected': 0, 'limited': 0, 'cancelled': 0, 'timed_out': 0}
+
+
+def _count(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def guard_stats():
+    """
+    Report what the guard did to the statements it saw.
+
+    Returns:
+        dict: Counts of checked, explained, rejected, LIMIT-rewritten,
+            cancelled and timed-out statements, plus queries running now.
+    """
+    with _stats_lock:
+        return dict(_stats, running=len(_running))
+
+
+def _strip(sql, mask_literals=False):
+    """Drop comments and trailing semicolons; with mask_literals, also empty every string literal."""
+
+    def replace(match):
+        if match.group(1) is None:
+            return " "
+        return "''" if mask_literals else match.group(1)
+
+    return _LITERALS_AND_COMMENTS.sub(replace, sql).strip().rstrip(";").strip()
+
+
+def _statement_keyword(sql):
+    """
+    The keyword that decides what a statement does, in lower case.
+
+    For a WITH statement this is the first keyword after its common table
+    expressions, found by skipping their parenthesized bodies, so
+    "WITH x AS (SELECT ...) DELETE ..." is a delete.
+
+    Returns:
+        str: The keyword, or None for an empty statement.
+    """
+    tokens = [token.lower() for token in _TOKENS.findall(_strip(sql, mask_literals=True))]
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token == "(":
+            depth += 1
+        elif token != ")":
+            break
+    else:
+        return None
+    if tokens[i] != "with":
+        return tokens[i]
+    base = depth
+    for token in tokens[i + 1:]:
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == base and token in _STATEMENT_KEYWORDS:
+            return token
+    return "with"
+
+
+def is_read_statement(sql):
+    """Whether a statement is a SELECT (optionally behind a WITH clause)."""
+    return _statement_keyword(sql) == "select"
+
+
+def add_limit(sql, limit=SQL_GUARD_AUTO_LIMIT):
+    """
+    Append a LIMIT to a SELECT that has none at the top level.
+
+    Returns:
+        str: The statement, bounded.
+    """
+    if not is_read_statement(sql):
+        return sql
+    # Quoted values are masked, so their contents cannot look like clauses
+    masked = _strip(sql, mask_literals=True)
+    if _TRAILING_LIMIT.search(masked):
+        return sql
+    locking = _TRAILING_LOCKING.search(masked)
+    if locking:
+        # The clause lies after the last literal, so it ends the unmasked statement too
+        statement = _strip(sql)
+        cut = len(statement) - (len(masked) - locking.start())
+        return f"{statement[:cut].rstrip()}\nLIMIT {int(limit)}\n{statement[cut:].strip()}"
+    # Newline first, so a trailing line comment cannot swallow the clause
+    return f"{sql.rstrip().rstrip(';').rstrip()}\nLIMIT {int(limit)}"
+
+
+def remove_auto_limit(sql, limit=SQL_GUARD_AUTO_LIMIT):
+    """Undo add_limit, to show or keep a statement as it was written."""
+    return re.sub(rf"\nLIMIT {int(limit)}(\n{_LOCKING})?$", r"\1", sql, flags=re.IGNORECASE)
+
+
+def estimate_rows(conn, sql):
+    """
+    Estimate how many rows a statement's plan examines, from MySQL's EXPLAIN.
+
+    Each plan row's `rows` is scaled by its `filtered` percentage and the
+    results are multiplied, as for a nested-loop join. Subqueries make this an
+    overestimate, which is the safe direction for a guard.
+
+    Returns:
+        float: The estimate, or None for dialects without row estimates.
+    """
+    if conn.dialect.name != "mysql":
+        return None
+    plan = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+    estimate = 1.0
+    for step in plan:
+        rows = step.get('rows') or 1
+        filtered = step.get('filtered')
+        filtered = 100.0 if filtered is None else float(filtered)
+        estimate *= max(float(rows) * filtered / 100.0, 1.0)
+    return estimate
+
+
+def guard_statement(conn, sql, max_estimated_rows=SQL_GUARD_MAX_ESTIMATED_ROWS):
+    """
+    Check a statement before it runs and return the version to execute.
+
+    Args:
+        conn (Connection): Connection the statement will run on.
+        sql (str): The statement as written by the model or user.
+        max_estimated_rows (int): Reject plans estimated above this many rows.
+    Returns:
+        str: The statement with a LIMIT added when it had none.
+    Raises:
+        QueryRejected: If the plan's row estimate is over the threshold.
+    """
+    _count(checked=1)
+    if not is_read_statement(sql):
+        return sql
+    guarded = add_limit(sql)
+    if guarded != sql:
+        _count(limited=1)
+    estimate = estimate_rows(conn, guarded)
+    if estimate is not None:
+        _count(explained=1)
+        if estimate > max_estimated_rows:
+            _count(rejected=1)
+            raise QueryRejected(
+                f"Query rejected: its plan examines an estimated {estimate:,.0f} rows "
+                f"(limit {max_estimated_rows:,}). Add filters, aggregate, or avoid "
+                f"unconstrained joins, then try again."
+            )
+    return guarded
+
+
+def install_statement_timeout(engine, seconds=SQL_GUARD_TIMEOUT_SECONDS):
+    """
+    Set a server-side statement timeout on every new connection of a MySQL engine.
+
+    MySQL limits SELECTs with max_execution_time (milliseconds); MariaDB with
+    max_statement_time (seconds). Other dialects rely on the guard's watchdog.
+    """
+    if engine.dialect.name != "mysql":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET SESSION max_execution_time = {int(seconds * 1000)}")
+        except Exception:
+            try:
+                cursor.execute(f"SET SESSION max_statement_time = {float(seconds)}")
+            except Exception as e:
+                print(f"Could not set a statement timeout: {str(e)}")
+        finally:
+            cursor.close()
+        connection_record.info['server_timeout'] = True
+
+
+class RunningQuery:
+    """A statement in flight, with what is needed to stop it from another thread."""
+
+    def __init__(self, owner, sql, conn, is_abandoned):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.sql = sql
+        self.started = time.monotonic()
+        self.engine = conn.engine
+        self.dbapi_connection = conn.connection.dbapi_connection
+        self.server_timeout = conn.info.get('server_timeout', False)
+        self.thread_id = _mysql_thread_id(conn)
+        self.is_abandoned = is_abandoned
+        self.cancelled = None
+
+    def cancel(self, reason):
+        """Stop the statement server-side; returns False if it could not be reached."""
+        if self.cancelled:
+            return True
+        self.cancelled = reason
+        try:
+            if self.thread_id is not None:
+                # KILL QUERY ends the statement but keeps the pooled connection
+                with self.engine.connect() as conn:
+                    conn.execute(text(f"KILL QUERY {int(self.thread_id)}"))
+            elif hasattr(self.dbapi_connection, "interrupt"):
+                self.dbapi_connection.interrupt()
+            else:
+                return False
+        except Exception as e:
+            print(f"Failed to cancel query: {str(e)}")
+            return False
+        return True
+
+
+def _mysql_thread_id(conn):
+    if conn.dialect.name != "mysql":
+        return None
+    thread_id = conn.info.get('thread_id')
+    if thread_id is None:
+        thread_id = conn.execute(text("SELECT CONNECTION_ID()")).scalar()
+        conn.info['thread_id'] = thread_id
+    return thread_id
+
+
+# Who the current request's queries belong to, and how to tell it was abandoned.
+_owner = ContextVar("query_owner", default=(None, None))
+_running = {}
+_running_lock = threading.Lock()
+_watchdog = None
+
+
+@contextmanager
+def query_owner(owner, is_abandoned=None):
+    """
+    Attribute queries run within this context to an owner (e.g. a browser session).
+
+    Args:
+        owner (str): Key that cancel_queries() accepts.
+        is_abandoned (callable): Polled while a query runs; once it returns
+            True the query is cancelled.
+    """
+    token = _owner.set((owner, is_abandoned))
+    try:
+        yield
+    finally:
+        _owner.reset(token)
+
+
+def current_owner():
+    """The owner queries run in this context are attributed to, or None."""
+    return _owner.get()[0]
+
+
+def cancel_queries(owner):
+    """
+    Cancel every running query of an owner.
+
+    Returns:
+        int: How many queries were cancelled.
+    """
+    with _running_lock:
+        queries = [q for q in _running.values() if q.owner == owner]
+    return sum(1 for q in queries if q.cancel("cancelled"))
+
+
+def _watch():
+    while True:
+        time.sleep(SQL_GUARD_CANCEL_POLL_INTERVAL)
+        with _running_lock:
+            queries = list(_running.values())
+        now = time.monotonic()
+        for query in queries:
+            if query.cancelled:
+                continue
+            if not query.server_timeout and now - query.started > SQL_GUARD_TIMEOUT_SECONDS:
+                query.cancel("timeout")
+            elif query.is_abandoned is not None:
+                try:
+                    abandoned = query.is_abandoned()
+                except Exception:
+                    abandoned = False
+                if abandoned:
+                    query.cancel("abandoned")
+
+
+def _ensure_watchdog():
+    global _watchdog
+    if _watchdog is None:
+        with _running_lock:
+            if _watchdog is None:
+                _watchdog = threading.Thread(target=_watch, name="sql-guard-watchdog", daemon=True)
+                _watchdog.start()
+
+
+@contextmanager
+def track_query(conn, sql):
+    """
+    Register a statement as running so it can be cancelled or timed out.
+
+    Raises:
+        QueryCancelled: If the statement failed because it was cancelled.
+    """
+    owner, is_abandoned = _owner.get()
+    query = RunningQuery(owner, sql, conn, is_abandoned)
+    _ensure_watchdog()
+    with _running_lock:
+        _running[query.id] = query
+    try:
+        yield query
+    except exc.DBAPIError as e:
+        if query.cancelled:
+            _count(**{'timed_out' if query.cancelled == "timeout" else 'cancelled': 1})
+            raise QueryCancelled(f"Query {query.cancelled}: {str(e.orig)}") from e
+        if getattr(e.orig, "args", None) and e.orig.args[0] == 3024:
+            # ER_QUERY_TIMEOUT from max_execution_time
+            _count(timed_out=1)
+        raise
+    finally:
+        with _running_lock:
+            _running.pop(query.id, None)
@@ -0,0 +1,97 @@
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+# Status line shown while the agent runs each tool.
+TOOL_STATUS = {
+    "sql_db_list_tables": "Listing tables…",
+    "sql_db_schema": "Reading table schemas…",
+    "sql_db_query_checker": "Checking SQL…",
+    "sql_db_query": "Running SQL…",
+    "Python_REPL": "Running Python…",
+}
+
+_ttft_lock = threading.Lock()
+_ttft = {'requests': 0, 'total_seconds': 0.0, 'last_seconds': None, 'max_seconds': 0.0}
+
+
+def _record_ttft(seconds):
+    with _ttft_lock:
+        _ttft['requests'] += 1
+        _ttft['total_seconds'] += seconds
+        _ttft['last_seconds'] = seconds
+        _ttft['max_seconds'] = max(_ttft['max_seconds'], seconds)
+
+
+def ttft_stats():
+    """
+    Report time-to-first-token across streamed requests.
+
+    Returns:
+        dict: Request count and last, average and max time to first token in seconds.
+    """
+    with _ttft_lock:
+        requests = _ttft['requests']
+        return {
+            'requests': requests,
+            'last_seconds': _ttft['last_seconds'],
+            'avg_seconds': _ttft['total_seconds'] / requests if requests else None,
+            'max_seconds': _ttft['max_seconds'],
+        }
+
+
+class StreamlitAnswerHandler(BaseCallbackHandler):
+    """
+    Streams agent progress and final-answer tokens into a Streamlit container.
+
+    Tool calls are shown as a status line. With `stream_answer`, tokens that
+    follow the ReAct "Final Answer:" marker are rendered as they arrive.
+
+    Args:
+        container: Streamlit container (e.g. the assistant chat message) to render into.
+        stream_answer (bool): Whether to render final-answer tokens.
+    """
+
+    def __init__(self, container, stream_answer=True):
+        self.status = container.empty()
+        self.answer = container.empty()
+        self.stream_answer = stream_answer
+        self.started_at = time.perf_counter()
+        self.first_token_seconds = None
+        self._buffer = ""
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._buffer = ""
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._buffer = ""
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started_at
+            _record_ttft(self.first_token_seconds)
+        self._buffer += token
+        if self.stream_answer and FINAL_ANSWER_MARKER in self._buffer:
+            self.status.empty()
+            answer = self._buffer.split(FINAL_ANSWER_MARKER, 1)[1].strip()
+            if answer:
+                self.answer.markdown(answer + "▌")
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = (serialized or {}).get("name", "")
+        label = TOOL_STATUS.get(name, f"Running {name}…")
+        if name in ("sql_db_query", "sql_db_query_checker"):
+            self.status.markdown(f"_{label}_\n```sql\n{input_str}\n```")
+        else:
+            self.status.markdown(f"_{label}_")
+
+    def on_llm_end(self, response, **kwargs):
+        if FINAL_ANSWER_MARKER not in self._buffer:
+            self.status.markdown("_Thinking…_")
+
+    def finish(self):
+        """Clear the streamed placeholders before the final content is rendered."""
+        self.status.empty()
+        self.answer.empty()
@@ -0,0 +1,147 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from constants import TABLE_INDEX_TOP_K
+from schema_snapshot import get_schema_snapshot
+
+# Table names are repeated in their document so a name hit outranks a column hit.
+TABLE_NAME_WEIGHT = 3
+
+
+def tokenize(value):
+    """
+    Split free text or SQL identifiers into lower-case search terms.
+
+    snake_case and camelCase identifiers are split into words and a trailing
+    plural "s" is dropped, so "orderItems" and "order item" share terms.
+
+    Args:
+        value (str): Text to tokenize.
+    Returns:
+        list: The search terms.
+    """
+    value = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", value)
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", value.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents.
+
+    Args:
+        documents (dict): Document id -> list of terms.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalisation.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = {doc_id: Counter(terms) for doc_id, terms in documents.items()}
+        self.lengths = {doc_id: len(terms) for doc_id, terms in documents.items()}
+        self.avg_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+        doc_freqs = Counter()
+        for freqs in self.term_freqs.values():
+            doc_freqs.update(freqs.keys())
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def search(self, terms, k):
+        """
+        Rank documents against a list of query terms.
+
+        Returns:
+            list: Up to k (doc_id, score) pairs with a positive score, best first.
+        """
+        scores = {}
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, freqs in self.term_freqs.items():
+                tf = freqs.get(term)
+                if not tf:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class TableIndex:
+    """
+    Lexical index over a schema snapshot used to pick the tables relevant to a question.
+
+    Args:
+        snapshot (SchemaSnapshot): Snapshot providing table names, columns,
+            comments and foreign keys.
+    """
+
+    def __init__(self, snapshot):
+        start = time.perf_counter()
+        documents = {}
+        self.neighbours = {name: set() for name in snapshot.tables}
+        for name, table in snapshot.tables.items():
+            terms = tokenize(name) * TABLE_NAME_WEIGHT + tokenize(table.get('comment', ''))
+            for column in table['columns']:
+                terms += tokenize(column['name']) + tokenize(column.get('comment', ''))
+            documents[name] = terms
+            for fk in table['foreign_keys']:
+                referred = fk['referred_table']
+                if referred in self.neighbours:
+                    self.neighbours[name].add(referred)
+                    self.neighbours[referred].add(name)
+        self.bm25 = BM25Index(documents)
+        self.build_seconds = time.perf_counter() - start
+
+    def select_tables(self, question, k=TABLE_INDEX_TOP_K):
+        """
+        Choose the candidate tables for a question.
+
+        Args:
+            question (str): The user question.
+            k (int): Number of top-ranked tables to keep before adding the
+                tables one foreign-key hop away from them.
+        Returns:
+            list: Sorted table names, or None when no term in the question
+                matches the schema and the agent should see every table.
+        """
+        ranked = self.bm25.search(tokenize(question), k)
+        if not ranked:
+            return None
+        selected = {name for name, _ in ranked}
+        for name, _ in ranked:
+            selected |= self.neighbours[name]
+        return sorted(selected)
+
+    def stats(self):
+        return {
+            'tables': len(self.neighbours),
+            'terms': len(self.bm25.idf),
+            'build_seconds': round(self.build_seconds, 4),
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_table_index(db_config):
+    """Return the table index for a database, rebuilt whenever its schema snapshot changes."""
+    snapshot = get_schema_snapshot(db_config)
+    key = (db_config['HOST'], str(db_config['PORT']), db_config['DATABASE'])
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is None or cached[0] != snapshot.fingerprint:
+            cached = (snapshot.fingerprint, TableIndex(snapshot))
+            _indexes[key] = cached
+        return cached[1]
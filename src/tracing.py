@@ -0,0 +1,420 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from langchain_core.callbacks import BaseCallbackHandler
+from constants import (
+    TRACE_LATENCY_BUCKETS,
+    TRACE_METRICS_PATH,
+    TRACE_RECENT_REQUESTS,
+    TRACE_SPANS_BACKUPS,
+    TRACE_SPANS_MAX_BYTES,
+    TRACE_SPANS_PATH,
+)
+from memory import count_tokens
+
+METRIC_PREFIX = "text_to_sql"
+
+
+class Trace:
+    """
+    Spans and counters for one request, from question to rendered answer.
+
+    Attributes:
+        kind (str): Request kind, e.g. "sql", "python" or "agent_init".
+        trace_id (str): Random id shared by every span of the request.
+        spans (list): Finished spans as dicts, in completion order.
+        counters (dict): LLM calls, prompt/completion tokens, SQL queries and
+            rows, errors, and tokens kept out of the agent's prompt by result
+            summaries, recorded during the request.
+    """
+
+    def __init__(self, kind, attributes=None):
+        self.kind = kind
+        self.trace_id = uuid.uuid4().hex
+        self.attributes = attributes or {}
+        self.started_at = time.time()
+        self.seconds = None
+        self.error = None
+        self.spans = []
+        self.counters = {
+            'llm_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+            'sql_queries': 0, 'sql_rows': 0, 'errors': 0, 'tokens_saved': 0,
+        }
+        self._lock = threading.Lock()
+
+    def count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+    def add_span(self, name, started_at, seconds, parent_id=None, error=None, span_id=None, **attributes):
+        span_id = span_id or uuid.uuid4().hex[:16]
+        with self._lock:
+            self.spans.append({
+                'trace_id': self.trace_id,
+                'span_id': span_id,
+                'parent_id': parent_id,
+                'name': name,
+                'start': started_at,
+                'seconds': seconds,
+                'error': error,
+                'attributes': attributes,
+            })
+        return span_id
+
+    def stage_seconds(self):
+        """Total seconds per span name."""
+        stages = {}
+        for span in self.spans:
+            stages[span['name']] = stages.get(span['name'], 0.0) + span['seconds']
+        return stages
+
+    def summary(self):
+        stages = self.stage_seconds()
+        return {
+            'kind': self.kind,
+            'started': time.strftime("%H:%M:%S", time.localtime(self.started_at)),
+            'seconds': round(self.seconds or 0.0, 3),
+            **self.counters,
+            'slowest_stage': max(stages, key=stages.get) if stages else None,
+            'error': self.error,
+        }
+
+
+_current_trace = ContextVar("current_trace", default=None)
+_current_span = ContextVar("current_span", default=None)
+
+
+def _error_text(error):
+    return f"{type(error).__name__}: {error}"
+
+
+@contextmanager
+def trace_request(kind, **attributes):
+    """
+    Trace one request; spans and counters recorded inside attach to it.
+
+    On exit the request is added to the recent-requests list and the
+    aggregated metrics, its spans are appended to TRACE_SPANS_PATH (unless it
+    is None) and the Prometheus file is rewritten.
+
+    Yields:
+        Trace: The request's trace.
+    """
+    trace = Trace(kind, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    start = time.perf_counter()
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = _error_text(e)
+        trace.count(errors=1)
+        raise
+    finally:
+        trace.seconds = time.perf_counter() - start
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _finish(trace)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage of the current request. A no-op outside trace_request.
+
+    Yields:
+        dict: Attributes of the span; add to it to record results such as row counts.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except Exception as e:
+        error = _error_text(e)
+        trace.count(errors=1)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.add_span(
+            name, started_at, time.perf_counter() - start,
+            parent_id=parent_id, error=error, span_id=span_id, **attributes,
+        )
+
+
+def record_error(error):
+    """Count an error that was handled inside the current request."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(errors=1)
+        trace.error = _error_text(error)
+
+
+def record_sql(rows):
+    """Count one executed SQL statement and the rows it returned."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(sql_queries=1, sql_rows=rows)
+
+
+def record_tokens_saved(tokens):
+    """Count tokens a result summary kept out of the agent's prompt."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(tokens_saved=tokens)
+
+
+class TracingHandler(BaseCallbackHandler):
+    """
+    Records LLM calls, token counts and tool runs as spans of the current request.
+
+    Create it inside trace_request; it keeps a reference to that trace so
+    callbacks fired from worker threads still land on the right request.
+    """
+
+    def __init__(self):
+        self.trace = _current_trace.get()
+        self.parent_id = _current_span.get()
+        self._runs = {}
+
+    def _start(self, run_id, name, **attributes):
+        self._runs[run_id] = (name, time.time(), time.perf_counter(), attributes)
+
+    def _end(self, run_id, error=None, **attributes):
+        started = self._runs.pop(run_id, None)
+        if started is None or self.trace is None:
+            return
+        name, started_at, start, start_attributes = started
+        if error is not None:
+            self.trace.count(errors=1)
+        self.trace.add_span(
+            name, started_at, time.perf_counter() - start, parent_id=self.parent_id,
+            error=_error_text(error) if error is not None else None,
+            **start_attributes, **attributes,
+        )
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        tokens = sum(count_tokens(prompt) for prompt in prompts)
+        if self.trace is not None:
+            self.trace.count(llm_calls=1, prompt_tokens=tokens)
+        self._start(run_id, "llm", prompt_tokens=tokens)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        tokens = sum(
+            count_tokens(str(message.content)) for message_list in messages for message in message_list
+        )
+        if self.trace is not None:
+            self.trace.count(llm_calls=1, prompt_tokens=tokens)
+        self._start(run_id, "llm", prompt_tokens=tokens)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tokens = usage.get("completion_tokens")
+        if tokens is None:
+            # Streamed responses carry no usage; count the generated text instead
+            tokens = sum(
+                count_tokens(generation.text) for generations in response.generations for generation in generations
+            )
+        if self.trace is not None:
+            self.trace.count(completion_tokens=tokens)
+        self._end(run_id, completion_tokens=tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, f"tool:{(serialized or {}).get('name', 'unknown')}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+
+# Process-wide aggregates across every traced request.
+_metrics_lock = threading.Lock()
+_recent = deque(maxlen=TRACE_RECENT_REQUESTS)
+_requests = {}   # (kind, status) -> count
+_latency = {}    # kind -> {'buckets': [...], 'sum': float, 'count': int}
+_stages = {}     # stage -> {'seconds': float, 'count': int}
+_totals = {'llm_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'sql_queries': 0, 'sql_rows': 0, 'errors': 0,
+           'tokens_saved': 0}
+_stats_sources = {}
+
+
+def register_stats(name, stats_fn):
+    """
+    Export a component's stats() as Prometheus gauges.
+
+    Args:
+        name (str): Metric name segment, e.g. "answer_cache".
+        stats_fn (callable): Returns a dict; numeric values become gauges.
+    """
+    with _metrics_lock:
+        _stats_sources[name] = stats_fn
+
+
+def recent_requests():
+    """
+    Summaries of the most recent traced requests, newest first.
+
+    Returns:
+        list: One dict per request with its kind, latency, counters and slowest stage.
+    """
+    with _metrics_lock:
+        return [trace.summary() for trace in reversed(_recent)]
+
+
+def _finish(trace):
+    status = "error" if trace.error else "ok"
+    with _metrics_lock:
+        _recent.append(trace)
+        _requests[(trace.kind, status)] = _requests.get((trace.kind, status), 0) + 1
+        latency = _latency.setdefault(
+            trace.kind, {'buckets': [0] * len(TRACE_LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+        )
+        for i, bound in enumerate(TRACE_LATENCY_BUCKETS):
+            if trace.seconds <= bound:
+                latency['buckets'][i] += 1
+        latency['sum'] += trace.seconds
+        latency['count'] += 1
+        for name, seconds in trace.stage_seconds().items():
+            stage = _stages.setdefault(name, {'seconds': 0.0, 'count': 0})
+            stage['seconds'] += seconds
+            stage['count'] += 1
+        for key, value in trace.counters.items():
+            _totals[key] += value
+    try:
+        _write_spans(trace)
+        _write_metrics()
+    except OSError as e:
+        print(f"Failed to export trace: {str(e)}")
+
+
+_spans_logger = None
+_spans_logger_lock = threading.Lock()
+
+
+def _get_spans_logger():
+    """Logger writing to the size-rotated span file, created on the first trace."""
+    global _spans_logger
+    with _spans_logger_lock:
+        if _spans_logger is None:
+            os.makedirs(os.path.dirname(TRACE_SPANS_PATH), exist_ok=True)
+            handler = RotatingFileHandler(
+                TRACE_SPANS_PATH, maxBytes=TRACE_SPANS_MAX_BYTES, backupCount=TRACE_SPANS_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("text_to_sql.spans")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _spans_logger = logger
+        return _spans_logger
+
+
+def _write_spans(trace):
+    if TRACE_SPANS_PATH is None:
+        return
+    request = {
+        'trace_id': trace.trace_id,
+        'span_id': None,
+        'parent_id': None,
+        'name': f"request:{trace.kind}",
+        'start': trace.started_at,
+        'seconds': trace.seconds,
+        'error': trace.error,
+        'attributes': dict(trace.attributes, **trace.counters),
+    }
+    # One log record per request, so a rotation never splits a request's spans
+    _get_spans_logger().info("\n".join(json.dumps(record, default=str) for record in [request] + trace.spans))
+
+
+def _write_metrics():
+    os.makedirs(os.path.dirname(TRACE_METRICS_PATH), exist_ok=True)
+    tmp_path = f"{TRACE_METRICS_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, TRACE_METRICS_PATH)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _gauges(name, stats):
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"{METRIC_PREFIX}_{name}_{key}")
+        lines.append(f"{metric} {value}")
+    return lines
+
+
+def prometheus_text():
+    """
+    Render request metrics and registered component stats in Prometheus text format.
+
+    Returns:
+        str: The exposition text.
+    """
+    p = METRIC_PREFIX
+    with _metrics_lock:
+        lines = [
+            f"# HELP {p}_requests_total Traced requests by kind and status.",
+            f"# TYPE {p}_requests_total counter",
+        ]
+        for (kind, status), count in sorted(_requests.items()):
+            lines.append(f'{p}_requests_total{{kind="{_label(kind)}",status="{status}"}} {count}')
+
+        lines += [
+            f"# HELP {p}_request_seconds Request latency.",
+            f"# TYPE {p}_request_seconds histogram",
+        ]
+        for kind, latency in sorted(_latency.items()):
+            kind = _label(kind)
+            for bound, count in zip(TRACE_LATENCY_BUCKETS, latency['buckets']):
+                lines.append(f'{p}_request_seconds_bucket{{kind="{kind}",le="{bound}"}} {count}')
+            lines.append(f'{p}_request_seconds_bucket{{kind="{kind}",le="+Inf"}} {latency["count"]}')
+            lines.append(f'{p}_request_seconds_sum{{kind="{kind}"}} {latency["sum"]}')
+            lines.append(f'{p}_request_seconds_count{{kind="{kind}"}} {latency["count"]}')
+
+        lines += [
+            f"# HELP {p}_stage_seconds_total Time spent per pipeline stage.",
+            f"# TYPE {p}_stage_seconds_total counter",
+        ]
+        for name, stage in sorted(_stages.items()):
+            lines.append(f'{p}_stage_seconds_total{{stage="{_label(name)}"}} {stage["seconds"]}')
+        lines.append(f"# TYPE {p}_stage_runs_total counter")
+        for name, stage in sorted(_stages.items()):
+            lines.append(f'{p}_stage_runs_total{{stage="{_label(name)}"}} {stage["count"]}')
+
+        for key, value in _totals.items():
+            lines.append(f"# TYPE {p}_{key}_total counter")
+            lines.append(f"{p}_{key}_total {value}")
+        sources = list(_stats_sources.items())
+
+    for name, stats_fn in sources:
+        try:
+            lines += _gauges(name, stats_fn())
+        except Exception as e:
+            print(f"Failed to read {name} stats: {str(e)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+from chart_planner import plan_chart
+
+
+@pytest.mark.parametrize("column", ["avg_days", "update_count", "total_time_minutes", "daysOpen"])
+def test_integer_measure_with_time_like_name_is_plotted_as_measure(column):
+    frame = pd.DataFrame({"region": ["a", "b", "c"], column: [3, 5, 7]})
+    spec = plan_chart(frame, "plot average by region")
+    assert (spec.kind, spec.x, spec.y) == ("bar", "region", [column])
+
+
+def test_integer_year_column_is_time():
+    frame = pd.DataFrame({"order_year": [2021, 2022, 2023], "revenue": [1.0, 2.0, 3.0]})
+    spec = plan_chart(frame)
+    assert (spec.kind, spec.x, spec.y) == ("line", "order_year", ["revenue"])
+
+
+def test_no_value_counts_when_the_measure_was_taken_for_time():
+    frame = pd.DataFrame({"region": ["a", "b", "c"], "year": [2021, 2022, 2023]})
+    assert plan_chart(frame, "plot year by region") is None
@@ -0,0 +1,69 @@
+import pytest
+
+from sql_guard import add_limit, is_read_statement, remove_auto_limit
+
+LIMIT = 100001
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t WHERE note LIKE '%#1%' LIMIT 5",
+    "SELECT * FROM t WHERE note = 'a -- b' LIMIT 5",
+    "SELECT * FROM t WHERE note = 'a;b' LIMIT 5;",
+    'SELECT * FROM t WHERE note = "#x" LIMIT 2, 5',
+    "SELECT * FROM t LIMIT 5 FOR UPDATE",
+])
+def test_existing_limit_is_kept_when_literals_hold_comment_markers(sql):
+    assert add_limit(sql, LIMIT) == sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t WHERE note LIKE '%#1%'",
+    "SELECT * FROM t WHERE note = 'a -- LIMIT 5'",
+    "SELECT * FROM t WHERE note = 'a;'",
+    "SELECT * FROM t WHERE note = 'it''s LIMIT 1'",
+])
+def test_limit_is_appended_after_literals(sql):
+    guarded = add_limit(sql, LIMIT)
+    assert guarded == f"{sql}\nLIMIT {LIMIT}"
+    assert remove_auto_limit(guarded, LIMIT) == sql
+
+
+def test_limit_is_appended_after_trailing_comment():
+    sql = "SELECT * FROM t -- all rows"
+    assert add_limit(sql, LIMIT) == f"{sql}\nLIMIT {LIMIT}"
+
+
+@pytest.mark.parametrize("sql, clause", [
+    ("SELECT * FROM t WHERE id = 1 FOR UPDATE", "FOR UPDATE"),
+    ("SELECT * FROM t WHERE note = '#' LOCK IN SHARE MODE;", "LOCK IN SHARE MODE"),
+    ("SELECT * FROM t FOR SHARE OF t SKIP LOCKED", "FOR SHARE OF t SKIP LOCKED"),
+])
+def test_limit_goes_before_locking_clause(sql, clause):
+    guarded = add_limit(sql, LIMIT)
+    assert guarded.endswith(f"\nLIMIT {LIMIT}\n{clause}")
+    assert remove_auto_limit(guarded, LIMIT).endswith(f"\n{clause}")
+
+
+def test_comment_marker_in_literal_does_not_hide_statement_kind():
+    assert is_read_statement("/* x */ SELECT '--' AS dashes")
+    assert not is_read_statement("DELETE FROM t WHERE note = 'SELECT'")
+
+
+@pytest.mark.parametrize("sql", [
+    "WITH x AS (SELECT id FROM t WHERE a = 1) DELETE FROM t WHERE id IN (SELECT id FROM x)",
+    "WITH x AS (SELECT id FROM t) UPDATE t JOIN x USING (id) SET a = 2",
+    "with recursive x (n) as (select 1 union all select n + 1 from x where n < 5) delete from t where id in (select n from x)",
+    "WITH `select` AS (SELECT 1) DELETE FROM t",
+])
+def test_with_clause_in_front_of_a_write_is_not_a_read(sql):
+    assert not is_read_statement(sql)
+    assert add_limit(sql, LIMIT) == sql
+
+
+@pytest.mark.parametrize("sql", [
+    "WITH x AS (SELECT id FROM t) SELECT * FROM x",
+    "WITH x AS (SELECT ')' AS p), y (a) AS (SELECT 1) SELECT * FROM x, y",
+    "(SELECT 1)",
+])
+def test_with_clause_in_front_of_a_select_is_a_read(sql):
+    assert is_read_statement(sql)